@@ -0,0 +1,160 @@
+# desktop_entry.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Compare the Desktop Entry parser with the configparser based one.
+
+Usage: python3 benchmarks/desktop_entry.py [--count N] [--memory] [DIR ...]
+
+Collects the .desktop files found in DIR (by default the XDG application
+folders), repeats them until there are N of them and times reading the
+keys the app list needs with each parser. With --memory, reports how much
+memory every approach keeps alive per entry instead.
+"""
+import argparse
+import configparser
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from turtle.desktop_entry import DESKTOP_SECTION, DesktopEntry, DesktopEntryError, EntrySummary  # noqa: E402
+
+
+def default_dirs():
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    data_dirs = os.environ.get('XDG_DATA_DIRS') or '/usr/local/share:/usr/share'
+    return [os.path.join(d, 'applications') for d in [data_home] + data_dirs.split(':')]
+
+
+def collect(dirs, count):
+    blobs = []
+    for directory in dirs:
+        for root, _dirs, files in os.walk(directory):
+            for name in files:
+                if name.endswith('.desktop'):
+                    with open(os.path.join(root, name), 'rb') as f:
+                        blobs.append(f.read())
+    if not blobs:
+        return []
+    return (blobs * (count // len(blobs) + 1))[:count]
+
+
+def with_configparser(data: bytes):
+    parser = configparser.ConfigParser()
+    parser.optionxform = str
+    parser.read_string(data.decode('utf-8'))
+    section = parser[DESKTOP_SECTION]
+    # raw=True, the interpolating getter chokes on Exec field codes
+    return (section.get('Name', raw=True), section.get('Icon', raw=True),
+            section.getboolean('Hidden', False), section.getboolean('Terminal', False),
+            section.get('Keywords', raw=True))
+
+
+def with_summary(data: bytes):
+    entry = DesktopEntry(data, ())
+    return (entry.get('Name'), entry.get('Icon'), entry.get_bool('Hidden'),
+            entry.get_bool('Terminal'), entry.get('Keywords'))
+
+
+def keep_configparser(data: bytes):
+    parser = configparser.ConfigParser()
+    parser.optionxform = str
+    parser.read_string(data.decode('utf-8'))
+    return parser
+
+
+def with_summary_record(data: bytes):
+    return EntrySummary.parse(data, ())
+
+
+def with_full_parse(data: bytes):
+    entry = DesktopEntry(data, ())
+    entry.groups
+    return entry
+
+
+def run(name, func, blobs):
+    failed = 0
+    start = time.perf_counter()
+    for data in blobs:
+        try:
+            func(data)
+        except (configparser.Error, DesktopEntryError, UnicodeDecodeError):
+            failed += 1
+    elapsed = time.perf_counter() - start
+    print(f"{name:>14}: {elapsed * 1000:8.1f} ms  "
+          f"{len(blobs) / elapsed:10.0f} files/s  {failed} failed")
+
+
+def measure(name, func, blobs):
+    """Report the memory retained by the objects `func` returns."""
+    # Copies, so that what's measured doesn't share the input buffers
+    blobs = [bytes(bytearray(data)) for data in blobs]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = []
+    for data in blobs:
+        try:
+            kept.append(func(data))
+        except (configparser.Error, DesktopEntryError, UnicodeDecodeError):
+            pass
+    del blobs
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    per_entry = (after - before) / max(len(kept), 1)
+    print(f"{name:>14}: {per_entry:8.0f} bytes/entry  {(after - before) // 1024:8} KiB total")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--memory', action='store_true', help="report memory per entry")
+    parser.add_argument('dirs', nargs='*')
+    args = parser.parse_args()
+
+    blobs = collect(args.dirs or default_dirs(), args.count)
+    if not blobs:
+        sys.exit("No .desktop files found")
+    print(f"{len(blobs)} files, {sum(map(len, blobs)) // 1024} KiB")
+
+    if args.memory:
+        measure("configparser", keep_configparser, blobs)
+        measure("DesktopEntry", lambda data: DesktopEntry(data, ()), blobs)
+        measure("EntrySummary", with_summary_record, blobs)
+        return
+
+    run("configparser", with_configparser, blobs)
+    run("summary", with_summary, blobs)
+    run("summary record", with_summary_record, blobs)
+    run("full parse", with_full_parse, blobs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+# soak.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Soak test for long running sessions.
+
+Usage:
+    xvfb-run python3 benchmarks/soak.py --resources build/data/com.github.tenderowl.turtle.gresource
+                                        [--rounds 20] [--warmup 2] [--entries 200] [--flips 50]
+                                        [--output soak.json]
+
+Every round creates --entries menu items through the window, undoes one,
+removes the others and flips between the pages --flips times, in a
+temporary XDG_DATA_HOME with in-memory settings. After each round the
+handlers connected to long-lived objects, the live GObject wrappers and
+the memory traced by tracemalloc are recorded. Every round also flags an
+entry on screen as broken in place and checks that its row shows it.
+
+Past the --warmup rounds none of them may grow: the exit status is 1 when
+a handler count changed, when the wrappers or the memory grew by more
+than --object-slack and --memory-slack, or when a row wasn't updated.
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Don't take the name of a running Turtle on the session bus
+SOAK_APP_ID = 'com.github.tenderowl.turtle.Soak'
+SORT_MODES = ('name', 'modified', 'hidden')
+# How long to wait for the library to see a change
+TIMEOUT = 30.0
+
+
+def pump(condition: Callable[[], bool] = lambda: True, timeout: float = TIMEOUT) -> None:
+    """Run the main loop until `condition()` holds and nothing is pending."""
+    from gi.repository import GLib
+
+    context = GLib.MainContext.default()
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("the main loop didn't get there in time")
+        if not context.iteration(False):
+            time.sleep(0.001)
+    while context.pending():
+        context.iteration(False)
+
+
+def handler_count(obj, detailed_signal: str) -> int:
+    """Count the handlers connected to `detailed_signal` of `obj`."""
+    from gi.repository import GLib, GObject
+
+    name, _, detail = detailed_signal.partition('::')
+    mask = GObject.SignalMatchType.ID | GObject.SignalMatchType.UNBLOCKED
+    detail_quark = 0
+    if detail:
+        mask |= GObject.SignalMatchType.DETAIL
+        detail_quark = GLib.quark_from_string(detail)
+    signal_id = GObject.signal_lookup(name, type(obj))
+
+    # Handlers are found one at a time, block each one so the next is found
+    blocked = []
+    while True:
+        handler_id = GObject.signal_handler_find(obj, mask, signal_id, detail_quark, None, None, None)
+        if not handler_id:
+            break
+        GObject.signal_handler_block(obj, handler_id)
+        blocked.append(handler_id)
+    for handler_id in blocked:
+        GObject.signal_handler_unblock(obj, handler_id)
+    return len(blocked)
+
+
+def gobject_wrappers() -> Counter:
+    """Count the Python wrappers of live GObjects by type."""
+    from gi.repository import GObject
+
+    gc.collect()
+    return Counter(type(obj).__name__ for obj in gc.get_objects() if isinstance(obj, GObject.Object))
+
+
+class Soak:
+    def __init__(self, data_home: str, app, entries: int, flips: int):
+        self.data_home = data_home
+        self.app = app
+        self.entries = entries
+        self.flips = flips
+        self.window = app.window
+        self.rebound = True
+
+        from turtle.xdg import user_applications_dir
+        os.makedirs(user_applications_dir(), exist_ok=True)
+        # Created entries point to it, so no permission dialog is shown
+        self.program = os.path.join(data_home, 'soak-program')
+        with open(self.program, 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(self.program, 0o755)
+
+    def show_page(self, name: str) -> None:
+        self.window.pages.set_visible_child_name(name)
+        if name == 'installed_apps':
+            pump(lambda: self.window.library.complete)
+        else:
+            pump()
+
+    def handlers(self) -> Dict[str, int]:
+        window = self.window
+        library = window.library
+        counts = {
+            'toast default-action': handler_count(window.toast, 'default-action'),
+            'toast closed': handler_count(window.toast, 'closed'),
+            'color scheme': handler_count(self.app.granite_settings, 'notify::prefers-color-scheme'),
+            'apps store items-changed': handler_count(window.apps_store, 'items-changed'),
+            'library listeners': len(library.listeners),
+            'library broken listeners': len(library.broken_listeners),
+        }
+        if window.apps_list:
+            counts['scroll value-changed'] = handler_count(window.apps_list.vadjustment, 'value-changed')
+        return counts
+
+    def round(self, number: int) -> None:
+        from turtle.desktop_entry import desktop_file_path
+
+        window = self.window
+        self.app.activate()
+        self.show_page('installed_apps')
+
+        names = [f'Soak {number} {i}' for i in range(self.entries)]
+        paths = [desktop_file_path(name) for name in names]
+        for name in names:
+            window.make_desktop_file(name=name, exec_path=self.program)
+        window.entries_written(paths)
+        pump(lambda: all(path in window.catalog for path in paths))
+        self.rebound = self.rebinds_touched_row()
+
+        # The notification undoes the last one, the others are removed from the details panel
+        window.toast_default_action(window.toast)
+        for path in paths[:-1]:
+            window.remove_entry(window.catalog.get(path))
+        pump(lambda: not any(path in window.catalog for path in paths))
+
+        window.apps_sort.set_active_id(SORT_MODES[number % len(SORT_MODES)])
+        for _ in range(self.flips):
+            self.show_page('new_app')
+            self.show_page('installed_apps')
+
+    def rebinds_touched_row(self) -> bool:
+        """Whether a row on screen shows a health verdict applied to its
+        entry in place, as the library does after a check."""
+        from turtle.validator import ERROR, Issue
+
+        window = self.window
+        if not window.apps_list:
+            # Rows of a plain list box are created again for every splice
+            return True
+        bound = [(row, window.apps_list.get_item(row)) for row in window.apps_list.rows if row.get_visible()]
+        row, app_data = next(((row, item) for row, item in bound if item is not None), (None, None))
+        if row is None:
+            return False
+
+        health = app_data.health
+        app_data.health = (Issue(ERROR, 0, 'Exec', "soak test"),)
+        window.library.changed(window.catalog.touch([app_data.filepath]))
+        pump()
+        shown = row.app_data is app_data and row.app_badge.get_visible()
+        app_data.health = health
+        window.library.changed(window.catalog.touch([app_data.filepath]))
+        pump()
+        return shown and row.app_badge.get_visible() == bool(health + app_data.issues)
+
+    def run(self, rounds: int) -> List[Dict]:
+        self.show_page('installed_apps')
+        results = []
+        for number in range(rounds):
+            start = time.perf_counter()
+            self.round(number)
+            seconds = time.perf_counter() - start
+            wrappers = gobject_wrappers()
+            results.append({
+                'round': number,
+                'seconds': seconds,
+                'handlers': self.handlers(),
+                'rebound': self.rebound,
+                'gobjects': sum(wrappers.values()),
+                'gobject_types': dict(wrappers.most_common(10)),
+                'memory_kib': tracemalloc.get_traced_memory()[0] / 1024,
+            })
+            print(f"round {number}: {seconds:.1f}s, {results[-1]['gobjects']} GObjects, "
+                  f"{results[-1]['memory_kib']:.0f} KiB", file=sys.stderr)
+        return results
+
+
+def check(results: List[Dict], warmup: int, object_slack: int, memory_slack: float) -> List[str]:
+    """Return what grew after the warmup rounds."""
+    failures = [f"round {result['round']}: a row on screen wasn't bound again after its entry changed"
+                for result in results if not result['rebound']]
+    baseline = results[min(warmup, len(results) - 1)]
+    for result in results[warmup + 1:]:
+        for name, count in result['handlers'].items():
+            if count != baseline['handlers'][name]:
+                failures.append(f"round {result['round']}: {count} {name} handlers, "
+                                f"was {baseline['handlers'][name]}")
+    last = results[-1]
+    if last['gobjects'] > baseline['gobjects'] + object_slack:
+        failures.append(f"{last['gobjects']} GObjects alive, was {baseline['gobjects']}")
+    if last['memory_kib'] > baseline['memory_kib'] + memory_slack:
+        failures.append(f"{last['memory_kib']:.0f} KiB traced, was {baseline['memory_kib']:.0f} KiB")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Turtle handler and memory soak test.")
+    parser.add_argument('--resources', required=True, help="compiled gresource")
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2, help="rounds to let caches fill (default: %(default)s)")
+    parser.add_argument('--entries', type=int, default=200, help="entries created per round")
+    parser.add_argument('--flips', type=int, default=50, help="page switches per round")
+    parser.add_argument('--object-slack', type=int, default=50,
+                        help="allowed growth of live GObjects (default: %(default)s)")
+    parser.add_argument('--memory-slack', type=float, default=512,
+                        help="allowed growth of traced memory in KiB (default: %(default)s)")
+    parser.add_argument('--output', help="write results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='turtle-soak-') as data_home:
+        os.environ['XDG_DATA_HOME'] = data_home
+        os.environ['XDG_CACHE_HOME'] = os.path.join(data_home, 'cache')
+        os.environ['GSETTINGS_BACKEND'] = 'memory'
+        os.environ['GSETTINGS_SCHEMA_DIR'] = os.path.join(data_home, 'schemas')
+        subprocess.run(['glib-compile-schemas', '--targetdir', os.environ['GSETTINGS_SCHEMA_DIR'],
+                        os.path.join(ROOT, 'data')], check=True)
+
+        from gi.repository import Gtk
+        from turtle.main import Application
+
+        if not Gtk.init_check(sys.argv)[0]:
+            print("No display, run under xvfb-run or with GDK_BACKEND=broadway", file=sys.stderr)
+            return 2
+
+        app = Application(args.resources)
+        app.set_application_id(SOAK_APP_ID)
+        app.register(None)
+        app.activate()
+
+        tracemalloc.start()
+        soak = Soak(data_home, app, args.entries, args.flips)
+        try:
+            results = soak.run(args.rounds)
+        finally:
+            tracemalloc.stop()
+            app.window.destroy()
+            app.library.shutdown()
+
+    failures = check(results, args.warmup, args.object_slack, args.memory_slack)
+    report = {'results': results, 'failures': failures}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    for failure in failures:
+        print(f"LEAK {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
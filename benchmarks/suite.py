@@ -0,0 +1,444 @@
+# suite.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Startup and page load benchmarks.
+
+Usage:
+    python3 benchmarks/suite.py [--sizes 100,1000,10000,50000] [--output results.json]
+                                [--compare baseline.json] [--max-regression 0.2]
+                                [--resources build/data/com.github.tenderowl.turtle.gresource]
+                                [--sync-dir DIRECTORY]
+
+Every benchmark runs against synthesized applications folders of each
+size, created in a temporary XDG_DATA_HOME with a mix of icons, locales and
+actions. Progress goes to stderr, the results are written as JSON to
+stdout or --output. With --compare, the exit status is 1 when throughput
+dropped or peak memory grew by more than --max-regression compared to the
+baseline.
+
+Benchmarks needing PyGObject are skipped when it is not installed, and the
+ones creating widgets also need a display (run under xvfb-run or with
+GDK_BACKEND=broadway) and the compiled gresource. With those, cold_start
+also times a GUI start: from spawning the application until its window is
+first drawn.
+
+The temporary XDG_DATA_HOME is often on tmpfs, where syncing is free;
+make_desktop_file_synced writes the same entries under --sync-dir instead
+(default: the current directory), which should be on the disk the users'
+data lives on.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from turtle.desktop_entry import EntrySummary  # noqa: E402
+
+LOCALES = ('de', 'fr', 'es', 'pt_BR', 'ru', 'ja', 'zh_CN', 'sr@latin')
+THEME_ICONS = ('utilities-terminal', 'web-browser', 'text-editor', 'application-x-executable')
+ICON_SVG = ('<svg xmlns="http://www.w3.org/2000/svg" width="256" height="256">'
+            '<circle cx="128" cy="128" r="{r}" fill="#{color:06x}"/></svg>')
+
+# Widgets are expensive to create, don't build more than this many rows
+MAX_ROWS = 5000
+
+# Run as `python3 -c FIRST_FRAME RESOURCES --profile-startup`: starts the
+# application, prints a line once its window is drawn and quits
+FIRST_FRAME = '''
+import sys
+from gi.repository import Gio, GLib
+from turtle import main
+
+drawn = main.Application.first_frame_drawn
+
+def first_frame_drawn(self, window, cr):
+    drawn(self, window, cr)
+    print("first frame", flush=True)
+    GLib.idle_add(self.quit)
+
+main.Application.first_frame_drawn = first_frame_drawn
+app = main.Application(sys.argv[1])
+app.set_flags(app.get_flags() | Gio.ApplicationFlags.NON_UNIQUE)
+sys.exit(app.run(["turtle", "--profile-startup"]))
+'''
+
+
+def synthesize(directory: str, count: int) -> None:
+    """Fill `directory` with `count` desktop entries."""
+    icons_dir = os.path.join(os.path.dirname(directory), 'icons')
+    os.makedirs(directory, exist_ok=True)
+    os.makedirs(icons_dir, exist_ok=True)
+
+    # A few dozen icon files shared by many entries, like in real folders
+    icon_files = []
+    for i in range(32):
+        path = os.path.join(icons_dir, f'icon-{i}.svg')
+        with open(path, 'w') as f:
+            f.write(ICON_SVG.format(r=40 + i * 2, color=(i * 0x2f1a3) & 0xffffff))
+        icon_files.append(path)
+
+    for i in range(count):
+        lines = [
+            '[Desktop Entry]',
+            'Type=Application',
+            'Version=1.0',
+            f'Name=Application {i:05}',
+        ]
+        lines += [f'Name[{locale}]=Application {i:05} ({locale})' for locale in LOCALES[:i % len(LOCALES)]]
+        lines += [
+            f'Comment=Synthesized entry number {i}',
+            f'Exec=/opt/app{i}/bin/app{i} %U',
+            f'Icon={icon_files[i % len(icon_files)] if i % 3 else THEME_ICONS[i % len(THEME_ICONS)]}',
+            f'Terminal={"true" if i % 7 == 0 else "false"}',
+            f'Hidden={"true" if i % 11 == 0 else "false"}',
+            f'Keywords=app{i};synthetic;bench;',
+            'Categories=Utility;Development;',
+        ]
+        actions = i % 4
+        if actions:
+            lines.append('Actions=' + ''.join(f'action{a};' for a in range(actions)))
+        for a in range(actions):
+            lines += ['', f'[Desktop Action action{a}]', f'Name=Action {a}', f'Exec=/opt/app{i}/bin/app{i} --action {a}']
+        with open(os.path.join(directory, f'app-{i:05}.desktop'), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+def measure(func: Callable[[], int], memory: bool) -> Dict[str, float]:
+    """Run `func`, which returns how many items it processed."""
+    start = time.perf_counter()
+    items = func()
+    seconds = time.perf_counter() - start
+    result = {'items': items, 'seconds': seconds, 'per_second': items / seconds if seconds else 0.0}
+    if memory:
+        tracemalloc.start()
+        func()
+        result['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+
+def have_gi() -> bool:
+    try:
+        import gi  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def have_gtk() -> bool:
+    if not have_gi():
+        return False
+    import gi
+    try:
+        gi.require_version('Gtk', '3.0')
+    except ValueError:
+        return False
+    return True
+
+
+def have_display(resources: Optional[str]) -> bool:
+    if not have_gtk() or not resources:
+        return False
+    from gi.repository import Gtk
+    return Gtk.init_check(sys.argv)[0]
+
+
+class Suite:
+    def __init__(self, data_home: str, memory: bool, resources: Optional[str], sync_dir: str):
+        self.data_home = data_home
+        self.sync_dir = sync_dir
+        self.memory = memory
+        self.resources = resources
+        self.gi = have_gi()
+        self.gtk = have_gtk()
+        self.display = have_display(resources)
+        self._timed_seconds: Optional[float] = None
+        # Like the application does in do_startup, before any template is built
+        if self.gi and resources:
+            from gi.repository import Gio
+            Gio.Resource.load(resources)._register()
+
+    def benchmarks(self) -> Dict[str, Optional[Callable[[str], int]]]:
+        return {
+            'parse_summary': self.parse_summary,
+            'load_available_apps': self.load_available_apps if self.gi else None,
+            'rescan_unchanged': self.rescan_unchanged if self.gi else None,
+            'restore_from_cache': self.restore_from_cache if self.gi else None,
+            'make_desktop_file': self.make_desktop_file,
+            'make_desktop_file_synced': self.make_desktop_file_synced,
+            'health_scan': self.health_scan,
+            'app_list_row': self.app_list_row if self.display else None,
+        }
+
+    def timed(self, seconds: float) -> None:
+        # The second, memory traced run would report a skewed time
+        if not tracemalloc.is_tracing():
+            self._timed_seconds = seconds
+
+    def files(self, directory: str) -> List[str]:
+        return [os.path.join(directory, name) for name in os.listdir(directory)]
+
+    def parse_summary(self, directory: str) -> int:
+        paths = self.files(directory)
+        for path in paths:
+            EntrySummary.read(path)
+        return len(paths)
+
+    def load_available_apps(self, directory: str) -> int:
+        """The background loader of the installed apps page, until complete."""
+        from gi.repository import GLib
+        from turtle.catalog import Catalog
+        from turtle.loader import AppsLoader
+
+        loop = GLib.MainLoop()
+        catalog = Catalog([directory])
+        rows = []
+
+        def apply(splices):
+            for splice in splices:
+                rows[splice.position:splice.position + splice.n_removals] = splice.additions
+            if loader.complete:
+                loop.quit()
+
+        loader = AppsLoader(catalog, apply)
+        loader.load()
+        loop.run()
+        loader.shutdown()
+        return len(rows)
+
+    def rescan_unchanged(self, directory: str) -> int:
+        """Coming back to the page when nothing changed."""
+        from turtle.catalog import Catalog
+
+        catalog = Catalog([directory])
+        catalog.refresh()
+        start = time.perf_counter()
+        catalog.refresh()
+        self.timed(time.perf_counter() - start)
+        return len(catalog)
+
+    def restore_from_cache(self, directory: str) -> int:
+        """Showing the page on a warm start: rows of the previous session."""
+        from turtle.cache import CatalogCache
+        from turtle.catalog import Catalog
+        from turtle.desktop_entry import locale_candidates
+
+        catalog = Catalog([directory])
+        catalog.refresh()
+        cache = CatalogCache(os.path.join(self.data_home, 'catalog.bin'))
+        cache.save(catalog.directories, locale_candidates(), catalog.snapshot())
+
+        start = time.perf_counter()
+        catalog = Catalog([directory])
+        catalog.restore(cache.load(catalog.directories, locale_candidates()))
+        self.timed(time.perf_counter() - start)
+        return len(catalog)
+
+    def make_desktop_file(self, directory: str, parent: Optional[str] = None) -> int:
+        """Creating entries the way batch mode and bulk creation do: atomic,
+        synced writes renamed into place together."""
+        from turtle.batch import Entry, write_entries
+
+        count = len(os.listdir(directory))
+        entries = [Entry(name=f'Application {i}', exec_path=f'/opt/app{i}/bin/app',
+                         icon_path='/opt/icon.svg', terminal=bool(i % 2))
+                   for i in range(count)]
+        target = tempfile.mkdtemp(prefix='turtle-bench-', dir=parent or self.data_home)
+        try:
+            write_entries(entries, target, out=io.StringIO())
+        finally:
+            shutil.rmtree(target)
+        return count
+
+    def make_desktop_file_synced(self, directory: str) -> int:
+        """The same, on a filesystem where syncing costs what it does for users."""
+        return self.make_desktop_file(directory, self.sync_dir)
+
+    def health_scan(self, directory: str) -> int:
+        """Looking for missing programs and icons, with nothing cached yet."""
+        from turtle.health import HealthScanner
+
+        entries = []
+        for path in self.files(directory):
+            summary = EntrySummary.read(path)
+            entries.append((path, summary.exec, summary.icon))
+        scanner = HealthScanner()
+        start = time.perf_counter()
+        scanner.scan(entries)
+        self.timed(time.perf_counter() - start)
+        scanner.shutdown()
+        return len(entries)
+
+    def app_list_row(self, directory: str) -> int:
+        from turtle.appdata import AppData
+        from turtle.widgets.app_list_row import AppListRow
+
+        paths = self.files(directory)[:MAX_ROWS]
+        rows = [AppListRow(AppData(path)) for path in paths]
+        for row in rows:
+            row.destroy()
+        return len(rows)
+
+    def cold_start(self) -> Dict[str, float]:
+        """Time to a usable process: batch mode, importing the GUI modules
+        and the GUI up to the first frame of its window."""
+        env = dict(os.environ, XDG_DATA_HOME=self.data_home, PYTHONPATH=ROOT)
+        manifest = os.path.join(self.data_home, 'manifest.json')
+        with open(manifest, 'w') as f:
+            json.dump([{'name': 'Cold', 'exec': '/bin/true'}], f)
+
+        commands = {
+            'batch': [sys.executable, '-c',
+                      'import sys; from turtle import batch; '
+                      f'sys.exit(batch.main(["--batch", {manifest!r}, "--no-update-database", '
+                      f'"--directory", {os.path.join(self.data_home, "cold")!r}]))'],
+        }
+        if self.gtk:
+            commands['import_gui'] = [sys.executable, '-c', 'import turtle.main']
+        if self.display:
+            commands['first_frame'] = [sys.executable, '-c', FIRST_FRAME, self.resources, '--profile-startup']
+
+        results = {}
+        for name, command in commands.items():
+            timings = []
+            for _ in range(5):
+                start = time.perf_counter()
+                with subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True) as process:
+                    # The first frame is printed, the other commands are timed until they exit
+                    for line in process.stdout:
+                        if line.strip() == 'first frame':
+                            timings.append(time.perf_counter() - start)
+                    process.wait()
+                if process.returncode:
+                    raise subprocess.CalledProcessError(process.returncode, command)
+                if name != 'first_frame':
+                    timings.append(time.perf_counter() - start)
+            results[name] = {'items': 1, 'seconds': min(timings), 'per_second': 1 / min(timings)}
+        return results
+
+    def run(self, sizes: List[int]) -> Dict:
+        results: Dict[str, Dict] = {}
+        for size in sizes:
+            directory = os.path.join(self.data_home, f'set-{size}', 'applications')
+            synthesize(directory, size)
+            for name, func in self.benchmarks().items():
+                if func is None:
+                    results.setdefault(name, {})['skipped'] = True
+                    continue
+                # Benchmarks that need a warm up only time their second part
+                self._timed_seconds = None
+                result = measure(lambda: func(directory), self.memory)
+                if self._timed_seconds is not None:
+                    result['seconds'] = self._timed_seconds
+                    result['per_second'] = size / self._timed_seconds if self._timed_seconds else 0.0
+                results.setdefault(name, {})[str(size)] = result
+                print(f"{name:>24} {size:>7}: {result['seconds'] * 1000:10.1f} ms "
+                      f"{result['per_second']:12.0f}/s"
+                      + (f" {result['peak_kib']:10.0f} KiB" if 'peak_kib' in result else ''),
+                      file=sys.stderr)
+            shutil.rmtree(os.path.dirname(directory))
+
+        for name, result in self.cold_start().items():
+            results.setdefault('cold_start', {})[name] = result
+            print(f"{'cold_start':>24} {name:>7}: {result['seconds'] * 1000:10.1f} ms", file=sys.stderr)
+        return results
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Return a message for every measurement that regressed."""
+    failures = []
+    for name, sizes in baseline.get('results', {}).items():
+        for size, old in sizes.items():
+            new = results.get(name, {}).get(size)
+            if not isinstance(old, dict) or not isinstance(new, dict):
+                continue
+            if old.get('per_second') and new['per_second'] < old['per_second'] * (1 - max_regression):
+                failures.append(f"{name}[{size}]: {new['per_second']:.0f}/s, was {old['per_second']:.0f}/s")
+            if old.get('peak_kib') and new.get('peak_kib', 0) > old['peak_kib'] * (1 + max_regression):
+                failures.append(f"{name}[{size}]: {new['peak_kib']:.0f} KiB, was {old['peak_kib']:.0f} KiB")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Turtle startup and page load benchmarks.")
+    parser.add_argument('--sizes', default='100,1000,10000,50000')
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON results to compare with")
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help="allowed relative regression (default: %(default)s)")
+    parser.add_argument('--no-memory', action='store_true', help="skip the memory measurements")
+    parser.add_argument('--resources', help="compiled gresource, needed for the widget benchmarks")
+    parser.add_argument('--sync-dir', default=os.getcwd(),
+                        help="directory on a disk backed filesystem for the synced writes "
+                             "(default: the current directory)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    with tempfile.TemporaryDirectory(prefix='turtle-bench-') as data_home:
+        os.environ['XDG_DATA_HOME'] = data_home
+        suite = Suite(data_home, not args.no_memory, args.resources, args.sync_dir)
+        results = suite.run(sizes)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            failures = compare(results, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
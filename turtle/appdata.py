@@ -0,0 +1,116 @@
+# appdata.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""The entries of the app list, kept by the catalog.
+
+Nothing here imports Gtk: the catalog, loader and library build and
+update entries in worker threads and headless tools.
+"""
+from typing import Optional
+
+from gi.repository import GObject
+
+from turtle import trace
+from turtle.desktop_entry import DesktopEntry, EntrySummary
+from turtle.validator import Verdict
+
+
+class AppData(GObject.GObject):
+    """An entry of the app list.
+
+    Only the compact `summary` stays in memory, the complete document is
+    read from disk when a value is changed and released once it is saved.
+    """
+    filepath: str
+    summary: EntrySummary
+
+    def __init__(self, filepath, summary: Optional[EntrySummary] = None):
+        GObject.GObject.__init__(self)
+
+        self.filepath = filepath
+        # Entries of system folders are saved as an override in the user's folder
+        self.save_path = filepath
+        self.summary = summary or EntrySummary.read(filepath)
+        self._entry: Optional[DesktopEntry] = None
+        # What the validator and the health scan found, empty until they ran
+        self.issues: Verdict = ()
+        self.health: Verdict = ()
+
+    @property
+    def entry(self) -> DesktopEntry:
+        if self._entry is None:
+            self._entry = DesktopEntry.read(self.filepath)
+        return self._entry
+
+    def save(self):
+        with trace.span('save_entry', path=self.save_path):
+            self.entry.write(self.save_path)
+        self._entry = None
+
+    @property
+    def name(self) -> str:
+        return self.summary.name
+
+    @name.setter
+    def name(self, value: str) -> None:
+        self.entry.set('Name', value)
+        self.summary.name = value
+
+    @property
+    def hidden(self) -> bool:
+        return self.summary.hidden
+
+    @hidden.setter
+    def hidden(self, value) -> None:
+        self.entry.set_bool('Hidden', value)
+        self.summary.hidden = value
+
+    @property
+    def terminal(self) -> bool:
+        return self.summary.terminal
+
+    @terminal.setter
+    def terminal(self, value) -> None:
+        self.entry.set_bool('Terminal', value)
+        self.summary.terminal = value
+
+    @property
+    def icon(self) -> str:
+        return self.summary.icon
+
+    @property
+    def keywords(self) -> str:
+        return self.summary.keywords
+
+    @keywords.setter
+    def keywords(self, value) -> None:
+        self.entry.set('Keywords', value)
+        self.summary.keywords = value
+
+    def __repr__(self):
+        return f"{self.name}"
@@ -0,0 +1,301 @@
+# archive.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+"""Copy menu entries, and the icon files they use, to other computers.
+
+    turtle --export launchers.tar.gz
+    turtle --import launchers.tar.gz
+    turtle --export - | ssh workstation turtle --import -
+
+The archive is a tar stream starting with `manifest.json`, which lists
+the size and SHA-1 of every entry and icon. Import compares them with the
+local files before reading the rest of the stream and only writes what
+differs, renaming everything into place at once, so menu daemons
+re-index the changed entries only.
+
+Icons that aren't at the same path on this computer are saved in Turtle's
+icons folder, named by content like the extracted ones, and the entries
+are pointed at them.
+
+This module must not import Gtk, Granite or Handy.
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import posixpath
+import sys
+import tarfile
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, TextIO, Tuple
+
+from turtle.batch import update_database
+from turtle.desktop_entry import DesktopEntry, DesktopEntryError
+from turtle.writer import WriteBatch
+from turtle.xdg import user_applications_dir, user_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when the manifest changes in a way older versions can't read
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+ENTRIES_FOLDER = 'entries'
+ICONS_FOLDER = 'icons'
+CHUNK_SIZE = 1 << 16
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+class ImportResult(NamedTuple):
+    # Entries and icons that were created or replaced
+    written: List[str]
+    unchanged: int
+
+
+def _digest_file(path: str) -> Tuple[int, str]:
+    """Return the size and SHA-1 of the file at `path`."""
+    digest = hashlib.sha1()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def _has_content(path: str, size: int, sha1: str) -> bool:
+    """Whether `path` holds the described content, only reading it when
+    the size matches."""
+    try:
+        return os.stat(path).st_size == size and _digest_file(path)[1] == sha1
+    except OSError:
+        return False
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = 0o644
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _entry_path(directory: str, name: str) -> str:
+    """Return where the entry `name` of a manifest goes, refusing names
+    that would end up outside of `directory`."""
+    normalized = posixpath.normpath(name)
+    if normalized.startswith(('/', '../')) or normalized == '..' or not normalized.endswith('.desktop'):
+        raise ArchiveError(f"invalid entry name: {name}")
+    return os.path.join(directory, *normalized.split('/'))
+
+
+def _icon_path(icons_directory: str, sha1: str, extension: str) -> str:
+    if len(sha1) != 40 or sha1.strip('0123456789abcdef') or '/' in extension or os.sep in extension:
+        raise ArchiveError(f"invalid icon: {sha1}{extension}")
+    return os.path.join(icons_directory, sha1 + extension)
+
+
+def export_entries(directory: str, stream: BinaryIO) -> int:
+    """Write the entries of `directory` and their icon files to `stream`,
+    returns the number of entries."""
+    from turtle.validator import find_entries
+
+    entries = []
+    contents: Dict[str, bytes] = {}
+    icons: Dict[str, Dict] = {}
+    icon_digests: Dict[str, Optional[str]] = {}
+    for path in find_entries([directory]):
+        name = os.path.relpath(path, directory).replace(os.sep, '/')
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            logger.warning("Can't export %s: %s", path, e.strerror)
+            continue
+        record = {'name': name, 'size': len(data), 'sha1': hashlib.sha1(data).hexdigest()}
+
+        try:
+            icon = DesktopEntry(data).get('Icon')
+        except DesktopEntryError as e:
+            # Copied as is, there's no icon path to rewrite on import
+            logger.warning("Exporting %s without its icon: %s", path, e)
+            icon = ''
+        if icon.startswith('/'):
+            if icon not in icon_digests:
+                icon_digests[icon] = None
+                try:
+                    size, sha1 = _digest_file(icon)
+                except OSError:
+                    pass
+                else:
+                    icon_digests[icon] = sha1
+                    icons.setdefault(sha1, {'size': size, 'source': icon,
+                                            'extension': os.path.splitext(icon)[1]})
+            if icon_digests[icon]:
+                record['icon'] = icon_digests[icon]
+        entries.append(record)
+        contents[name] = data
+
+    manifest = {'version': FORMAT_VERSION, 'entries': entries, 'icons': icons}
+    with tarfile.open(fileobj=stream, mode='w|gz') as tar:
+        _add_bytes(tar, MANIFEST, json.dumps(manifest).encode('utf-8'))
+        # Icons first, an entry is never renamed into place before its icon
+        for sha1, icon in icons.items():
+            info = tarfile.TarInfo(f"{ICONS_FOLDER}/{sha1}")
+            info.size = icon['size']
+            info.mode = 0o644
+            with open(icon['source'], 'rb') as f:
+                tar.addfile(info, f)
+        for record in entries:
+            _add_bytes(tar, f"{ENTRIES_FOLDER}/{record['name']}", contents[record['name']])
+    return len(entries)
+
+
+def _read_manifest(tar: tarfile.TarFile) -> Dict:
+    member = tar.next()
+    if member is None or member.name != MANIFEST:
+        raise ArchiveError(f"not a Turtle archive, it doesn't start with {MANIFEST}")
+    try:
+        manifest = json.load(tar.extractfile(member))
+    except ValueError as e:
+        raise ArchiveError(f"invalid manifest: {e}")
+    if not isinstance(manifest, dict) or manifest.get('version') != FORMAT_VERSION:
+        raise ArchiveError("unsupported archive version, it was made by another version of Turtle")
+    return manifest
+
+
+def import_entries(stream: BinaryIO, directory: str, icons_directory: Optional[str] = None,
+                   out: TextIO = sys.stdout) -> ImportResult:
+    """Write the entries and icons of the archive in `stream` that differ
+    from the local files, and report each one written."""
+    icons_directory = icons_directory or os.path.join(user_data_dir(), ICONS_FOLDER)
+    written: List[str] = []
+    unchanged = 0
+    try:
+        with tarfile.open(fileobj=stream, mode='r|*') as tar:
+            manifest = _read_manifest(tar)
+
+            # Everything that can be decided from the hashes is decided before reading on
+            icon_paths: Dict[str, str] = {}
+            wanted: Dict[str, Tuple[str, str, Optional[str]]] = {}
+            for sha1, icon in manifest['icons'].items():
+                if _has_content(icon['source'], icon['size'], sha1):
+                    icon_paths[sha1] = icon['source']
+                    continue
+                icon_path = _icon_path(icons_directory, sha1, icon['extension'])
+                icon_paths[sha1] = icon_path
+                if not _has_content(icon_path, icon['size'], sha1):
+                    wanted[f"{ICONS_FOLDER}/{sha1}"] = (icon_path, sha1, None)
+            for record in manifest['entries']:
+                path = _entry_path(directory, record['name'])
+                icon = record.get('icon')
+                # An entry pointed at another icon path differs from the exported one anyway
+                relocated = icon is not None and icon_paths[icon] != manifest['icons'][icon]['source']
+                if not relocated and _has_content(path, record['size'], record['sha1']):
+                    unchanged += 1
+                    continue
+                wanted[f"{ENTRIES_FOLDER}/{record['name']}"] = (path, record['sha1'],
+                                                                 icon_paths[icon] if relocated else None)
+
+            with WriteBatch() as batch:
+                # Read to the end even when nothing is left to write, an exporting
+                # process writing into a pipe would fail otherwise
+                member = tar.next()
+                while member is not None:
+                    target = wanted.pop(member.name, None)
+                    if target is not None:
+                        path, sha1, icon_path = target
+                        data = tar.extractfile(member).read()
+                        if hashlib.sha1(data).hexdigest() != sha1:
+                            raise ArchiveError(f"{member.name} is damaged")
+                        if icon_path is not None:
+                            try:
+                                entry = DesktopEntry(data)
+                            except DesktopEntryError as e:
+                                raise ArchiveError(f"{member.name} is invalid: {e}")
+                            entry.set('Icon', icon_path)
+                            data = entry.to_bytes()
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        existed = os.path.exists(path)
+                        if batch.write(path, data):
+                            written.append(path)
+                            out.write(f"{'updated' if existed else 'created'}\t{path}\n")
+                        else:
+                            unchanged += 1
+                    member = tar.next()
+                if wanted:
+                    raise ArchiveError(f"the archive is truncated, {len(wanted)} files are missing")
+    except (tarfile.TarError, KeyError, TypeError) as e:
+        raise ArchiveError(f"invalid archive: {e}")
+    return ImportResult(written, unchanged)
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="turtle", description="Copy menu entries between computers.")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--export", metavar="ARCHIVE", help="archive to write, - for standard output")
+    action.add_argument("--import", dest="import_", metavar="ARCHIVE",
+                        help="archive to read, - for standard input")
+    parser.add_argument("--directory", default=user_applications_dir(),
+                        help="where the entries are (default: %(default)s)")
+    parser.add_argument("--no-update-database", action="store_true",
+                        help="don't run update-desktop-database after an import")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.export:
+            if args.export == "-":
+                count = export_entries(args.directory, sys.stdout.buffer)
+            else:
+                try:
+                    with open(args.export, "wb") as f:
+                        count = export_entries(args.directory, f)
+                except BaseException:
+                    # Don't leave a truncated archive behind
+                    try:
+                        os.remove(args.export)
+                    except OSError:
+                        pass
+                    raise
+            print(f"exported\t{count}", file=sys.stderr)
+            return 0
+
+        if args.import_ == "-":
+            result = import_entries(sys.stdin.buffer, args.directory)
+        else:
+            with open(args.import_, "rb") as f:
+                result = import_entries(f, args.directory)
+    except (OSError, ArchiveError) as e:
+        print(f"turtle: {e}", file=sys.stderr)
+        return 2
+
+    print(f"unchanged\t{result.unchanged}", file=sys.stderr)
+    if result.written and not args.no_update_database:
+        update_database(args.directory)
+    return 0
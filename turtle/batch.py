@@ -0,0 +1,185 @@
+# batch.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Create many menu entries at once from a manifest, without the GUI.
+
+    turtle --batch manifest.json
+    turtle --batch manifest.csv
+    generate-entries | turtle --batch -
+
+A JSON manifest is a list of objects (or an object with an "entries"
+list), a CSV manifest has a header row. Both use the keys `name`, `exec`,
+`icon`, `terminal` and `version`; only `name` and `exec` are required.
+`exec` is a command line: quote a program path with spaces, as in
+`"/opt/My App/app" --flag`, unless the program is already installed.
+
+This module must not import Gtk, Granite or Handy.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+from typing import Dict, Iterable, List, NamedTuple, Optional, TextIO
+
+from turtle.desktop_entry import desktop_file_path, make_a_desktop
+from turtle.writer import WriteBatch
+from turtle.xdg import user_applications_dir
+
+
+class Entry(NamedTuple):
+    name: str
+    exec_path: str
+    icon_path: str = ""
+    terminal: bool = False
+    app_version: str = "1.0"
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def _to_entry(record: Dict, index: int) -> Entry:
+    name = (record.get("name") or "").strip()
+    exec_path = (record.get("exec") or "").strip()
+    if not name or not exec_path:
+        raise ManifestError(f"entry {index}: `name` and `exec` are required")
+    return Entry(
+        name=name,
+        exec_path=exec_path,
+        icon_path=(record.get("icon") or "").strip(),
+        terminal=_to_bool(record.get("terminal", False)),
+        app_version=str(record.get("version") or "1.0"),
+    )
+
+
+def read_manifest(stream: TextIO, fmt: Optional[str] = None) -> List[Entry]:
+    """Read entries from a JSON or CSV manifest.
+
+    The format is guessed from the first character when not given.
+    """
+    text = stream.read()
+    if fmt is None:
+        fmt = "json" if text.lstrip()[:1] in ("[", "{") else "csv"
+
+    if fmt == "json":
+        try:
+            records = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ManifestError(f"invalid JSON: {e}")
+        if isinstance(records, dict):
+            records = records.get("entries", [])
+        if not isinstance(records, list):
+            raise ManifestError("expected a list of entries")
+    else:
+        records = list(csv.DictReader(io.StringIO(text)))
+
+    return [_to_entry(record, i) for i, record in enumerate(records, 1)]
+
+
+def write_entries(entries: Iterable[Entry], directory: str, out: TextIO = sys.stdout) -> int:
+    """Write every entry to `directory` and report its status, one per line.
+
+    All files are renamed into place together once written, with a single
+    sync of the directory. Returns the number of entries that failed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    failed = 0
+    with WriteBatch() as batch:
+        for entry in entries:
+            path = desktop_file_path(entry.name, directory)
+            data = make_a_desktop(
+                name=entry.name,
+                exec_path=entry.exec_path,
+                icon_path=entry.icon_path,
+                terminal=entry.terminal,
+                app_version=entry.app_version,
+            ).encode("utf-8")
+            try:
+                written = batch.write(path, data)
+            except OSError as e:
+                failed += 1
+                out.write(f"error\t{path}\t{e.strerror}\n")
+                continue
+
+            if not written:
+                out.write(f"unchanged\t{path}\n")
+            elif os.path.isfile(entry.exec_path) and not os.access(entry.exec_path, os.X_OK):
+                out.write(f"warning\t{path}\t{entry.exec_path} is not executable\n")
+            else:
+                out.write(f"created\t{path}\n")
+    return failed
+
+
+def update_database(directory: str) -> None:
+    """Refresh the desktop entries index once for the whole directory."""
+    tool = shutil.which("update-desktop-database")
+    if tool:
+        subprocess.run([tool, directory], check=False)
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="turtle", description="Create menu entries from a manifest.")
+    parser.add_argument("--batch", required=True, metavar="MANIFEST",
+                        help="JSON or CSV manifest, - for standard input")
+    parser.add_argument("--format", choices=("json", "csv"),
+                        help="manifest format, guessed when omitted")
+    parser.add_argument("--directory", default=user_applications_dir(),
+                        help="where to write the entries (default: %(default)s)")
+    parser.add_argument("--no-update-database", action="store_true",
+                        help="don't run update-desktop-database afterwards")
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None and args.batch != "-":
+        extension = os.path.splitext(args.batch)[1].lower()
+        fmt = {".json": "json", ".csv": "csv"}.get(extension)
+
+    try:
+        if args.batch == "-":
+            entries = read_manifest(sys.stdin, fmt)
+        else:
+            with open(args.batch, newline="") as f:
+                entries = read_manifest(f, fmt)
+    except (OSError, ManifestError) as e:
+        print(f"turtle: {e}", file=sys.stderr)
+        return 2
+
+    failed = write_entries(entries, args.directory)
+    if not args.no_update_database:
+        update_database(args.directory)
+    return 1 if failed else 0
@@ -0,0 +1,195 @@
+# bulk.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Changes applied to many entries at once, e.g. from the selection of the
+installed apps list."""
+import logging
+import os
+import stat
+import threading
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from gi.repository import GLib
+
+from turtle.batch import Entry
+from turtle.desktop_entry import DesktopEntry, DesktopEntryError, desktop_file_path, make_a_desktop
+from turtle.writer import WriteBatch
+from turtle.xdg import user_applications_dir
+
+logger = logging.getLogger(__name__)
+
+CREATE = 'create'
+DELETE = 'delete'
+
+# Action name: (key, value) set on every entry
+EDITS: Dict[str, Tuple[str, bool]] = {
+    'hide': ('Hidden', True),
+    'show': ('Hidden', False),
+    'terminal': ('Terminal', True),
+    'no-terminal': ('Terminal', False),
+}
+
+
+class BulkResult(NamedTuple):
+    action: str
+    # Every path that was written, with its previous content for undo;
+    # None when the file didn't exist before, e.g. a user copy of a system
+    # entry
+    previous: List[Tuple[str, Optional[bytes]]]
+    errors: List[Tuple[str, str]]
+
+    @property
+    def paths(self) -> List[str]:
+        return [path for path, _data in self.previous]
+
+
+def apply_bulk(action: str, paths: Iterable[str],
+               targets: Optional[Dict[str, str]] = None) -> BulkResult:
+    """Apply `action` to every entry in `paths` in one batched write.
+
+    Edited entries are written to `targets[path]` when given, so that
+    entries of read-only folders get overridden from the user's one.
+    Entries that already have the requested value are left untouched.
+    """
+    targets = targets or {}
+    previous: List[Tuple[str, Optional[bytes]]] = []
+    errors: List[Tuple[str, str]] = []
+
+    if action == DELETE:
+        directories = set()
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.unlink(path)
+            except OSError as e:
+                errors.append((path, e.strerror))
+                continue
+            previous.append((path, data))
+            directories.add(os.path.dirname(path))
+        for directory in directories:
+            fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        return BulkResult(action, previous, errors)
+
+    key, value = EDITS[action]
+    with WriteBatch() as batch:
+        for path in paths:
+            try:
+                entry = DesktopEntry.read(path)
+                target = targets.get(path, path)
+                if target == path:
+                    data = entry.data
+                else:
+                    data = _read_existing(target)
+                entry.set_bool(key, value)
+                if batch.write(target, entry.to_bytes()):
+                    previous.append((target, data))
+            except (OSError, DesktopEntryError) as e:
+                errors.append((path, str(e)))
+    return BulkResult(action, previous, errors)
+
+
+def create_entries(entries: Iterable[Entry], directory: Optional[str] = None,
+                   make_executable: bool = False) -> BulkResult:
+    """Write a new entry for every one of `entries` in one batched write.
+
+    :params make_executable: set the execute permission on the files the
+        entries run, when they lack it.
+    """
+    directory = directory or user_applications_dir()
+    os.makedirs(directory, exist_ok=True)
+    previous: List[Tuple[str, Optional[bytes]]] = []
+    errors: List[Tuple[str, str]] = []
+
+    with WriteBatch() as batch:
+        for entry in entries:
+            path = desktop_file_path(entry.name, directory)
+            try:
+                data = _read_existing(path)
+                if make_executable and os.path.isfile(entry.exec_path) \
+                        and not os.access(entry.exec_path, os.X_OK):
+                    mode = os.stat(entry.exec_path).st_mode
+                    os.chmod(entry.exec_path, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+                desktop = make_a_desktop(name=entry.name, exec_path=entry.exec_path,
+                                         icon_path=entry.icon_path, terminal=entry.terminal,
+                                         app_version=entry.app_version)
+                if batch.write(path, desktop.encode('utf-8')):
+                    previous.append((path, data))
+            except OSError as e:
+                errors.append((path, e.strerror))
+    return BulkResult(CREATE, previous, errors)
+
+
+def undo_bulk(result: BulkResult) -> List[str]:
+    """Put back the previous content of every entry changed by `result`."""
+    with WriteBatch() as batch:
+        for path, data in result.previous:
+            if data is not None:
+                batch.write(path, data)
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    return result.paths
+
+
+def _read_existing(path: str) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def run_in_background(func: Callable, done: Callable, *args) -> threading.Thread:
+    """Call `func(*args)` in a thread and `done(result)` on the main loop.
+
+    If `func` raises, `done` gets the exception as result, so that callers
+    waiting for it can always recover.
+    """
+    def target():
+        try:
+            result = func(*args)
+        except Exception as e:
+            logger.exception("%s failed", getattr(func, '__name__', func))
+            result = e
+
+        def deliver():
+            done(result)
+            return GLib.SOURCE_REMOVE
+
+        GLib.idle_add(deliver)
+
+    thread = threading.Thread(target=target, name="turtle-bulk", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,111 @@
+# cache.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""On-disk copy of the catalog, so the installed apps page shows up without
+parsing anything on launch.
+
+Every entry is stored with the stat key it was parsed from: once restored,
+the regular refresh only stats the files and re-parses the ones that
+changed since the cache was written.
+"""
+import gc
+import logging
+import marshal
+import os
+from typing import Iterable, List, Optional, Tuple
+
+from turtle.desktop_entry import EntrySummary
+from turtle.writer import write_atomic
+from turtle.xdg import StatKey, user_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the rows changes
+FORMAT_VERSION = 1
+MAGIC = b'turtle-catalog'
+
+# (path, stat key, summary, search index words)
+CachedEntry = Tuple[str, StatKey, EntrySummary, Tuple[str, ...]]
+
+
+class CatalogCache:
+    """A single marshal-ed file in $XDG_CACHE_HOME/turtle.
+
+    The cache is only used for the same folders, locale and Python version
+    it was written with; anything else is treated as a miss.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(user_cache_dir(), 'catalog.bin')
+
+    def _header(self, directories: List[str], locales: Tuple[str, ...]) -> tuple:
+        return MAGIC, FORMAT_VERSION, marshal.version, tuple(directories), locales
+
+    def load(self, directories: List[str], locales: Tuple[str, ...]) -> List[CachedEntry]:
+        # Tens of thousands of new objects would trigger useless collections
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._load(directories, locales)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _load(self, directories: List[str], locales: Tuple[str, ...]) -> List[CachedEntry]:
+        try:
+            with open(self.path, 'rb') as f:
+                header, rows = marshal.loads(f.read())
+        except FileNotFoundError:
+            return []
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.warning("Ignoring catalog cache %s: %s", self.path, e)
+            return []
+        if header != self._header(directories, locales):
+            return []
+
+        return [
+            (path, (mtime, size, ino), EntrySummary(name, icon, keywords, exec_, categories, flags), words)
+            for path, mtime, size, ino, name, icon, keywords, exec_, categories, flags, words in rows
+        ]
+
+    def save(self, directories: List[str], locales: Tuple[str, ...], entries: Iterable[CachedEntry]) -> bool:
+        """Write `entries`, returns False when the cache couldn't be written."""
+        rows = [
+            (path, key[0], key[1], key[2], summary.name, summary.icon, summary.keywords,
+             summary.exec, summary.categories, summary.flags, words)
+            for path, key, summary, words in entries
+        ]
+        data = marshal.dumps((self._header(directories, locales), rows))
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Losing the cache on a crash only costs a slower launch
+            write_atomic(self.path, data, fsync=False)
+        except OSError as e:
+            logger.warning("Can't write catalog cache %s: %s", self.path, e)
+            return False
+        return True
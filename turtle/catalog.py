@@ -0,0 +1,326 @@
+# catalog.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+import bisect
+import locale
+import logging
+import os
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from turtle import trace
+from turtle.appdata import AppData
+from turtle.cache import CachedEntry
+from turtle.desktop_entry import DesktopEntryError
+from turtle.search import SearchIndex, index_words
+from turtle.xdg import StatKey, XdgScanner
+
+logger = logging.getLogger(__name__)
+
+
+SORT_NAME = 'name'
+SORT_MODIFIED = 'modified'
+SORT_HIDDEN = 'hidden'
+SORT_MODES = (SORT_NAME, SORT_MODIFIED, SORT_HIDDEN)
+
+# Untouched rows a merged splice may replace, see `Catalog.coalesce`
+COALESCE_SLACK = 64
+
+# Compared as tuples, the path last so every key is unique
+SortKey = Tuple[Any, ...]
+
+
+def collate_key(text: str) -> str:
+    """Return a key ordering `text` like the user's locale (LC_COLLATE,
+    set up by GTK) does, ignoring case."""
+    try:
+        return locale.strxfrm(text.casefold())
+    except ValueError:
+        # Embedded null character
+        return text.casefold()
+
+
+class Splice(NamedTuple):
+    """A single `Gio.ListStore.splice` call: remove `n_removals` items
+    starting at `position` and insert `additions` in their place."""
+    position: int
+    n_removals: int
+    additions: List[AppData]
+
+
+class Catalog:
+    """Persistent in-memory index of the .desktop files in applications folders.
+
+    `directories` are merged by desktop file ID, the first one having an ID
+    wins; the first directory is the user's, where changes are saved.
+
+    Every entry remembers the stat key it was parsed from, so `refresh` only
+    re-parses files that were added or changed since the previous call and
+    describes the difference as a list of splices for the list store.
+
+    Rows are kept sorted by `sort_mode`: the sort key of every entry is
+    computed once, and entries are placed by binary search when they
+    change, so an update costs a single splice rather than a re-sort.
+    """
+
+    def __init__(self, directories: List[str], factory: Callable[..., AppData] = AppData,
+                 sort_mode: str = SORT_NAME):
+        self.directories = directories
+        self.directory = directories[0]
+        self.scanner = XdgScanner(directories)
+        self.factory = factory
+        self.sort_mode = sort_mode
+        self.entries: Dict[str, Tuple[StatKey, AppData]] = {}
+        # Paths in the same order as the rows of the list store
+        self.order: List[str] = []
+        # Sort keys of `order`, position by position
+        self._keys: List[SortKey] = []
+        self._sort_keys: Dict[str, SortKey] = {}
+        self.index = SearchIndex()
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.entries
+
+    def get(self, path: str) -> AppData:
+        return self.entries[path][1]
+
+    def search(self, query: str) -> Optional[List[int]]:
+        """Return the sorted positions of the entries matching `query`,
+        or None when everything matches."""
+        paths = self.index.search(query)
+        if paths is None:
+            return None
+        return sorted(self._position(path) for path in paths)
+
+    def scan(self) -> Dict[str, StatKey]:
+        """Return the stat keys of the visible entries, safe to call from a
+        worker thread."""
+        return self.scanner.scan()
+
+    def refresh(self) -> List[Splice]:
+        """Bring the catalog up to date with the directories.
+
+        Unchanged files are not read at all; the returned splices turn the
+        previous state of the list store into the current one.
+        """
+        return self.update(self.scan())
+
+    def sync(self, paths: Iterable[str]) -> List[Splice]:
+        """Re-check only `paths`, e.g. the ones reported by a file monitor,
+        and return a single splice covering all of the changes."""
+        removed, current = self.scanner.update(paths)
+        changed = {path: key for path, key in current.items() if self.is_stale(path, key)}
+
+        old_len = len(self.order)
+        return self.coalesce(self.apply(removed, changed), old_len)
+
+    def touch(self, paths: Iterable[str]) -> List[Splice]:
+        """Return splices that show the entries of `paths` again, after they
+        were changed in place."""
+        return [Splice(self._position(path), 1, [self.entries[path][1]])
+                for path in paths if path in self.entries]
+
+    def coalesce(self, splices: List[Splice], old_len: int) -> List[Splice]:
+        """Merge sequential `splices` into one that replaces only the range
+        between the first and the last touched rows, unless that range is
+        mostly untouched rows, e.g. for a row moved far away."""
+        if len(splices) < 2:
+            return splices
+
+        head = old_len
+        tail = old_len
+        length = old_len
+        touched = 0
+        for splice in splices:
+            head = min(head, splice.position)
+            tail = min(tail, length - splice.position - splice.n_removals)
+            length += len(splice.additions) - splice.n_removals
+            touched += splice.n_removals + len(splice.additions)
+
+        if (old_len - head - tail) + (length - head - tail) > 2 * touched + COALESCE_SLACK:
+            return splices
+
+        paths = self.order[head:length - tail]
+        return [Splice(head, old_len - head - tail, [self.entries[path][1] for path in paths])]
+
+    def update(self, found: Dict[str, StatKey]) -> List[Splice]:
+        removed = [path for path in self.entries if path not in found]
+        changed = {path: key for path, key in found.items() if self.is_stale(path, key)}
+        return self.apply(removed, changed)
+
+    def is_stale(self, path: str, key: StatKey) -> bool:
+        return path not in self.entries or self.entries[path][0] != key
+
+    def apply(self,
+              removed: List[str],
+              changed: Dict[str, StatKey],
+              parsed: Optional[Dict[str, Optional[AppData]]] = None,
+              ) -> List[Splice]:
+        """Drop `removed` paths and (re)parse `changed` ones.
+
+        :params parsed: entries that were already parsed elsewhere, e.g. in
+            a worker thread. Paths missing from it are parsed here.
+        """
+        parsed = parsed or {}
+
+        def parse(path: str) -> Optional[AppData]:
+            return parsed[path] if path in parsed else self.parse(path)
+
+        if not self.order:
+            return self._load_all(changed, parse)
+
+        splices: List[Splice] = []
+        for path in removed:
+            if self.entries.pop(path, None) is None:
+                continue
+            self.index.remove(path)
+            splices.append(Splice(self._remove(path), 1, []))
+
+        for path, key in changed.items():
+            app_data = parse(path)
+            if app_data is None:
+                if self.entries.pop(path, None) is not None:
+                    self.index.remove(path)
+                    splices.append(Splice(self._remove(path), 1, []))
+                continue
+
+            self.index.add(path, app_data.summary.search_fields())
+            sort_key = self.sort_key(path, key, app_data)
+            self.entries[path] = (key, app_data)
+            if self._sort_keys.get(path) == sort_key:
+                splices.append(Splice(self._position(path), 1, [app_data]))
+                continue
+            if path in self._sort_keys:
+                # Renamed or otherwise moved
+                splices.append(Splice(self._remove(path), 1, []))
+            splices.append(Splice(self._insert(path, sort_key), 0, [app_data]))
+
+        return splices
+
+    def sort_key(self, path: str, key: StatKey, app_data: AppData) -> SortKey:
+        name = collate_key(app_data.summary.name)
+        if self.sort_mode == SORT_MODIFIED:
+            # Most recently modified first
+            return -key[0], name, path
+        if self.sort_mode == SORT_HIDDEN:
+            # Hidden entries last
+            return app_data.summary.hidden, name, path
+        return name, path
+
+    def set_sort_mode(self, sort_mode: str) -> List[Splice]:
+        """Order the entries by `sort_mode`, one of SORT_MODES, and return
+        the splice reordering the list store."""
+        if sort_mode == self.sort_mode:
+            return []
+        self.sort_mode = sort_mode
+        if not self.order:
+            return []
+        self._fill([(path, key, app_data) for path, (key, app_data) in self.entries.items()])
+        return [Splice(0, len(self.order), [self.entries[path][1] for path in self.order])]
+
+    def _fill(self, entries: List[Tuple[str, StatKey, AppData]]) -> None:
+        rows = sorted((self.sort_key(path, key, app_data), path) for path, key, app_data in entries)
+        self._keys = [sort_key for sort_key, _path in rows]
+        self.order = [path for _sort_key, path in rows]
+        self._sort_keys = dict(zip(self.order, self._keys))
+
+    def _insert(self, path: str, sort_key: SortKey) -> int:
+        position = bisect.bisect_left(self._keys, sort_key)
+        self._keys.insert(position, sort_key)
+        self.order.insert(position, path)
+        self._sort_keys[path] = sort_key
+        return position
+
+    def _remove(self, path: str) -> int:
+        position = bisect.bisect_left(self._keys, self._sort_keys.pop(path))
+        del self._keys[position]
+        del self.order[position]
+        return position
+
+    def _load_all(self, changed: Dict[str, StatKey],
+                  parse: Callable[[str], Optional[AppData]]) -> List[Splice]:
+        words = []
+        loaded = []
+        for path, key in changed.items():
+            app_data = parse(path)
+            if app_data is not None:
+                self.entries[path] = (key, app_data)
+                words.append((path, index_words(app_data.summary.search_fields())))
+                loaded.append((path, key, app_data))
+        self.index.extend(words)
+        if not loaded:
+            return []
+        self._fill(loaded)
+        return [Splice(0, 0, [self.entries[path][1] for path in self.order])]
+
+    def restore(self, cached: List[CachedEntry]) -> List[Splice]:
+        """Fill an empty catalog from the cache without reading any file.
+
+        The entries keep the stat keys they were cached with, so the next
+        `refresh` re-parses only the files changed since.
+        """
+        if self.order:
+            return []
+        user_prefix = self.directory + os.sep
+        restored = []
+        for path, key, summary, _words in cached:
+            app_data = self.factory(path, summary)
+            if not path.startswith(user_prefix):
+                app_data.save_path = self.scanner.writable_path(path)
+            self.entries[path] = (key, app_data)
+            restored.append((path, key, app_data))
+        self.index.extend((path, words) for path, _key, _summary, words in cached)
+        if not restored:
+            return []
+        self._fill(restored)
+        return [Splice(0, 0, [self.entries[path][1] for path in self.order])]
+
+    def snapshot(self) -> List[CachedEntry]:
+        """Return what `restore` needs to rebuild the catalog as it is now.
+
+        Entries are in row order, which makes sorting them again on restore
+        nearly free.
+        """
+        entries = self.entries
+        return [(path, entries[path][0], entries[path][1].summary, self.index.words(path)) for path in self.order]
+
+    def _position(self, path: str) -> int:
+        return bisect.bisect_left(self._keys, self._sort_keys[path])
+
+    def parse(self, path: str) -> Optional[AppData]:
+        """Parse a single file, safe to call from a worker thread."""
+        try:
+            with trace.span('parse_entry', path=path):
+                app_data = self.factory(path)
+            app_data.save_path = self.scanner.writable_path(path)
+            return app_data
+        except (OSError, DesktopEntryError) as e:
+            logger.warning("Skipping %s: %s", path, e)
+            return None
@@ -30,3 +30,6 @@ APP_ID = "com.github.tenderowl.turtle"
 RESOURCE_PREFIX = "/com/github/tenderowl/turtle"
 
 APPS_PATH_PREFIX = "~/.local/share/applications/"
+
+# Only create widgets for the visible rows of the installed apps list
+VIRTUAL_LIST = True
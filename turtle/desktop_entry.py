@@ -0,0 +1,504 @@
+# desktop_entry.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Reader and writer for freedesktop.org Desktop Entry files.
+
+https://specifications.freedesktop.org/desktop-entry-spec/latest/
+"""
+import os
+import re
+import shlex
+import sys
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+from turtle.writer import write_atomic
+from turtle.xdg import user_applications_dir
+
+DESKTOP_SECTION = 'Desktop Entry'
+
+# Keys the app list needs, everything else is parsed on demand
+SUMMARY_KEYS = frozenset(('Name', 'Icon', 'Hidden', 'Terminal', 'Keywords', 'Exec', 'Categories'))
+
+FIELD_CODE = re.compile(r'%[a-zA-Z%]')
+
+_ESCAPES = {'s': ' ', 'n': '\n', 't': '\t', 'r': '\r', '\\': '\\'}
+
+# Characters of an Exec argument that only have their literal meaning quoted
+EXEC_RESERVED = frozenset(' \t\n"\'\\><~|&;$*?#()`')
+
+
+class DesktopEntryError(ValueError):
+    pass
+
+
+def unescape(value: str) -> str:
+    """Decode \\s, \\n, \\t, \\r and \\\\ escape sequences."""
+    if '\\' not in value:
+        return value
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            result.append(_ESCAPES.get(escaped, '\\' + escaped))
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def escape(value: str) -> str:
+    value = value.replace('\\', '\\\\').replace('\n', '\\n').replace('\t', '\\t').replace('\r', '\\r')
+    # Only leading spaces need escaping, the rest are kept as is
+    stripped = value.lstrip(' ')
+    return '\\s' * (len(value) - len(stripped)) + stripped
+
+
+def split_list(value: str) -> List[str]:
+    """Split a `;` separated list value, honouring escaped semicolons."""
+    items = []
+    current = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            if escaped == ';':
+                current.append(';')
+            else:
+                current.append(_ESCAPES.get(escaped, '\\' + escaped))
+        elif char == ';':
+            items.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    if current:
+        items.append(''.join(current))
+    return items
+
+
+def join_list(values: Iterable[str]) -> str:
+    return ''.join(escape(value).replace(';', '\\;') + ';' for value in values)
+
+
+def parse_bool(value: Optional[str], default: bool = False) -> bool:
+    if value is None:
+        return default
+    # "0" and "1" come from the deprecated 0.9.x syntax
+    return value.strip() in ('true', '1')
+
+
+@lru_cache(maxsize=None)
+def locale_candidates(locale: Optional[str] = None) -> Tuple[str, ...]:
+    """Return the locale keys to try, best match first, as described in the
+    "Localized values for keys" section of the spec.
+
+    For example, `sr_YU.UTF-8@Latn` gives
+    `('sr_YU@Latn', 'sr_YU', 'sr@Latn', 'sr')`.
+    """
+    if locale is None:
+        for var in ('LC_ALL', 'LC_MESSAGES', 'LANG'):
+            locale = os.environ.get(var)
+            if locale:
+                break
+    if not locale or locale in ('C', 'POSIX'):
+        return ()
+
+    lang, _, modifier = locale.partition('@')
+    lang = lang.partition('.')[0]
+    lang, _, country = lang.partition('_')
+
+    candidates = []
+    if country and modifier:
+        candidates.append(f'{lang}_{country}@{modifier}')
+    if country:
+        candidates.append(f'{lang}_{country}')
+    if modifier:
+        candidates.append(f'{lang}@{modifier}')
+    candidates.append(lang)
+    return tuple(candidates)
+
+
+def _split_key(key: str) -> Tuple[str, Optional[str]]:
+    if key.endswith(']'):
+        base, _, locale = key[:-1].partition('[')
+        return base, locale
+    return key, None
+
+
+def parse_summary(data: bytes,
+                  keys: FrozenSet[str] = SUMMARY_KEYS,
+                  locales: Tuple[str, ...] = ()) -> Dict[str, str]:
+    """Read only `keys` of the [Desktop Entry] group in one pass over `data`.
+
+    Localized variants are kept for `locales` only, so a `Name[xx]` for any
+    other language is skipped without being decoded. Parsing stops at the
+    end of the group, or as soon as every key is found when no locales are
+    requested. Values are returned raw, without unescaping.
+    """
+    found: Dict[str, str] = {}
+    wanted = len(keys)
+    in_group = False
+    pos = 0
+    end = len(data)
+
+    while pos < end:
+        eol = data.find(b'\n', pos)
+        if eol == -1:
+            eol = end
+        line = data[pos:eol].strip()
+        pos = eol + 1
+
+        if not line or line[0] == 0x23:  # '#'
+            continue
+        if line[0] == 0x5b:  # '['
+            if in_group:
+                break
+            in_group = line == b'[Desktop Entry]'
+            if not in_group:
+                raise DesktopEntryError("The first group must be [Desktop Entry]")
+            continue
+        if not in_group:
+            raise DesktopEntryError("Key outside of any group")
+
+        key, sep, value = line.partition(b'=')
+        if not sep:
+            continue
+        key = key.rstrip().decode('utf-8', 'replace')
+        base, locale = _split_key(key)
+        if base not in keys or (locale is not None and locale not in locales):
+            continue
+        found[key] = value.lstrip().decode('utf-8', 'replace')
+        if not locales and len(found) == wanted:
+            break
+
+    if not in_group:
+        raise DesktopEntryError("No [Desktop Entry] group")
+    return found
+
+
+def quote_exec_arg(arg: str) -> str:
+    """Quote a single argument of an Exec value as described in the
+    "The Exec key" section of the spec. Field codes are kept as is."""
+    if FIELD_CODE.fullmatch(arg):
+        return arg
+    arg = arg.replace('%', '%%')
+    if arg and not any(char in EXEC_RESERVED for char in arg):
+        return arg
+    for char in '\\"`$':
+        arg = arg.replace(char, '\\' + char)
+    return f'"{arg}"'
+
+
+def exec_line(command: str) -> str:
+    """Return the Exec value running `command`: the path of an executable,
+    or a command line with shell-like quoting such as `java -jar 'My App.jar'`.
+
+    Only an existing file is taken as a single argument: the path of a
+    program that isn't installed yet must be quoted if it has spaces.
+    """
+    if os.path.exists(command):
+        return quote_exec_arg(command)
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return quote_exec_arg(command)
+    return ' '.join(quote_exec_arg(arg) for arg in args) if args else quote_exec_arg(command)
+
+
+def make_a_desktop(name: str,
+                   exec_path: str,
+                   app_version: str = "1.0",
+                   icon_path: str = "",
+                   terminal: bool = False,
+                   ) -> str:
+    """Return .desktop file entry content based on given values.
+
+    For example:
+
+        [Desktop Entry]
+        Type=Application
+        Version=1.0
+        Terminal=false
+        Exec=/path/to/executable
+        Name=Name of Application
+        Icon=/path/to/icon
+
+    `exec_path` is quoted as needed, see `exec_line`.
+    """
+    terminal = f"{terminal}".lower()
+
+    return "\n".join(
+        [
+            "[Desktop Entry]",
+            "Type=Application",
+            f"Version={app_version}",
+            f"Terminal={terminal}",
+            f"Exec={escape(exec_line(exec_path))}",
+            f"Name={escape(name)}",
+            f"Icon={escape(icon_path)}",
+        ]
+    )
+
+
+def desktop_file_path(name: str, directory: Optional[str] = None) -> str:
+    """Return where the entry for an application called `name` is written,
+    the user's applications folder by default."""
+    filename = name.replace(os.sep, '-')
+    return os.path.join(os.path.expanduser(directory or user_applications_dir()), f"{filename}.desktop")
+
+
+# A line of the file: either raw text (comments, blank lines) or a key name
+_Line = Union[str, Tuple[str]]
+
+
+class _Group:
+    __slots__ = ('header', 'lines', 'values')
+
+    def __init__(self, header: str):
+        self.header = header
+        self.lines: List[_Line] = []
+        self.values: Dict[str, str] = {}
+
+
+class EntrySummary:
+    """The summary keys of an entry, as a compact record.
+
+    This is what the app list keeps in memory for every entry: strings are
+    interned (icons and keywords are often shared) and the boolean keys are
+    packed into `flags`.
+    """
+    __slots__ = ('name', 'icon', 'keywords', 'exec', 'categories', 'flags')
+
+    HIDDEN = 1
+    TERMINAL = 2
+
+    def __init__(self, name: str = '', icon: str = '', keywords: str = '',
+                 exec: str = '', categories: str = '', flags: int = 0):
+        self.name = name
+        self.icon = icon
+        self.keywords = keywords
+        self.exec = exec
+        self.categories = categories
+        self.flags = flags
+
+    @classmethod
+    def from_values(cls, values: Dict[str, str], locales: Tuple[str, ...]) -> 'EntrySummary':
+        """Build a summary from the raw values returned by `parse_summary`."""
+        name = values.get('Name', '')
+        for locale in locales:
+            if f'Name[{locale}]' in values:
+                name = values[f'Name[{locale}]']
+                break
+
+        flags = 0
+        if parse_bool(values.get('Hidden')):
+            flags |= cls.HIDDEN
+        if parse_bool(values.get('Terminal')):
+            flags |= cls.TERMINAL
+
+        return cls(sys.intern(unescape(name)),
+                   sys.intern(unescape(values.get('Icon', ''))),
+                   sys.intern(unescape(values.get('Keywords', ''))),
+                   unescape(values.get('Exec', '')),
+                   sys.intern(unescape(values.get('Categories', ''))),
+                   flags)
+
+    @classmethod
+    def parse(cls, data: bytes, locales: Optional[Tuple[str, ...]] = None) -> 'EntrySummary':
+        locales = locale_candidates() if locales is None else locales
+        return cls.from_values(parse_summary(data, SUMMARY_KEYS, locales), locales)
+
+    @classmethod
+    def read(cls, filepath: str, locales: Optional[Tuple[str, ...]] = None) -> 'EntrySummary':
+        with open(filepath, 'rb') as f:
+            return cls.parse(f.read(), locales)
+
+    def search_fields(self) -> Tuple[str, ...]:
+        # Field codes like %U would only add noise to the index
+        return self.name, self.keywords, FIELD_CODE.sub('', self.exec), self.categories
+
+    @property
+    def hidden(self) -> bool:
+        return bool(self.flags & self.HIDDEN)
+
+    @hidden.setter
+    def hidden(self, value: bool) -> None:
+        self.flags = self.flags | self.HIDDEN if value else self.flags & ~self.HIDDEN
+
+    @property
+    def terminal(self) -> bool:
+        return bool(self.flags & self.TERMINAL)
+
+    @terminal.setter
+    def terminal(self, value: bool) -> None:
+        self.flags = self.flags | self.TERMINAL if value else self.flags & ~self.TERMINAL
+
+
+class DesktopEntry:
+    """A Desktop Entry file.
+
+    Only the summary keys of the [Desktop Entry] group are parsed when
+    the entry is created; the complete document is parsed the first time
+    any other key is read or a key is changed. Comments, blank lines and
+    key order are kept when the entry is written back.
+    """
+
+    def __init__(self, data: bytes, locales: Optional[Tuple[str, ...]] = None):
+        self.data = data
+        self.locales = locale_candidates() if locales is None else locales
+        self.summary = parse_summary(data, SUMMARY_KEYS, self.locales)
+        self._preamble: List[str] = []
+        self._groups: Optional[Dict[str, _Group]] = None
+
+    @classmethod
+    def read(cls, filepath: str, locales: Optional[Tuple[str, ...]] = None) -> 'DesktopEntry':
+        with open(filepath, 'rb') as f:
+            return cls(f.read(), locales)
+
+    @property
+    def groups(self) -> Dict[str, _Group]:
+        if self._groups is None:
+            self._parse()
+        return self._groups
+
+    def _parse(self) -> None:
+        groups: Dict[str, _Group] = {}
+        group: Optional[_Group] = None
+        for line in self.data.decode('utf-8', 'replace').splitlines():
+            stripped = line.strip()
+            if stripped.startswith('[') and stripped.endswith(']'):
+                name = stripped[1:-1]
+                if name in groups:
+                    raise DesktopEntryError(f"Duplicate group [{name}]")
+                group = groups[name] = _Group(line)
+            elif not stripped or stripped.startswith('#') or '=' not in stripped:
+                (group.lines if group else self._preamble).append(line)
+            elif group is None:
+                raise DesktopEntryError("Key outside of any group")
+            else:
+                key, _, value = stripped.partition('=')
+                key = key.rstrip()
+                if key not in group.values:
+                    group.lines.append((key,))
+                group.values[key] = value.lstrip()
+
+        if DESKTOP_SECTION not in groups:
+            raise DesktopEntryError("No [Desktop Entry] group")
+        self._groups = groups
+
+    def _in_summary(self, key: str, group: str) -> bool:
+        """Whether `key` can be answered without parsing the whole file."""
+        if group != DESKTOP_SECTION or self._groups is not None:
+            return False
+        base, locale = _split_key(key)
+        return base in SUMMARY_KEYS and (locale is None or locale in self.locales)
+
+    def has(self, key: str, group: str = DESKTOP_SECTION) -> bool:
+        if self._in_summary(key, group):
+            return key in self.summary
+        return group in self.groups and key in self.groups[group].values
+
+    def get_raw(self, key: str, group: str = DESKTOP_SECTION) -> Optional[str]:
+        if self._in_summary(key, group):
+            return self.summary.get(key)
+        if group not in self.groups:
+            return None
+        return self.groups[group].values.get(key)
+
+    def get(self, key: str, default: str = '', group: str = DESKTOP_SECTION) -> str:
+        value = self.get_raw(key, group)
+        return default if value is None else unescape(value)
+
+    def get_localized(self, key: str, default: str = '', group: str = DESKTOP_SECTION) -> str:
+        for locale in self.locales:
+            value = self.get_raw(f'{key}[{locale}]', group)
+            if value is not None:
+                return unescape(value)
+        return self.get(key, default, group)
+
+    def get_bool(self, key: str, default: bool = False, group: str = DESKTOP_SECTION) -> bool:
+        return parse_bool(self.get_raw(key, group), default)
+
+    def get_list(self, key: str, group: str = DESKTOP_SECTION) -> List[str]:
+        value = self.get_raw(key, group)
+        return split_list(value) if value else []
+
+    def set_raw(self, key: str, value: str, group: str = DESKTOP_SECTION) -> None:
+        groups = self.groups
+        if group not in groups:
+            groups[group] = _Group(f'[{group}]')
+        target = groups[group]
+        if key not in target.values:
+            # Keep new keys before the blank lines that separate groups
+            position = len(target.lines)
+            while position and not isinstance(target.lines[position - 1], tuple) \
+                    and not target.lines[position - 1].strip():
+                position -= 1
+            target.lines.insert(position, (key,))
+        target.values[key] = value
+        if group == DESKTOP_SECTION and _split_key(key)[0] in SUMMARY_KEYS:
+            self.summary[key] = value
+
+    def set(self, key: str, value: str, group: str = DESKTOP_SECTION) -> None:
+        self.set_raw(key, escape(value), group)
+
+    def set_bool(self, key: str, value: bool, group: str = DESKTOP_SECTION) -> None:
+        self.set_raw(key, 'true' if value else 'false', group)
+
+    def set_list(self, key: str, values: Iterable[str], group: str = DESKTOP_SECTION) -> None:
+        self.set_raw(key, join_list(values), group)
+
+    def remove(self, key: str, group: str = DESKTOP_SECTION) -> None:
+        if group in self.groups and key in self.groups[group].values:
+            del self.groups[group].values[key]
+            self.groups[group].lines.remove((key,))
+        if group == DESKTOP_SECTION:
+            self.summary.pop(key, None)
+
+    def to_text(self) -> str:
+        lines = list(self._preamble)
+        for group in self.groups.values():
+            lines.append(group.header)
+            for line in group.lines:
+                if isinstance(line, tuple):
+                    key = line[0]
+                    if key in group.values:
+                        lines.append(f'{key}={group.values[key]}')
+                else:
+                    lines.append(line)
+        return '\n'.join(lines) + '\n'
+
+    def to_bytes(self) -> bytes:
+        return self.to_text().encode('utf-8')
+
+    def write(self, filepath: str) -> bool:
+        """Save the entry atomically, returns False if nothing changed."""
+        data = self.to_bytes()
+        written = write_atomic(filepath, data)
+        self.data = data
+        return written
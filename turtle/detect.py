@@ -0,0 +1,112 @@
+# detect.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Guess menu entries for executables opened or dropped on the window.
+
+This module must not import Gtk, detection runs in worker threads.
+"""
+import logging
+import os
+import re
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
+
+from turtle.batch import Entry
+from turtle.extractors import extract, extracting
+
+logger = logging.getLogger(__name__)
+
+# Files of a dropped folder that are considered applications even when not
+# executable (yet)
+APP_EXTENSIONS = ('.appimage', '.jar')
+
+# Where the name stops in e.g. "Krita-4.4.3-x86_64" or "app_v2_linux"
+_NAME_END = re.compile(r'[-_ .](?:v?\d|x86[-_]64|amd64|i[36]86|aarch64|arm64|linux)', re.IGNORECASE)
+
+
+def is_application(path: str) -> bool:
+    if path.lower().endswith(APP_EXTENSIONS):
+        return True
+    return not path.endswith('.desktop') and os.access(path, os.X_OK)
+
+
+def expand(paths: Iterable[str]) -> List[str]:
+    """Replace folders of `paths` by the applications they contain.
+
+    Only the top level of a folder is looked at; files given explicitly
+    are always kept.
+    """
+    result: List[str] = []
+    for path in paths:
+        if not os.path.isdir(path):
+            result.append(path)
+            continue
+        try:
+            with os.scandir(path) as it:
+                found = [entry.path for entry in it
+                         if not entry.name.startswith('.') and entry.is_file() and is_application(entry.path)]
+        except OSError as e:
+            logger.warning("Can't list %s: %s", path, e.strerror)
+            continue
+        result.extend(sorted(found))
+    return result
+
+
+def guess_name(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = _NAME_END.split(stem, 1)[0] or stem
+    return name[:1].upper() + name[1:]
+
+
+def exec_command(path: str) -> str:
+    """Return how the file at `path` is run, e.g. through java for jars."""
+    if path.lower().endswith('.jar') and os.path.isfile(path):
+        return f"java -jar {shlex.quote(path)}"
+    return path
+
+
+def detect(path: str) -> Entry:
+    """Return the entry proposed for the executable at `path`, from its
+    embedded metadata when there is some."""
+    metadata = extract(path)
+    return Entry(name=metadata.name or guess_name(path),
+                 exec_path=exec_command(path),
+                 icon_path=metadata.icon,
+                 terminal=bool(metadata.terminal))
+
+
+def detect_all(paths: Iterable[str]) -> List[Entry]:
+    """Detect the entries of `paths` and of the folders among them, in
+    parallel, keeping their order."""
+    paths = expand(paths)
+    if not paths:
+        return []
+    with extracting(), ThreadPoolExecutor(max_workers=min(8, len(paths), os.cpu_count() or 1),
+                                          thread_name_prefix="turtle-detect") as executor:
+        return list(executor.map(detect, paths))
@@ -0,0 +1,218 @@
+# __init__.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Application metadata embedded in executables: AppImages, Java archives
+and ELF binaries.
+
+Results are cached by path and stat key, in memory and in
+$XDG_CACHE_HOME/turtle/extracted, so opening the same binary again costs a
+stat. Extracted icons are kept in $XDG_DATA_HOME/turtle/icons: the created
+entries refer to them. Nothing here imports Gtk,
+extraction runs in worker threads.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from typing import ContextManager, Dict, Iterator, NamedTuple, Optional, Tuple
+
+from turtle.extractors.appimage import read_appimage
+from turtle.extractors.elf import read_elf
+from turtle.extractors.jar import read_jar
+from turtle.writer import write_atomic
+from turtle.xdg import StatKey, stat_key, user_cache_dir, user_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when extractors find more or different things
+FORMAT_VERSION = 2
+
+
+class Metadata(NamedTuple):
+    name: str = ''
+    # Extracted icon file, or icon name from an embedded desktop entry
+    icon: str = ''
+    # None when there is no telling
+    terminal: Optional[bool] = None
+
+
+def _icon_extension(data: bytes) -> Optional[str]:
+    if data.startswith(b'\x89PNG'):
+        return '.png'
+    head = data[:512].lstrip()
+    if head.startswith(b'<svg') or (head.startswith(b'<?xml') and b'<svg' in data[:4096]):
+        return '.svg'
+    return None
+
+
+class MetadataCache:
+    """The index is written after every extraction, except within `batch`
+    where it is written once at the end."""
+
+    _default: Optional['MetadataCache'] = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, directory: Optional[str] = None, icons_directory: Optional[str] = None):
+        self.directory = directory or os.path.join(user_cache_dir(), 'extracted')
+        self.icons_directory = icons_directory or os.path.join(user_data_dir(), 'icons')
+        self.index_path = os.path.join(self.directory, 'index.json')
+        self._entries: Optional[Dict[str, Tuple[StatKey, Metadata]]] = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._dirty = False
+
+    @classmethod
+    def get_default(cls) -> 'MetadataCache':
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = MetadataCache()
+        return cls._default
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Write the index once for all of the extractions in the block."""
+        with self._lock:
+            self._batches += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._batches -= 1
+                if not self._batches and self._dirty:
+                    self._save()
+
+    def _load(self) -> Dict[str, Tuple[StatKey, Metadata]]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get('version') == FORMAT_VERSION:
+                    for path, (key, fields) in index['entries'].items():
+                        self._entries[path] = (tuple(key), Metadata(*fields))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning("Ignoring metadata cache %s: %s", self.index_path, e)
+        return self._entries
+
+    def _save(self) -> None:
+        self._dirty = False
+        index = {'version': FORMAT_VERSION,
+                 'entries': {path: [key, list(metadata)] for path, (key, metadata) in self._entries.items()}}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_atomic(self.index_path, json.dumps(index).encode('utf-8'), fsync=False)
+        except OSError as e:
+            logger.warning("Can't write metadata cache %s: %s", self.index_path, e)
+
+    def get(self, path: str) -> Metadata:
+        """Return the metadata of the executable at `path`, safe to call from
+        worker threads."""
+        try:
+            key = stat_key(os.stat(path))
+        except OSError:
+            return Metadata()
+
+        with self._lock:
+            cached = self._load().get(path)
+        if cached and cached[0] == key and (not cached[1].icon.startswith('/') or os.path.exists(cached[1].icon)):
+            return cached[1]
+
+        metadata = self.extract(path)
+        with self._lock:
+            self._load()[path] = (key, metadata)
+            self._dirty = True
+            if not self._batches:
+                self._save()
+        return metadata
+
+    def extract(self, path: str) -> Metadata:
+        try:
+            with open(path, 'rb') as f:
+                if path.lower().endswith('.jar'):
+                    return self._from_jar(path)
+                if f.read(4) != b'\x7fELF':
+                    return Metadata()
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return self._from_elf(path, data)
+        except (OSError, ValueError) as e:
+            logger.warning("Can't extract metadata from %s: %s", path, e)
+            return Metadata()
+
+    def _from_jar(self, path: str) -> Metadata:
+        found = read_jar(path)
+        if found is None:
+            return Metadata()
+        name, icon = found
+        return Metadata(name=name, icon=self._save_icon(path, icon), terminal=None)
+
+    def _from_elf(self, path: str, data) -> Metadata:
+        found = read_appimage(data)
+        if found is not None:
+            summary, icon = found
+            icon_path = self._save_icon(path, icon)
+            return Metadata(name=summary.name, icon=icon_path or summary.icon,
+                            terminal=summary.terminal if summary.name else None)
+
+        info = read_elf(data)
+        if info is None:
+            return Metadata()
+        if info.graphical:
+            return Metadata(terminal=False)
+        # Without any toolkit, only terminal libraries make it clear
+        return Metadata(terminal=True if info.console else None)
+
+    def _save_icon(self, path: str, data: Optional[bytes]) -> str:
+        extension = _icon_extension(data) if data else None
+        if extension is None:
+            return ''
+        # Named by content: new versions of an application usually keep their icon
+        digest = hashlib.sha1(data).hexdigest()
+        icon_path = os.path.join(self.icons_directory, digest + extension)
+        try:
+            os.makedirs(self.icons_directory, exist_ok=True)
+            write_atomic(icon_path, data, fsync=False)
+        except OSError as e:
+            logger.warning("Can't save the icon of %s: %s", path, e)
+            return ''
+        return icon_path
+
+
+def extract(path: str) -> Metadata:
+    """Return what the executable at `path` tells about itself."""
+    return MetadataCache.get_default().get(path)
+
+
+def extracting() -> ContextManager[None]:
+    """Context manager around `extract` calls, see `MetadataCache.batch`."""
+    return MetadataCache.get_default().batch()
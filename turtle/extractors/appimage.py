@@ -0,0 +1,93 @@
+# appimage.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Metadata embedded in AppImages: the desktop entry and `.DirIcon` at the
+top of their squashfs image."""
+import logging
+from typing import Optional, Tuple
+
+from turtle.desktop_entry import DesktopEntryError, EntrySummary
+from turtle.extractors.elf import read_elf
+from turtle.extractors.squashfs import MAGIC, SquashFS, SquashFSError
+
+logger = logging.getLogger(__name__)
+
+# How far past the runtime to look for the image when the ELF headers don't
+# tell where it starts
+SCAN_LIMIT = 4 * 1024 * 1024
+MAX_ICON_SIZE = 4 * 1024 * 1024
+
+
+def find_squashfs(data) -> Optional[SquashFS]:
+    """Return the image appended to the runtime of an AppImage (type 2)."""
+    info = read_elf(data)
+    if info is None:
+        return None
+    try:
+        return SquashFS(data, info.size)
+    except SquashFSError:
+        pass
+
+    position = data.find(MAGIC, 0, SCAN_LIMIT)
+    while position != -1:
+        try:
+            return SquashFS(data, position)
+        except SquashFSError:
+            position = data.find(MAGIC, position + 1, SCAN_LIMIT)
+    return None
+
+
+def read_appimage(data) -> Optional[Tuple[EntrySummary, Optional[bytes]]]:
+    """Return the summary of the embedded desktop entry and the icon data,
+    None when `data` isn't an AppImage."""
+    fs = find_squashfs(data)
+    if fs is None:
+        return None
+
+    try:
+        root = fs.inode(fs.root)
+        desktop = next((name for name, _ref in fs.listdir(root) if name.endswith('.desktop')), None)
+        summary = EntrySummary()
+        if desktop:
+            inode = fs.lookup(desktop)
+            if inode is not None and inode.is_file:
+                summary = EntrySummary.parse(fs.read(inode, 1024 * 1024))
+
+        icon = None
+        candidates = ['.DirIcon']
+        if summary.icon and '/' not in summary.icon:
+            candidates += [summary.icon + '.png', summary.icon + '.svg']
+        for name in candidates:
+            inode = fs.lookup(name)
+            if inode is not None and inode.is_file and inode.size <= MAX_ICON_SIZE:
+                icon = fs.read(inode, MAX_ICON_SIZE)
+                break
+    except (SquashFSError, DesktopEntryError, IndexError, ValueError) as e:
+        logger.warning("Can't read the AppImage image: %s", e)
+        return None
+    return summary, icon
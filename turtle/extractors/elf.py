@@ -0,0 +1,159 @@
+# elf.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Just enough of the ELF format to tell what a binary needs to run and
+where an AppImage's runtime ends."""
+import platform
+import struct
+from typing import List, NamedTuple, Optional, Tuple
+
+MAGIC = b'\x7fELF'
+
+PT_LOAD = 1
+PT_DYNAMIC = 2
+PT_INTERP = 3
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+
+MACHINES = {
+    3: 'i386',
+    40: 'arm',
+    62: 'x86_64',
+    183: 'aarch64',
+    243: 'riscv64',
+}
+
+# Linking any of these means the program opens its own windows
+GUI_LIBRARIES = ('libgtk', 'libgdk', 'libQt', 'libX11', 'libwayland-client', 'libSDL',
+                 'libglfw', 'libGL', 'libEGL', 'libvulkan', 'libfltk', 'libwx_')
+# Linking any of these, and no GUI toolkit, means the program draws in a terminal
+CONSOLE_LIBRARIES = ('libncurses', 'libtinfo', 'libreadline', 'libedit', 'libslang', 'libnewt')
+
+
+class ElfInfo(NamedTuple):
+    bits: int
+    machine: str
+    interpreter: str
+    needed: Tuple[str, ...]
+    # Where the file would end without anything appended to it
+    size: int
+
+    @property
+    def runs_here(self) -> bool:
+        host = platform.machine()
+        return self.machine == host or (self.machine == 'aarch64' and host == 'arm64')
+
+    @property
+    def graphical(self) -> Optional[bool]:
+        """Whether the binary links a GUI toolkit, None for static binaries."""
+        if not self.needed:
+            return None
+        return any(lib.startswith(GUI_LIBRARIES) for lib in self.needed)
+
+    @property
+    def console(self) -> bool:
+        """Whether the binary clearly needs a terminal: it links a terminal
+        library and no GUI toolkit. Most binaries linking neither are
+        launchers, scripts' interpreters or daemons."""
+        return (any(lib.startswith(CONSOLE_LIBRARIES) for lib in self.needed)
+                and not any(lib.startswith(GUI_LIBRARIES) for lib in self.needed))
+
+
+def read_elf(data) -> Optional[ElfInfo]:
+    """Parse the headers of the ELF image `data`, a bytes-like object such
+    as an mmap. Returns None when it isn't one."""
+    if len(data) < 64 or data[:4] != MAGIC:
+        return None
+    bits = 64 if data[4] == 2 else 32
+    order = '<' if data[5] == 1 else '>'
+    if bits == 64:
+        header = struct.unpack_from(order + 'HHIQQQIHHHHHH', data, 16)
+        phdr = order + 'IIQQQQQQ'
+    else:
+        header = struct.unpack_from(order + 'HHIIIIIHHHHHH', data, 16)
+        phdr = order + 'IIIIIIII'
+    _type, machine, _version, _entry, phoff, shoff, _flags, _ehsize, phentsize, phnum, shentsize, shnum, _ = header
+
+    # (type, offset, vaddr, filesz) of every program header
+    segments: List[Tuple[int, int, int, int]] = []
+    for i in range(phnum):
+        start = phoff + i * phentsize
+        if start + struct.calcsize(phdr) > len(data):
+            break
+        fields = struct.unpack_from(phdr, data, start)
+        if bits == 64:
+            p_type, _p_flags, offset, vaddr, _paddr, filesz = fields[:6]
+        else:
+            p_type, offset, vaddr, _paddr, filesz = fields[:5]
+        segments.append((p_type, offset, vaddr, filesz))
+
+    interpreter = ''
+    needed: List[str] = []
+    for p_type, offset, vaddr, filesz in segments:
+        if p_type == PT_INTERP:
+            interpreter = bytes(data[offset:offset + filesz]).rstrip(b'\0').decode('utf-8', 'replace')
+        elif p_type == PT_DYNAMIC:
+            needed = _needed(data, order, bits, offset, filesz, segments)
+
+    size = max(shoff + shentsize * shnum, phoff + phentsize * phnum)
+    return ElfInfo(bits, MACHINES.get(machine, str(machine)), interpreter, tuple(needed), size)
+
+
+def _needed(data, order: str, bits: int, offset: int, filesz: int,
+            segments: List[Tuple[int, int, int, int]]) -> List[str]:
+    entry = order + ('qQ' if bits == 64 else 'iI')
+    entry_size = struct.calcsize(entry)
+    strtab = None
+    names: List[int] = []
+    end = min(offset + filesz, len(data))
+    for position in range(offset, end - entry_size + 1, entry_size):
+        tag, value = struct.unpack_from(entry, data, position)
+        if tag == DT_NULL:
+            break
+        if tag == DT_NEEDED:
+            names.append(value)
+        elif tag == DT_STRTAB:
+            strtab = _file_offset(value, segments)
+    if strtab is None:
+        return []
+
+    needed = []
+    for name in names:
+        start = strtab + name
+        stop = data.find(b'\0', start, start + 4096)
+        if stop > start:
+            needed.append(bytes(data[start:stop]).decode('utf-8', 'replace'))
+    return needed
+
+
+def _file_offset(vaddr: int, segments: List[Tuple[int, int, int, int]]) -> Optional[int]:
+    for p_type, offset, start, filesz in segments:
+        if p_type == PT_LOAD and start <= vaddr < start + filesz:
+            return offset + vaddr - start
+    return None
@@ -0,0 +1,93 @@
+# jar.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Metadata of Java archives, from their manifest and bundled images.
+
+Only the central directory and the members actually needed are read.
+"""
+import logging
+import os
+import zipfile
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'META-INF/MANIFEST.MF'
+# Manifest attributes naming the application, most specific first
+NAME_ATTRIBUTES = ('Application-Name', 'Implementation-Title', 'Bundle-Name', 'Specification-Title')
+MAX_ICON_SIZE = 1024 * 1024
+
+
+def parse_manifest(text: str) -> Dict[str, str]:
+    """Lines starting with a space continue the previous one."""
+    attributes: Dict[str, str] = {}
+    key = None
+    for line in text.splitlines():
+        if line.startswith(' ') and key:
+            attributes[key] += line[1:]
+        elif ':' in line:
+            key, value = line.split(':', 1)
+            key = key.strip()
+            attributes[key] = value.strip()
+        elif not line:
+            # Per-entry sections follow the main one
+            break
+    return attributes
+
+
+def _icon_member(archive: zipfile.ZipFile) -> Optional[zipfile.ZipInfo]:
+    best = None
+    for info in archive.infolist():
+        name = os.path.basename(info.filename).lower()
+        if not name.endswith(('.png', '.svg')) or info.file_size > MAX_ICON_SIZE:
+            continue
+        if 'icon' not in name and 'logo' not in name:
+            continue
+        # The biggest one is the sharpest
+        if best is None or info.file_size > best.file_size:
+            best = info
+    return best
+
+
+def read_jar(path: str) -> Optional[Tuple[str, Optional[bytes]]]:
+    """Return the application name and icon data of the archive at `path`,
+    None when it isn't a zip archive."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            name = ''
+            try:
+                manifest = parse_manifest(archive.read(MANIFEST).decode('utf-8', 'replace'))
+                name = next((manifest[key] for key in NAME_ATTRIBUTES if manifest.get(key)), '')
+            except KeyError:
+                pass
+            member = _icon_member(archive)
+            icon = archive.read(member) if member else None
+    except (OSError, zipfile.BadZipFile, RuntimeError) as e:
+        logger.warning("Can't read %s: %s", path, e)
+        return None
+    return name, icon
@@ -0,0 +1,268 @@
+# squashfs.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Read-only access to the files of a squashfs 4.0 image, as embedded in
+AppImages.
+
+Only the metadata blocks and the data blocks of the files actually read are
+decompressed, so the size of the image doesn't matter. The image can be any
+bytes-like object, typically an mmap of the AppImage.
+"""
+import lzma
+import struct
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# What the decompressors raise on corrupt data
+DECOMPRESSION_ERRORS: Tuple[type, ...] = (zlib.error, lzma.LZMAError)
+if zstandard is not None:
+    DECOMPRESSION_ERRORS += (zstandard.ZstdError,)
+
+MAGIC = b'hsqs'
+SUPERBLOCK = struct.Struct('<4sIIIIHHHHHHQQQQQQQQ')
+
+GZIP, LZMA, LZO, XZ, LZ4, ZSTD = 1, 2, 3, 4, 5, 6
+
+DIR, FILE, SYMLINK = 1, 2, 3
+EXT_DIR, EXT_FILE, EXT_SYMLINK = 8, 9, 10
+
+METADATA_SIZE = 8192
+UNCOMPRESSED_METADATA = 0x8000
+UNCOMPRESSED_BLOCK = 1 << 24
+NO_FRAGMENT = 0xffffffff
+MAX_SYMLINKS = 8
+
+
+class SquashFSError(ValueError):
+    pass
+
+
+def _unpack_from(fmt: str, data, offset: int = 0) -> tuple:
+    try:
+        return struct.unpack_from(fmt, data, offset)
+    except struct.error as e:
+        raise SquashFSError(f"truncated image: {e}")
+
+
+class _MetadataReader:
+    """Sequential reader of a metadata table starting at `block` (relative
+    to the image), `offset` bytes into that block once decompressed."""
+
+    def __init__(self, fs: 'SquashFS', block: int, offset: int):
+        self.fs = fs
+        self.block = block
+        self.buffer, self.next_block = fs.metadata_block(block)
+        self.offset = offset
+
+    def read(self, size: int) -> bytes:
+        chunks = []
+        while size > 0:
+            if self.offset >= len(self.buffer):
+                self.block = self.next_block
+                self.buffer, self.next_block = self.fs.metadata_block(self.block)
+                self.offset = 0
+            chunk = self.buffer[self.offset:self.offset + size]
+            self.offset += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def unpack(self, fmt: str) -> tuple:
+        return _unpack_from('<' + fmt, self.read(struct.calcsize('<' + fmt)))
+
+
+class Inode:
+    __slots__ = ('type', 'size', 'blocks_start', 'fragment', 'fragment_offset', 'block_sizes',
+                 'dir_block', 'dir_offset', 'target')
+
+    def __init__(self, inode_type: int):
+        self.type = inode_type
+        self.size = 0
+        self.blocks_start = 0
+        self.fragment = NO_FRAGMENT
+        self.fragment_offset = 0
+        self.block_sizes: List[int] = []
+        self.dir_block = 0
+        self.dir_offset = 0
+        self.target = ''
+
+    @property
+    def is_dir(self) -> bool:
+        return self.type in (DIR, EXT_DIR)
+
+    @property
+    def is_file(self) -> bool:
+        return self.type in (FILE, EXT_FILE)
+
+    @property
+    def is_symlink(self) -> bool:
+        return self.type in (SYMLINK, EXT_SYMLINK)
+
+
+class SquashFS:
+    def __init__(self, data, offset: int = 0):
+        self.data = data
+        self.offset = offset
+        if len(data) < offset + SUPERBLOCK.size:
+            raise SquashFSError("truncated superblock")
+        (magic, _inodes, _mtime, self.block_size, self.fragment_count, self.compression,
+         block_log, _flags, _ids, major, _minor, self.root, _bytes_used, _id_table,
+         _xattr_table, self.inode_table, self.directory_table, self.fragment_table,
+         _export_table) = SUPERBLOCK.unpack_from(data, offset)
+        if magic != MAGIC or major != 4 or 1 << block_log != self.block_size:
+            raise SquashFSError("not a squashfs 4.0 image")
+        self._metadata: Dict[int, Tuple[bytes, int]] = {}
+        self._fragments: Optional[List[int]] = None
+
+    def decompress(self, data: bytes, size: int) -> bytes:
+        try:
+            if self.compression == GZIP:
+                return zlib.decompress(data)
+            if self.compression in (XZ, LZMA):
+                return lzma.decompress(data, lzma.FORMAT_XZ if self.compression == XZ else lzma.FORMAT_ALONE)
+            if self.compression == ZSTD and zstandard is not None:
+                return zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+        except DECOMPRESSION_ERRORS as e:
+            raise SquashFSError(f"corrupt block: {e}")
+        raise SquashFSError(f"unsupported compression {self.compression}")
+
+    def metadata_block(self, block: int) -> Tuple[bytes, int]:
+        """Return the content of the metadata block at `block`, relative to
+        the image, and where the next one starts."""
+        cached = self._metadata.get(block)
+        if cached is None:
+            start = self.offset + block
+            header, = _unpack_from('<H', self.data, start)
+            length = header & ~UNCOMPRESSED_METADATA
+            raw = bytes(self.data[start + 2:start + 2 + length])
+            content = raw if header & UNCOMPRESSED_METADATA else self.decompress(raw, METADATA_SIZE)
+            cached = self._metadata[block] = (content, block + 2 + length)
+        return cached
+
+    def inode(self, ref: int) -> Inode:
+        reader = _MetadataReader(self, self.inode_table + (ref >> 16), ref & 0xffff)
+        inode_type, _mode, _uid, _gid, _mtime, _number = reader.unpack('HHHHII')
+        inode = Inode(inode_type)
+
+        if inode_type == DIR:
+            inode.dir_block, _links, inode.size, inode.dir_offset, _parent = reader.unpack('IIHHI')
+        elif inode_type == EXT_DIR:
+            _links, inode.size, inode.dir_block, _parent, _indexes, inode.dir_offset, _xattr = \
+                reader.unpack('IIIIHHI')
+        elif inode_type in (FILE, EXT_FILE):
+            if inode_type == FILE:
+                inode.blocks_start, inode.fragment, inode.fragment_offset, inode.size = reader.unpack('IIII')
+            else:
+                (inode.blocks_start, inode.size, _sparse, _links, inode.fragment,
+                 inode.fragment_offset, _xattr) = reader.unpack('QQQIIII')
+            count = inode.size // self.block_size
+            if inode.fragment == NO_FRAGMENT and inode.size % self.block_size:
+                count += 1
+            inode.block_sizes = list(reader.unpack(f'{count}I')) if count else []
+        elif inode_type in (SYMLINK, EXT_SYMLINK):
+            _links, size = reader.unpack('II')
+            inode.target = reader.read(size).decode('utf-8', 'replace')
+        return inode
+
+    def listdir(self, inode: Inode) -> Iterator[Tuple[str, int]]:
+        """Yield the (name, inode reference) of the entries of a directory."""
+        # The size includes the "." and ".." entries that aren't stored
+        remaining = inode.size - 3
+        reader = _MetadataReader(self, self.directory_table + inode.dir_block, inode.dir_offset)
+        while remaining > 0:
+            count, start, _number = reader.unpack('IIi')
+            remaining -= 12
+            for _ in range(count + 1):
+                offset, _inode_offset, _type, name_size = reader.unpack('HhHH')
+                name = reader.read(name_size + 1).decode('utf-8', 'replace')
+                remaining -= 8 + name_size + 1
+                yield name, (start << 16) | offset
+
+    def lookup(self, path: str) -> Optional[Inode]:
+        """Return the inode at `path`, following symbolic links."""
+        parts = [part for part in path.split('/') if part]
+        inode = self.inode(self.root)
+        links = 0
+        while parts:
+            part = parts.pop(0)
+            if part == '.':
+                continue
+            if not inode.is_dir:
+                return None
+            ref = next((ref for name, ref in self.listdir(inode) if name == part), None)
+            if ref is None:
+                return None
+            inode = self.inode(ref)
+            if inode.is_symlink:
+                links += 1
+                if links > MAX_SYMLINKS or inode.target.startswith('/'):
+                    return None
+                # Relative targets are resolved from the root, good enough
+                # for the links AppImages have at their top level
+                parts = [p for p in inode.target.split('/') if p and p != '..'] + parts
+                inode = self.inode(self.root)
+        return inode
+
+    def read(self, inode: Inode, limit: int) -> bytes:
+        """Return the content of a file inode, unless it's bigger than `limit`."""
+        if not inode.is_file:
+            raise SquashFSError("not a regular file")
+        if inode.size > limit:
+            raise SquashFSError("file too large")
+
+        chunks = []
+        position = self.offset + inode.blocks_start
+        for size in inode.block_sizes:
+            length = size & ~UNCOMPRESSED_BLOCK
+            if length == 0:
+                chunks.append(bytes(self.block_size))
+                continue
+            raw = bytes(self.data[position:position + length])
+            position += length
+            chunks.append(raw if size & UNCOMPRESSED_BLOCK else self.decompress(raw, self.block_size))
+
+        if inode.fragment != NO_FRAGMENT:
+            block = self._fragment_block(inode.fragment)
+            tail = inode.size % self.block_size
+            chunks.append(block[inode.fragment_offset:inode.fragment_offset + tail])
+        return b''.join(chunks)[:inode.size]
+
+    def _fragment_block(self, index: int) -> bytes:
+        if self._fragments is None:
+            tables = (self.fragment_count + 511) // 512
+            self._fragments = list(_unpack_from(f'<{tables}Q', self.data, self.offset + self.fragment_table))
+        reader = _MetadataReader(self, self._fragments[index // 512], (index % 512) * 16)
+        start, size, _unused = reader.unpack('QII')
+        length = size & ~UNCOMPRESSED_BLOCK
+        raw = bytes(self.data[self.offset + start:self.offset + start + length])
+        return raw if size & UNCOMPRESSED_BLOCK else self.decompress(raw, self.block_size)
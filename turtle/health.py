@@ -0,0 +1,276 @@
+# health.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+"""Find entries whose program or icon no longer exists.
+
+Everything a set of entries needs is collected first, so every file is
+looked at once however many entries share it: absolute paths are stat'ed
+in batches on a thread pool, $PATH folders are listed instead of probed
+name by name, and icon theme names are looked up in a single walk of the
+icon folders. Results are trusted for TTL seconds.
+
+This module must not import Gtk, scans run in worker threads.
+"""
+import os
+import shlex
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from turtle.desktop_entry import FIELD_CODE
+from turtle.validator import ERROR, WARNING, Issue, Verdict
+
+# Seconds a looked up file, folder or icon theme is trusted
+TTL = 60.0
+# Paths stat'ed per task of the pool
+BATCH_SIZE = 256
+
+ICON_EXTENSIONS = ('.png', '.svg', '.svgz', '.xpm')
+
+# Inside Flatpak only the home folder is visible, anything else can't be told
+SANDBOXED = os.path.exists('/.flatpak-info')
+
+# (path of the entry, Exec, Icon)
+HealthEntry = Tuple[str, str, str]
+
+
+def exec_targets(exec_value: str) -> List[str]:
+    """Return the files running `exec_value` needs: the program, and the
+    archive of `java -jar` commands."""
+    if '"' in exec_value or "'" in exec_value or '\\' in exec_value:
+        try:
+            args = shlex.split(exec_value)
+        except ValueError:
+            args = exec_value.split()
+    else:
+        args = exec_value.split()
+    args = [arg for arg in args if not FIELD_CODE.fullmatch(arg)]
+
+    # env [-opts] [NAME=value...] program
+    if args and os.path.basename(args[0]) == 'env':
+        args = args[1:]
+        while args and (args[0].startswith('-') or '=' in args[0]):
+            args = args[1:]
+    if not args:
+        return []
+
+    targets = [args[0]]
+    if os.path.basename(args[0]) == 'java' and '-jar' in args[:-1]:
+        targets.append(args[args.index('-jar') + 1])
+    return targets
+
+
+def search_path() -> List[str]:
+    return [folder for folder in os.environ.get('PATH', '/usr/bin:/bin').split(os.pathsep) if folder]
+
+
+def icon_folders() -> List[str]:
+    """Return the base folders of icon themes, as in the Icon Theme spec."""
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    data_dirs = os.environ.get('XDG_DATA_DIRS') or '/usr/local/share/:/usr/share/'
+    folders = [os.path.expanduser('~/.icons'), os.path.join(data_home, 'icons')]
+    folders += [os.path.join(data_dir, 'icons') for data_dir in data_dirs.split(':') if data_dir]
+    folders.append('/usr/share/pixmaps')
+    return folders
+
+
+def _visible(path: str) -> bool:
+    return not SANDBOXED or path.startswith(os.path.expanduser('~') + os.sep)
+
+
+def _stat_batch(paths: List[str]) -> List[Tuple[str, Optional[int]]]:
+    modes = []
+    for path in paths:
+        try:
+            modes.append((path, os.stat(path).st_mode))
+        except OSError:
+            modes.append((path, None))
+    return modes
+
+
+def _list_folder(folder: str) -> FrozenSet[str]:
+    try:
+        return frozenset(os.listdir(folder))
+    except OSError:
+        return frozenset()
+
+
+def _icon_name(filename: str) -> Optional[str]:
+    stem, extension = os.path.splitext(filename)
+    return stem if extension in ICON_EXTENSIONS else None
+
+
+def _icon_names(folder: str) -> Set[str]:
+    """Names of the icons anywhere below `folder`.
+
+    Themes link folders to each other, sometimes to a parent, so every
+    folder is only walked once.
+    """
+    names: Set[str] = set()
+    try:
+        st = os.stat(folder)
+    except OSError:
+        return names
+    visited: Set[Tuple[int, int]] = {(st.st_dev, st.st_ino)}
+    for root, dirs, files in os.walk(folder, followlinks=True):
+        names.update(filter(None, map(_icon_name, files)))
+        kept = []
+        for name in dirs:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) not in visited:
+                visited.add((st.st_dev, st.st_ino))
+                kept.append(name)
+        dirs[:] = kept
+    return names
+
+
+class HealthScanner:
+    """Check that the programs and icons of entries exist."""
+
+    def __init__(self, ttl: float = TTL, workers: Optional[int] = None):
+        self.ttl = ttl
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) * 2),
+                                           thread_name_prefix="turtle-health")
+        # Path: (checked at, st_mode or None when missing)
+        self._modes: Dict[str, Tuple[float, Optional[int]]] = {}
+        # $PATH folder: (checked at, names)
+        self._folders: Dict[str, Tuple[float, FrozenSet[str]]] = {}
+        # Icon names of the themes, None without any theme to look in
+        self._icons: Tuple[float, Optional[FrozenSet[str]]] = (-TTL, None)
+        self._lock = threading.Lock()
+
+    def scan(self, entries: Iterable[HealthEntry]) -> Dict[str, Verdict]:
+        """Return the problems of every entry, an empty verdict when there
+        are none. Safe to call from any thread."""
+        entries = list(entries)
+        folders = [folder for folder in search_path() if _visible(folder)]
+
+        files: Set[str] = set()
+        theme_icons = False
+        plan: List[Tuple[str, List[str], str]] = []
+        for path, exec_value, icon in entries:
+            targets = exec_targets(exec_value)
+            files.update(target for target in targets if os.path.isabs(target))
+            if os.path.isabs(icon):
+                files.add(icon)
+            elif icon:
+                theme_icons = True
+            plan.append((path, targets, icon))
+
+        with self._lock:
+            now = time.monotonic()
+            self._refresh_modes([path for path in files if _visible(path)], now)
+            self._refresh_folders(folders, now)
+            # The themes of the sandbox are not the ones of the host
+            if theme_icons and not SANDBOXED and now - self._icons[0] > self.ttl:
+                self._icons = (now, self._collect_icons())
+
+            return {path: self._verdict(targets, icon, folders) for path, targets, icon in plan}
+
+    def _refresh_modes(self, paths: List[str], now: float) -> None:
+        stale = [path for path in paths
+                 if path not in self._modes or now - self._modes[path][0] > self.ttl]
+        batches = [stale[i:i + BATCH_SIZE] for i in range(0, len(stale), BATCH_SIZE)]
+        for modes in self.executor.map(_stat_batch, batches):
+            for path, mode in modes:
+                self._modes[path] = (now, mode)
+
+    def _refresh_folders(self, folders: List[str], now: float) -> None:
+        stale = [folder for folder in folders
+                 if folder not in self._folders or now - self._folders[folder][0] > self.ttl]
+        for folder, names in zip(stale, self.executor.map(_list_folder, stale)):
+            self._folders[folder] = (now, names)
+
+    def _collect_icons(self) -> Optional[FrozenSet[str]]:
+        names: Set[str] = set()
+        themes = []
+        for folder in icon_folders():
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if entry.is_dir():
+                            themes.append(entry.path)
+                        else:
+                            # Unthemed icons, like in /usr/share/pixmaps
+                            names.add(_icon_name(entry.name))
+            except OSError:
+                continue
+        if not themes:
+            return None
+        # One task per theme
+        for found in self.executor.map(_icon_names, themes):
+            names |= found
+        names.discard(None)
+        return frozenset(names)
+
+    def program_missing(self, exec_value: str) -> bool:
+        """Whether the program `exec_value` runs is a path that didn't exist
+        on the last scan. A program that isn't executable or in $PATH, or a
+        missing archive, doesn't count: they may come back by themselves."""
+        targets = exec_targets(exec_value)
+        if not targets or not os.path.isabs(targets[0]) or not _visible(targets[0]):
+            return False
+        with self._lock:
+            return targets[0] in self._modes and self._mode(targets[0]) is None
+
+    def _mode(self, path: str) -> Optional[int]:
+        return self._modes.get(path, (0.0, None))[1]
+
+    def _verdict(self, targets: List[str], icon: str, folders: List[str]) -> Verdict:
+        issues = []
+        if targets:
+            program = targets[0]
+            if os.path.isabs(program):
+                mode = self._mode(program)
+                if not _visible(program):
+                    pass
+                elif mode is None:
+                    issues.append(Issue(ERROR, 0, 'Exec', f"{program} doesn't exist"))
+                elif not stat.S_ISREG(mode) or not mode & 0o111:
+                    issues.append(Issue(ERROR, 0, 'Exec', f"{program} is not executable"))
+            elif folders and not any(program in self._folders[folder][1] for folder in folders):
+                issues.append(Issue(ERROR, 0, 'Exec', f"{program} is not in $PATH"))
+            for target in targets[1:]:
+                if os.path.isabs(target) and _visible(target) and self._mode(target) is None:
+                    issues.append(Issue(ERROR, 0, 'Exec', f"{target} doesn't exist"))
+
+        if os.path.isabs(icon):
+            if _visible(icon) and self._mode(icon) is None:
+                issues.append(Issue(WARNING, 0, 'Icon', f"{icon} doesn't exist"))
+        elif icon and self._icons[1] is not None:
+            # Some entries still name the file of the icon
+            if (_icon_name(icon) or icon) not in self._icons[1]:
+                issues.append(Issue(WARNING, 0, 'Icon', f"no icon named {icon} in the icon themes"))
+        return tuple(issues)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,247 @@
+# icons.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from gi.repository import GdkPixbuf, Gio, GLib
+
+from turtle import trace
+
+logger = logging.getLogger(__name__)
+
+# (path, mtime, size, pixel size) of a scaled icon
+IconKey = Tuple[str, int, int, int]
+# (path, pixel size) asked for
+IconRequest = Tuple[str, int]
+IconCallback = Callable[[Optional[GdkPixbuf.Pixbuf]], None]
+
+CACHE_SIZE = 256
+# How long a cached icon is shown without checking that its file didn't change
+REVALIDATE_SECONDS = 10.0
+# The least recently used thumbnails are removed beyond this
+THUMBNAILS_MAX_BYTES = 32 * 1024 * 1024
+
+
+class IconLoader:
+    """Load icon files scaled to a given size, off the main thread.
+
+    Decoded pixbufs are kept in an LRU cache keyed by the file's path,
+    mtime and size plus the requested pixel size, so rows sharing an icon
+    share a single pixbuf. Concurrent requests for the same icon wait for
+    the same load. With `persist`, scaled icons are also written as PNG
+    thumbnails to $XDG_CACHE_HOME/turtle/icons, which saves rasterizing
+    SVGs again on the next launch; beyond `THUMBNAILS_MAX_BYTES` the least
+    recently used ones are removed.
+
+    The main thread never touches the disk: files are looked up and
+    thumbnails written in worker threads. A cached icon is passed back
+    right away and its file checked in the background at most every
+    `REVALIDATE_SECONDS`; if it changed, the callback is called again
+    with the new icon.
+    """
+    _default: Optional['IconLoader'] = None
+
+    def __init__(self, cache_size: int = CACHE_SIZE, persist: bool = True):
+        self.cache_size = cache_size
+        self.persist = persist
+        self.cache_dir = os.path.join(GLib.get_user_cache_dir(), "turtle", "icons")
+        self._cache: 'OrderedDict[IconKey, GdkPixbuf.Pixbuf]' = OrderedDict()
+        # The key of the cached icon of each request, and when it was checked
+        self._keys: Dict[IconRequest, Tuple[IconKey, float]] = {}
+        self._in_flight: Dict[IconRequest, List[IconCallback]] = {}
+        self._started: Dict[IconRequest, float] = {}
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="turtle-icons")
+        self._pruned = False
+
+    @classmethod
+    def get_default(cls) -> 'IconLoader':
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def load(self, path: str, pixel_size: int, callback: IconCallback) -> None:
+        """Call `callback` with the scaled icon, or with None if it can't be
+        loaded. Cached icons are passed back right away."""
+        request = (path, pixel_size)
+        key, checked = self._keys.get(request, (None, 0.0))
+        pixbuf = self._cache.get(key) if key else None
+        if pixbuf is not None:
+            self._cache.move_to_end(key)
+            trace.count('icon_cache_hit')
+            callback(pixbuf)
+            if time.monotonic() - checked > REVALIDATE_SECONDS:
+                self._keys[request] = (key, time.monotonic())
+                self._executor.submit(self._revalidate, key, callback)
+            return
+
+        if request in self._in_flight:
+            self._in_flight[request].append(callback)
+            return
+        self._in_flight[request] = [callback]
+        self._started[request] = trace.now()
+        self._executor.submit(self._locate, request)
+
+    def thumbnail_path(self, key: IconKey) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.png")
+
+    def _stat(self, request: IconRequest) -> Optional[IconKey]:
+        path, pixel_size = request
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (path, st.st_mtime_ns, st.st_size, pixel_size)
+
+    def _locate(self, request: IconRequest) -> None:
+        """Runs in a worker thread."""
+        key = self._stat(request)
+        thumbnail = key is not None and self.persist and os.path.exists(self.thumbnail_path(key))
+        GLib.idle_add(self._located, request, key, thumbnail)
+
+    def _located(self, request: IconRequest, key: Optional[IconKey], thumbnail: bool) -> bool:
+        if key is None:
+            self._done(request, None, None)
+        elif key in self._cache:
+            self._done(request, key, self._cache[key])
+        elif thumbnail:
+            self._read(key, self.thumbnail_path(key), from_thumbnail=True)
+        else:
+            self._read(key, key[0], from_thumbnail=False)
+        return GLib.SOURCE_REMOVE
+
+    def _revalidate(self, key: IconKey, callback: IconCallback) -> None:
+        """Runs in a worker thread."""
+        if self._stat((key[0], key[3])) != key:
+            GLib.idle_add(self._changed, key, callback)
+
+    def _changed(self, key: IconKey, callback: IconCallback) -> bool:
+        request = (key[0], key[3])
+        if self._keys.get(request, (None,))[0] == key:
+            del self._keys[request]
+            self._cache.pop(key, None)
+        self.load(key[0], key[3], callback)
+        return GLib.SOURCE_REMOVE
+
+    def _read(self, key: IconKey, path: str, from_thumbnail: bool) -> None:
+        Gio.File.new_for_path(path).read_async(
+            GLib.PRIORITY_LOW, None, self._on_read, (key, from_thumbnail)
+        )
+
+    def _on_read(self, file: Gio.File, result: Gio.AsyncResult, data) -> None:
+        key, from_thumbnail = data
+        try:
+            stream = file.read_finish(result)
+        except GLib.Error as e:
+            self._failed(key, from_thumbnail, e)
+            return
+
+        pixel_size = key[3]
+        GdkPixbuf.Pixbuf.new_from_stream_at_scale_async(
+            stream, pixel_size, pixel_size, True, None, self._on_decoded, (key, from_thumbnail, stream)
+        )
+
+    def _on_decoded(self, _source, result: Gio.AsyncResult, data) -> None:
+        key, from_thumbnail, stream = data
+        stream.close_async(GLib.PRIORITY_LOW, None, None)
+        try:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_stream_finish(result)
+        except GLib.Error as e:
+            self._failed(key, from_thumbnail, e)
+            return
+
+        if self.persist and not from_thumbnail:
+            self._executor.submit(self._save_thumbnail, key, pixbuf)
+        self._done((key[0], key[3]), key, pixbuf)
+
+    def _failed(self, key: IconKey, from_thumbnail: bool, error: GLib.Error) -> None:
+        if from_thumbnail:
+            # Broken thumbnail, fall back to the icon itself
+            self._read(key, key[0], from_thumbnail=False)
+            return
+        logger.warning("Can't load icon %s: %s", key[0], error.message)
+        self._done((key[0], key[3]), key, None)
+
+    def _done(self, request: IconRequest, key: Optional[IconKey], pixbuf: Optional[GdkPixbuf.Pixbuf]) -> None:
+        trace.record('icon_load', self._started.pop(request, trace.now()), path=request[0],
+                     loaded=pixbuf is not None)
+        if pixbuf is not None:
+            self._cache[key] = pixbuf
+            self._cache.move_to_end(key)
+            self._keys[request] = (key, time.monotonic())
+            while len(self._cache) > self.cache_size:
+                old, _pixbuf = self._cache.popitem(last=False)
+                if self._keys.get((old[0], old[3]), (None,))[0] == old:
+                    del self._keys[(old[0], old[3])]
+        for callback in self._in_flight.pop(request, []):
+            callback(pixbuf)
+
+    def _save_thumbnail(self, key: IconKey, pixbuf: GdkPixbuf.Pixbuf) -> None:
+        """Runs in a worker thread."""
+        path = self.thumbnail_path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            pixbuf.savev(f"{path}.tmp", "png", [], [])
+            os.replace(f"{path}.tmp", path)
+        except (GLib.Error, OSError) as e:
+            logger.warning("Can't save icon thumbnail %s: %s", path, e)
+            return
+        if not self._pruned:
+            self._pruned = True
+            self._prune()
+
+    def _prune(self) -> None:
+        """Remove the least recently used thumbnails beyond
+        `THUMBNAILS_MAX_BYTES`, once per session. Access times have the
+        granularity of relatime, a day, which is enough here."""
+        thumbnails = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    thumbnails.append((max(st.st_atime, st.st_mtime), st.st_size, entry.path))
+        except OSError:
+            return
+        total = sum(size for _used, size, _path in thumbnails)
+        for _used, size, path in sorted(thumbnails):
+            if total <= THUMBNAILS_MAX_BYTES:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,195 @@
+# library.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from gi.repository import GLib
+
+from turtle.appdata import AppData
+from turtle.cache import CatalogCache
+from turtle.catalog import Catalog, Splice
+from turtle.desktop_entry import locale_candidates
+from turtle.health import HealthScanner
+from turtle.loader import AppsLoader
+from turtle.validator import ValidationCache, Verdict, validate_files
+from turtle.watcher import AppsWatcher
+from turtle.xdg import applications_dirs
+
+SpliceListener = Callable[[List[Splice]], None]
+
+# Rows whose verdict changed shown again per idle
+CHECK_CHUNK_SIZE = 256
+
+
+class Library:
+    """The catalog of installed entries of the running instance, shared by
+    the installed apps page and the D-Bus service.
+
+    Every change to the catalog goes through here and is handed to the
+    `listeners` as splices, so a list store fed by them stays in sync
+    whoever made the change.
+    """
+
+    def __init__(self):
+        self.catalog = Catalog(applications_dirs())
+        self.cache = CatalogCache()
+        self.loader = AppsLoader(self.catalog, self.changed, self.loaded)
+        self.watcher = AppsWatcher(self.catalog.directories, self.sync)
+        self.validation = ValidationCache()
+        self.health = HealthScanner()
+        # Entries of the user's folder whose program is gone
+        self.broken: Set[str] = set()
+        self.listeners: List[SpliceListener] = []
+        self.broken_listeners: List[Callable[[], None]] = []
+        self._refreshed = False
+        self._check_lock = threading.Lock()
+
+    @property
+    def complete(self) -> bool:
+        """Whether the catalog matches the folders and is being kept so."""
+        return self.watcher.active and (self._refreshed or self.loader.complete)
+
+    def changed(self, splices: List[Splice]) -> None:
+        if splices:
+            for listener in list(self.listeners):
+                listener(splices)
+
+    def restore(self) -> None:
+        """Show the entries of the previous session while nothing is loaded."""
+        if not len(self.catalog):
+            cached = self.cache.load(self.catalog.directories, locale_candidates())
+            self.changed(self.catalog.restore(cached))
+
+    def load(self) -> None:
+        """Bring the catalog up to date without blocking the main loop."""
+        self.restore()
+        # Start watching before the scan so no change falls in between
+        self.watcher.start()
+        self.loader.load()
+
+    def refresh(self) -> None:
+        """Bring the catalog up to date right away."""
+        self.loader.cancel()
+        self.watcher.start()
+        self.changed(self.catalog.refresh())
+        self._refreshed = True
+        self.loaded()
+
+    def loaded(self) -> None:
+        """The catalog matches the folders: watch the subfolders found."""
+        self.watcher.watch(self.catalog.scanner.folders())
+        self.check()
+
+    def set_sort_mode(self, sort_mode: str) -> None:
+        self.changed(self.catalog.set_sort_mode(sort_mode))
+
+    def ensure_complete(self) -> None:
+        if not self.complete:
+            self.refresh()
+
+    def sync(self, paths: Iterable[str]) -> None:
+        """Take changes to `paths` into account, e.g. after writing them."""
+        paths = list(paths)
+        self.changed(self.catalog.sync(paths))
+        folders = tuple(path + os.sep for path in paths if not path.endswith('.desktop'))
+        if folders:
+            self.watcher.watch(self.catalog.scanner.folders())
+            paths += [path for path in self.catalog.entries if path.startswith(folders)]
+        gone = {path for path in self.broken if path not in self.catalog}
+        if gone:
+            self.broken -= gone
+            self.broken_changed()
+        self.check(paths)
+
+    def check(self, paths: Optional[List[str]] = None) -> None:
+        """Validate the entries of `paths`, or all of them, and look for
+        missing programs and icons, in the background. The rows of the
+        entries whose verdict changed are shown again."""
+        if paths is None:
+            apps = [(path, app_data) for path, (_key, app_data) in self.catalog.entries.items()]
+        else:
+            apps = [(path, self.catalog.get(path)) for path in paths if path in self.catalog]
+        if apps:
+            self.loader.executor.submit(self._check, apps)
+
+    def _check(self, apps: List[Tuple[str, AppData]]) -> None:
+        """Runs in a worker thread.
+
+        Both checks run one after the other and only the verdicts that
+        changed are handed to the main loop, a chunk per idle, so it stays
+        responsive while thousands of entries are checked.
+        """
+        with self._check_lock:
+            verdicts = validate_files([path for path, _app_data in apps], self.validation)
+            self._hand_over('issues', [(path, app_data, verdicts[path]) for path, app_data in apps
+                                       if app_data.issues != verdicts[path]])
+
+            verdicts = self.health.scan((path, app_data.summary.exec, app_data.icon) for path, app_data in apps)
+            self._hand_over('health', [(path, app_data, verdicts[path]) for path, app_data in apps
+                                       if app_data.health != verdicts[path]])
+            user_prefix = self.catalog.directory + os.sep
+            broken = {path for path, app_data in apps
+                      if path.startswith(user_prefix) and self.health.program_missing(app_data.summary.exec)}
+            GLib.idle_add(self._health_checked, set(verdicts), broken)
+
+    def _hand_over(self, attribute: str, changed: List[Tuple[str, AppData, Verdict]]) -> None:
+        for start in range(0, len(changed), CHECK_CHUNK_SIZE):
+            GLib.idle_add(self._checked, attribute, changed[start:start + CHECK_CHUNK_SIZE])
+
+    def _checked(self, attribute: str, changed: List[Tuple[str, AppData, Verdict]]) -> bool:
+        paths = []
+        for path, app_data, verdict in changed:
+            # Entries replaced while they were checked are checked again
+            if path in self.catalog and self.catalog.get(path) is app_data:
+                setattr(app_data, attribute, verdict)
+                paths.append(path)
+        self.changed(self.catalog.touch(paths))
+        return GLib.SOURCE_REMOVE
+
+    def _health_checked(self, checked: Set[str], broken: Set[str]) -> bool:
+        self.broken -= checked
+        self.broken |= {path for path in broken if path in self.catalog}
+        self.broken_changed()
+        return GLib.SOURCE_REMOVE
+
+    def broken_changed(self) -> None:
+        for listener in list(self.broken_listeners):
+            listener()
+
+    def cancel(self) -> None:
+        self.loader.cancel()
+
+    def shutdown(self) -> None:
+        self.watcher.stop()
+        self.loader.shutdown()
+        self.health.shutdown()
+        # A partial catalog would only make the next launch show missing rows
+        if self._refreshed or self.loader.complete:
+            self.cache.save(self.catalog.directories, locale_candidates(), self.catalog.snapshot())
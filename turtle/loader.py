@@ -0,0 +1,169 @@
+# loader.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from gi.repository import Gio, GLib
+
+from turtle import trace
+from turtle.appdata import AppData
+from turtle.catalog import Catalog, Splice, StatKey
+
+# Rows added to the list per idle
+CHUNK_SIZE = 64
+
+
+class AppsLoader:
+    """Fill a `Catalog` without blocking the main loop.
+
+    The applications folders are walked in a worker thread, changed files
+    are parsed in a thread pool and the results are applied to the catalog
+    in chunks from an idle callback, so the first rows show up right away
+    and the list fills progressively. `callback` receives the splices of
+    every chunk, `completed` is called once the catalog is up to date.
+    """
+
+    def __init__(self,
+                 catalog: Catalog,
+                 callback: Callable[[List[Splice]], None],
+                 completed: Optional[Callable[[], None]] = None):
+        self.catalog = catalog
+        self.callback = callback
+        self.completed = completed
+        self.complete = False
+        self.cancellable: Optional[Gio.Cancellable] = None
+        self.executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                           thread_name_prefix="turtle-loader")
+        self._lock = threading.Lock()
+        self._results: Deque[Tuple[Gio.Cancellable, str, StatKey, Optional[AppData]]] = deque()
+        self._seen: Dict[str, StatKey] = {}
+        self._pending = 0
+        self._enumerated = False
+        self._idle_id = 0
+        self._started = 0.0
+
+    def load(self) -> None:
+        self.cancel()
+        self.complete = False
+        self.cancellable = Gio.Cancellable()
+        self._seen = {}
+        self._pending = 0
+        self._enumerated = False
+        self._started = trace.now()
+        self.executor.submit(self._scan, self.cancellable)
+
+    def cancel(self) -> None:
+        """Stop the current load, what was applied so far stays in the catalog."""
+        if self.cancellable:
+            self.cancellable.cancel()
+            self.cancellable = None
+        with self._lock:
+            if self._idle_id:
+                GLib.source_remove(self._idle_id)
+                self._idle_id = 0
+            self._results.clear()
+
+    def shutdown(self) -> None:
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+    def _scan(self, cancellable: Gio.Cancellable) -> None:
+        """Runs in a worker thread."""
+        with trace.span('scan_folders'):
+            found = self.catalog.scan()
+        GLib.idle_add(self._on_scanned, found, cancellable)
+
+    def _on_scanned(self, found: Dict[str, StatKey], cancellable: Gio.Cancellable) -> bool:
+        if cancellable.is_cancelled():
+            return GLib.SOURCE_REMOVE
+
+        self._seen = found
+        for path, key in found.items():
+            if self.catalog.is_stale(path, key):
+                self._pending += 1
+                self.executor.submit(self._parse, path, key, cancellable)
+        self._enumerated = True
+        self._schedule(cancellable)
+        return GLib.SOURCE_REMOVE
+
+    def _parse(self, path: str, key: StatKey, cancellable: Gio.Cancellable) -> None:
+        """Runs in a worker thread."""
+        if cancellable.is_cancelled():
+            return
+        app_data = self.catalog.parse(path)
+        self._results.append((cancellable, path, key, app_data))
+        self._schedule(cancellable)
+
+    def _schedule(self, cancellable: Gio.Cancellable) -> None:
+        with self._lock:
+            if not self._idle_id and not cancellable.is_cancelled():
+                self._idle_id = GLib.idle_add(self._drain, cancellable)
+
+    def _drain(self, cancellable: Gio.Cancellable) -> bool:
+        with self._lock:
+            self._idle_id = 0
+        if cancellable.is_cancelled():
+            return GLib.SOURCE_REMOVE
+
+        start = trace.now()
+        changed: Dict[str, StatKey] = {}
+        parsed: Dict[str, Optional[AppData]] = {}
+        while self._results and len(changed) < CHUNK_SIZE:
+            origin, path, key, app_data = self._results.popleft()
+            if origin is not cancellable:
+                # Left over from a cancelled load
+                continue
+            self._pending -= 1
+            # The file monitor may have delivered a newer version meanwhile
+            if self.catalog.is_stale(path, key):
+                changed[path] = key
+                parsed[path] = app_data
+
+        old_len = len(self.catalog)
+        splices = self.catalog.apply([], changed, parsed)
+
+        if self._enumerated and not self._pending:
+            removed = [path for path in self.catalog.entries if path not in self._seen]
+            splices += self.catalog.apply(removed, {})
+            self.complete = True
+            self.cancellable = None
+            trace.record('load_available_apps', self._started, entries=len(self.catalog))
+
+        if splices:
+            self.callback(self.catalog.coalesce(splices, old_len))
+        trace.record('apply_chunk', start, entries=len(changed))
+        if self.complete and self.completed:
+            self.completed()
+
+        if self._results:
+            self._schedule(cancellable)
+        return GLib.SOURCE_REMOVE
@@ -27,7 +27,7 @@
 # authorization.
 
 import sys
-from typing import List
+from typing import List, Optional
 
 import gi
 
@@ -35,13 +35,19 @@ gi.require_version('Gtk', '3.0')
 gi.require_version('Granite', '1.0')
 gi.require_version('Handy', '1')
 
-from gi.repository import Gtk, Gio, Granite, GLib, Gdk
+from gi.repository import Gtk, Gio, GLib
 
-from .window import TurtleWindow
+from turtle import startup
+
+INACTIVITY_TIMEOUT_MS = 30000
+
+# Granite, Handy and the window module are imported when the window is first
+# needed: a second `turtle` process only forwards its arguments to the
+# running instance and never gets there.
 
 
 class Application(Gtk.Application):
-    granite_settings: Granite.Settings
+    granite_settings: 'Granite.Settings'
     gtk_settings: Gtk.Settings
 
     # App vars to handle command line
@@ -50,11 +56,18 @@ class Application(Gtk.Application):
     app_terminal: bool = False
     app_icon: str
 
-    def __init__(self):
+    def __init__(self, resource_path: Optional[str] = None):
         super().__init__(application_id='com.github.tenderowl.turtle',
                          flags=Gio.ApplicationFlags.HANDLES_OPEN)
 
-        self.window: TurtleWindow = None
+        self.resource_path = resource_path
+        self.window: 'TurtleWindow' = None
+        self.granite_settings = None
+        # Shared by the window and the D-Bus service, created when first needed
+        self.library: Optional['Library'] = None
+        self.service: Optional['EntriesService'] = None
+        # How long a window-less instance (--gapplication-service) waits for calls
+        self.set_inactivity_timeout(INACTIVITY_TIMEOUT_MS)
 
         self.add_main_option("title", b"t",
                              GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
@@ -65,51 +78,99 @@ class Application(Gtk.Application):
         self.add_main_option("terminal", b"c",
                              GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
                              "open in terminal", None)
+        self.add_main_option("profile-startup", 0,
+                             GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+                             "print how long each startup phase took", None)
+
+    def do_startup(self):
+        Gtk.Application.do_startup(self)
+        # Only the primary instance gets here
+        if self.resource_path:
+            Gio.Resource.load(self.resource_path)._register()
+        startup.mark("startup")
+
+    def do_dbus_register(self, connection: Gio.DBusConnection, object_path: str) -> bool:
+        from turtle.service import EntriesService
+
+        self.service = EntriesService(self)
+        self.service.register(connection, object_path)
+        return Gtk.Application.do_dbus_register(self, connection, object_path)
+
+    def do_dbus_unregister(self, connection: Gio.DBusConnection, object_path: str) -> None:
+        if self.service:
+            self.service.unregister(connection)
+        Gtk.Application.do_dbus_unregister(self, connection, object_path)
+
+    def do_shutdown(self):
+        if self.library:
+            self.library.shutdown()
+        Gtk.Application.do_shutdown(self)
+
+    def get_library(self) -> 'Library':
+        if self.library is None:
+            from turtle.library import Library
+            self.library = Library()
+        return self.library
 
     def do_activate(self):
-        self.granite_settings = Granite.Settings.get_default()
-        self.gtk_settings = Gtk.Settings.get_default()
+        from gi.repository import Granite
+        from turtle.window import TurtleWindow
 
-        # Then, we check if the user's preference is for the dark style and set it if it is
-        self.gtk_settings.props.gtk_application_prefer_dark_theme = \
-            self.granite_settings.props.prefers_color_scheme == Granite.SettingsColorScheme.DARK
+        # Activated again for every `turtle` run while this instance is alive
+        if self.granite_settings is None:
+            self.granite_settings = Granite.Settings.get_default()
+            self.gtk_settings = Gtk.Settings.get_default()
 
-        # Finally, we listen to changes in Granite.Settings and update our app if the user changes their preference
-        self.granite_settings.connect("notify::prefers-color-scheme",
-                                      self.color_scheme_changed)
+            # Then, we check if the user's preference is for the dark style and set it if it is
+            self.gtk_settings.props.gtk_application_prefer_dark_theme = \
+                self.granite_settings.props.prefers_color_scheme == Granite.SettingsColorScheme.DARK
+
+            # Finally, we listen to changes in Granite.Settings and update our app if the user changes their preference
+            self.granite_settings.connect("notify::prefers-color-scheme",
+                                          self.color_scheme_changed)
 
         self.window = self.props.active_window
         if not self.window:
+            startup.mark("import window")
             self.window = TurtleWindow(application=self)
+            startup.mark("build window")
+            if startup.enabled:
+                self.window.connect_after("draw", self.first_frame_drawn)
         self.window.present()
 
+    def first_frame_drawn(self, window, _cr) -> None:
+        window.disconnect_by_func(self.first_frame_drawn)
+        startup.mark("first frame")
+        startup.report()
+
     def do_handle_local_options(self, options: GLib.VariantDict) -> int:
         _app_name = options.lookup_value("title", GLib.VariantType("s"))
         self.app_name = _app_name.get_string() if _app_name else ""
         _app_icon = options.lookup_value("icon", GLib.VariantType("s"))
         self.app_icon = _app_icon.get_string() if _app_icon else ""
         self.app_terminal = options.contains("terminal")
+        startup.mark("options")
 
         return Gtk.Application.do_handle_local_options(self, options)
 
     def do_open(self, files: List[Gio.File], _n_files: int, _hint):
         self.activate()
-        if _n_files > 0:
-            self.app_path = files[0].get_path()
-            self.open_file()
-
-    def open_file(self):
-        self.window.exec_path = self.app_path
+        paths = [file.get_path() for file in files if file.get_path()]
+        if len(paths) == 1:
+            self.app_path = paths[0]
+        # --title, --icon and --terminal only apply to a single executable
         self.window.app_name = self.app_name
         self.window.app_icon = self.app_icon
         self.window.app_terminal = self.app_terminal
-        self.window.switch_to_setup()
+        self.window.open_paths(paths)
 
     def color_scheme_changed(self, _old, _new):
+        from gi.repository import Granite
+
         self.gtk_settings.props.gtk_application_prefer_dark_theme = \
             self.granite_settings.props.prefers_color_scheme == Granite.SettingsColorScheme.DARK
 
 
-def main(version):
-    app = Application()
+def main(version, resource_path: Optional[str] = None):
+    app = Application(resource_path)
     return app.run(sys.argv)
@@ -0,0 +1,150 @@
+# search.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+import bisect
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.casefold())
+
+
+def index_words(fields: Iterable[str]) -> Tuple[str, ...]:
+    """The distinct words `fields` are indexed by."""
+    return tuple(set(word for field in fields for word in tokenize(field)))
+
+
+class SearchIndex:
+    """Word prefix index over the searchable fields of the entries.
+
+    Every query word must be the prefix of a word of the entry, so "fire"
+    finds "Firefox" and "web brow" finds an entry with the "Web" category
+    and "browser" keyword. A query costs a binary search over the sorted
+    vocabulary per word plus set operations on the matching entries; adding
+    or removing an entry only touches its own words.
+    """
+
+    def __init__(self):
+        self.vocabulary: List[str] = []
+        self.postings: Dict[str, Set[str]] = {}
+        self.entry_words: Dict[str, Tuple[str, ...]] = {}
+        # (key, words) added by `extend` and not indexed yet
+        self._queued: List[Tuple[str, Tuple[str, ...]]] = []
+
+    def __len__(self) -> int:
+        if self._queued:
+            self._build()
+        return len(self.entry_words)
+
+    def words(self, key: str) -> Tuple[str, ...]:
+        if self._queued:
+            self._build()
+        return self.entry_words[key]
+
+    def add(self, key: str, fields: Iterable[str]) -> None:
+        """Index `key` by the words of `fields`, replacing what it had."""
+        self.add_words(key, index_words(fields))
+
+    def add_words(self, key: str, words: Tuple[str, ...]) -> None:
+        """Index `key` by already tokenized `words`."""
+        if self._queued:
+            self._build()
+        if key in self.entry_words:
+            self.remove(key)
+
+        self.entry_words[key] = words
+        for word in words:
+            keys = self.postings.get(word)
+            if keys is None:
+                keys = self.postings[word] = set()
+                bisect.insort(self.vocabulary, word)
+            keys.add(key)
+
+    def extend(self, items: Iterable[Tuple[str, Tuple[str, ...]]]) -> None:
+        """Index many `(key, words)` at once.
+
+        The postings are only built the first time the index is used, and
+        the vocabulary is sorted once instead of inserting every new word.
+        """
+        self._queued.extend(items)
+
+    def _build(self) -> None:
+        queued, self._queued = self._queued, []
+        for key, words in queued:
+            if key in self.entry_words:
+                self.remove(key)
+            self.entry_words[key] = words
+            for word in words:
+                keys = self.postings.get(word)
+                if keys is None:
+                    keys = self.postings[word] = set()
+                keys.add(key)
+        self.vocabulary = sorted(self.postings)
+
+    def remove(self, key: str) -> None:
+        if self._queued:
+            self._build()
+        for word in self.entry_words.pop(key, ()):
+            keys = self.postings[word]
+            keys.discard(key)
+            if not keys:
+                del self.postings[word]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+
+    def prefixed(self, prefix: str) -> Set[str]:
+        """Return the keys having a word starting with `prefix`."""
+        if self._queued:
+            self._build()
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        # Every word starting with `prefix` sorts before `prefix` + the last code point
+        end = bisect.bisect_left(self.vocabulary, prefix + '\U0010ffff', start)
+        if end - start == 1:
+            return self.postings[self.vocabulary[start]]
+        result: Set[str] = set()
+        for word in self.vocabulary[start:end]:
+            result |= self.postings[word]
+        return result
+
+    def search(self, query: str) -> Optional[Set[str]]:
+        """Return the keys matching every word of `query`, or None when the
+        query has no words and everything matches."""
+        words = set(tokenize(query))
+        if not words:
+            return None
+
+        # Start from the most selective word, `&` iterates over the smaller set
+        matches = sorted((self.prefixed(word) for word in words), key=len)
+        result = set(matches[0])
+        for keys in matches[1:]:
+            if not result:
+                break
+            result &= keys
+        return result
@@ -0,0 +1,287 @@
+# service.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""D-Bus interface to manage entries through the running instance.
+
+Scripts get a warm catalog instead of starting a process per call. The
+interface is exported on the application's object path of the session bus;
+`turtle --gapplication-service` starts an instance without a window. To try
+it on a private bus:
+
+    dbus-run-session -- sh -c '
+        turtle --gapplication-service &
+        sleep 1
+        gdbus call --session --dest com.github.tenderowl.turtle \
+            --object-path /com/github/tenderowl/turtle \
+            --method com.github.tenderowl.turtle.Entries.List 0 50'
+"""
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from gi.repository import Gio, GLib
+
+logger = logging.getLogger(__name__)
+
+INTERFACE = 'com.github.tenderowl.turtle.Entries'
+
+INTROSPECTION = f'''
+<node>
+  <interface name="{INTERFACE}">
+    <!-- entry: name (s), exec (s), icon (s), terminal (b), version (s) -->
+    <method name="Create">
+      <arg direction="in" name="entry" type="a{{sv}}"/>
+      <arg direction="out" name="path" type="s"/>
+    </method>
+    <!-- paths: the files written, entries that existed unchanged are left out -->
+    <method name="CreateMany">
+      <arg direction="in" name="entries" type="aa{{sv}}"/>
+      <arg direction="out" name="paths" type="as"/>
+      <arg direction="out" name="errors" type="a(ss)"/>
+    </method>
+    <!-- changes: Desktop Entry keys, e.g. Name (s), Hidden (b), Categories (as) -->
+    <method name="Update">
+      <arg direction="in" name="path" type="s"/>
+      <arg direction="in" name="changes" type="a{{sv}}"/>
+      <arg direction="out" name="saved_path" type="s"/>
+    </method>
+    <method name="Delete">
+      <arg direction="in" name="path" type="s"/>
+    </method>
+    <!-- limit 0 means no limit -->
+    <method name="List">
+      <arg direction="in" name="offset" type="u"/>
+      <arg direction="in" name="limit" type="u"/>
+      <arg direction="out" name="total" type="u"/>
+      <arg direction="out" name="entries" type="aa{{sv}}"/>
+    </method>
+    <method name="Search">
+      <arg direction="in" name="query" type="s"/>
+      <arg direction="in" name="offset" type="u"/>
+      <arg direction="in" name="limit" type="u"/>
+      <arg direction="out" name="total" type="u"/>
+      <arg direction="out" name="entries" type="aa{{sv}}"/>
+    </method>
+  </interface>
+</node>
+'''
+
+INVALID_ARGS = 'org.freedesktop.DBus.Error.InvalidArgs'
+FILE_NOT_FOUND = 'org.freedesktop.DBus.Error.FileNotFound'
+FAILED = 'org.freedesktop.DBus.Error.Failed'
+
+# A Desktop Entry key, optionally localized: Name, Name[pt_BR], Name[sr@latin]
+KEY = re.compile(r'[A-Za-z0-9-]+(\[[A-Za-z0-9_.@]+\])?')
+
+
+class ServiceError(Exception):
+    def __init__(self, name: str, message: str):
+        super().__init__(message)
+        self.name = name
+
+
+class EntriesService:
+    """Exports `INTERFACE` for `app`, a `turtle.main.Application`.
+
+    The catalog modules are only imported on the first call: they need the
+    application's resources, registered after the bus name is acquired.
+    """
+
+    def __init__(self, app: Gio.Application):
+        self.app = app
+        self.registration_id = 0
+        self.interface = Gio.DBusNodeInfo.new_for_xml(INTROSPECTION).lookup_interface(INTERFACE)
+
+    def register(self, connection: Gio.DBusConnection, object_path: str) -> None:
+        self.registration_id = connection.register_object(object_path, self.interface,
+                                                          self.method_call, None, None)
+
+    def unregister(self, connection: Gio.DBusConnection) -> None:
+        if self.registration_id:
+            connection.unregister_object(self.registration_id)
+            self.registration_id = 0
+
+    def method_call(self, connection: Gio.DBusConnection, sender: str, object_path: str,
+                    interface_name: str, method_name: str, parameters: GLib.Variant,
+                    invocation: Gio.DBusMethodInvocation) -> None:
+        # Restarts the inactivity timeout of a window-less instance
+        self.app.hold()
+        try:
+            handler = getattr(self, f'do_{method_name}')
+            result = handler(invocation, *parameters.unpack())
+            if result is not None:
+                invocation.return_value(result)
+        except ServiceError as e:
+            invocation.return_dbus_error(e.name, str(e))
+        except OSError as e:
+            invocation.return_dbus_error(FAILED, f"{e.filename}: {e.strerror}" if e.filename else str(e))
+        except Exception as e:
+            # Don't leave the caller waiting until it times out
+            logger.exception("%s failed", method_name)
+            invocation.return_dbus_error(FAILED, str(e))
+        finally:
+            self.app.release()
+
+    @property
+    def library(self):
+        return self.app.get_library()
+
+    # Methods return the reply, or None when they reply later themselves
+
+    def do_Create(self, invocation: Gio.DBusMethodInvocation, entry: Dict[str, Any]) -> Optional[GLib.Variant]:
+        from turtle.desktop_entry import desktop_file_path
+
+        new_entry = _to_entry(entry, 0)
+
+        def done(result) -> None:
+            self.library.sync(result.paths)
+            if result.errors:
+                path, error = result.errors[0]
+                invocation.return_dbus_error(FAILED, f"{path}: {error}")
+            else:
+                # Also when the same entry existed already
+                invocation.return_value(GLib.Variant('(s)', (desktop_file_path(new_entry.name),)))
+
+        self._create(invocation, [new_entry], done)
+        return None
+
+    def do_CreateMany(self, invocation: Gio.DBusMethodInvocation,
+                      entries: List[Dict[str, Any]]) -> Optional[GLib.Variant]:
+        def done(result) -> None:
+            self.library.sync(result.paths)
+            invocation.return_value(GLib.Variant('(asa(ss))', (result.paths, result.errors)))
+
+        self._create(invocation, [_to_entry(entry, i) for i, entry in enumerate(entries)], done)
+        return None
+
+    def _create(self, invocation: Gio.DBusMethodInvocation, entries: List, done) -> None:
+        from turtle.bulk import create_entries, run_in_background
+
+        # Thousands of files are written and synced off the main loop
+        self.app.hold()
+
+        def finished(result) -> None:
+            self.app.release()
+            if isinstance(result, Exception):
+                invocation.return_dbus_error(FAILED, str(result))
+            else:
+                done(result)
+
+        run_in_background(create_entries, finished, entries)
+
+    def do_Update(self, invocation: Gio.DBusMethodInvocation, path: str, changes: Dict[str, Any]) -> GLib.Variant:
+        from turtle.desktop_entry import DesktopEntry, DesktopEntryError
+
+        library = self.library
+        library.ensure_complete()
+        if path not in library.catalog:
+            raise ServiceError(FILE_NOT_FOUND, f"{path} is not an installed entry")
+        for key in changes:
+            # Anything else could add lines or groups to the file
+            if not KEY.fullmatch(key):
+                raise ServiceError(INVALID_ARGS, f"{key!r} is not a Desktop Entry key")
+
+        try:
+            entry = DesktopEntry.read(path)
+            for key, value in changes.items():
+                if isinstance(value, bool):
+                    entry.set_bool(key, value)
+                elif isinstance(value, str):
+                    entry.set(key, value)
+                elif isinstance(value, list) and all(isinstance(item, str) for item in value):
+                    entry.set_list(key, value)
+                else:
+                    raise ServiceError(INVALID_ARGS, f"{key}: expected a string, boolean or string list")
+        except DesktopEntryError as e:
+            raise ServiceError(FAILED, f"{path}: {e}")
+
+        saved_path = library.catalog.scanner.writable_path(path)
+        entry.write(saved_path)
+        library.sync([saved_path])
+        return GLib.Variant('(s)', (saved_path,))
+
+    def do_Delete(self, invocation: Gio.DBusMethodInvocation, path: str) -> GLib.Variant:
+        library = self.library
+        library.ensure_complete()
+        if path not in library.catalog:
+            raise ServiceError(FILE_NOT_FOUND, f"{path} is not an installed entry")
+        os.remove(path)
+        library.sync([path])
+        return GLib.Variant('()', ())
+
+    def do_List(self, invocation: Gio.DBusMethodInvocation, offset: int, limit: int) -> GLib.Variant:
+        library = self.library
+        library.ensure_complete()
+        total, page = _page(library.catalog.order, offset, limit)
+        return self._entries(total, page)
+
+    def do_Search(self, invocation: Gio.DBusMethodInvocation, query: str, offset: int, limit: int) -> GLib.Variant:
+        library = self.library
+        library.ensure_complete()
+        catalog = library.catalog
+        positions = catalog.search(query)
+        paths = catalog.order if positions is None else [catalog.order[position] for position in positions]
+        total, page = _page(paths, offset, limit)
+        return self._entries(total, page)
+
+    def _entries(self, total: int, paths: List[str]) -> GLib.Variant:
+        catalog = self.library.catalog
+        entries = []
+        for path in paths:
+            summary = catalog.get(path).summary
+            entries.append({
+                'path': GLib.Variant('s', path),
+                'name': GLib.Variant('s', summary.name),
+                'icon': GLib.Variant('s', summary.icon),
+                'exec': GLib.Variant('s', summary.exec),
+                'categories': GLib.Variant('s', summary.categories),
+                'keywords': GLib.Variant('s', summary.keywords),
+                'hidden': GLib.Variant('b', summary.hidden),
+                'terminal': GLib.Variant('b', summary.terminal),
+            })
+        return GLib.Variant('(uaa{sv})', (total, entries))
+
+
+def _page(paths: List[str], offset: int, limit: int) -> Tuple[int, List[str]]:
+    end = offset + limit if limit else len(paths)
+    return len(paths), paths[offset:end]
+
+
+def _to_entry(record: Dict[str, Any], index: int):
+    from turtle.batch import Entry
+
+    name = str(record.get('name', '')).strip()
+    exec_path = str(record.get('exec', '')).strip()
+    if not name or not exec_path:
+        raise ServiceError(INVALID_ARGS, f"entry {index}: `name` and `exec` are required")
+    return Entry(name=name,
+                 exec_path=exec_path,
+                 icon_path=str(record.get('icon', '')),
+                 terminal=bool(record.get('terminal', False)),
+                 app_version=str(record.get('version', '1.0')))
@@ -0,0 +1,59 @@
+# startup.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Phase timings of the application start, printed with --profile-startup.
+
+Imported by the launcher before anything else, so it has to stay free of
+gi and of the rest of the package.
+"""
+import sys
+import time
+from typing import List, Tuple
+
+PROFILE_OPTION = '--profile-startup'
+
+enabled = PROFILE_OPTION in sys.argv
+phases: List[Tuple[str, float]] = [("start", time.perf_counter())]
+
+
+def mark(phase: str) -> None:
+    """Record the end of `phase`."""
+    if enabled:
+        phases.append((phase, time.perf_counter()))
+
+
+def report() -> None:
+    if not enabled or len(phases) < 2:
+        return
+    start = phases[0][1]
+    previous = start
+    for phase, at in phases[1:]:
+        print(f"{phase:>24} {(at - previous) * 1000:8.1f} ms {(at - start) * 1000:8.1f} ms",
+              file=sys.stderr)
+        previous = at
+    del phases[1:]
@@ -0,0 +1,154 @@
+# trace.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Timers and counters around the hot paths, off unless asked for:
+
+    TURTLE_PERF_LOG=1      log every timed section as a JSON line on stderr
+    TURTLE_TRACE=FILE      write a Chrome/Perfetto trace to FILE on exit
+                           (open it in chrome://tracing or ui.perfetto.dev)
+    TURTLE_STALL_OVERLAY=1 show main loop stalls in a corner of the window
+
+Sections can be timed from any thread. This module must not import gi.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger('turtle.trace')
+
+trace_path = os.environ.get('TURTLE_TRACE')
+log_enabled = bool(os.environ.get('TURTLE_PERF_LOG'))
+enabled = bool(trace_path) or log_enabled
+stall_overlay = bool(os.environ.get('TURTLE_STALL_OVERLAY'))
+
+counters: Counter = Counter()
+# Chrome trace events, only kept when writing a trace file
+events: List[Dict[str, Any]] = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {'time': round(record.created, 6), 'event': record.getMessage()}
+        fields.update(getattr(record, 'fields', {}))
+        return json.dumps(fields)
+
+
+def now() -> float:
+    return time.perf_counter()
+
+
+def record(name: str, start: float, **args: Any) -> None:
+    """Record that `name` took from `start`, a `now()` value, until now."""
+    if not enabled:
+        return
+    end = time.perf_counter()
+    counters[name] += 1
+    if log_enabled:
+        logger.debug(name, extra={'fields': dict(args, duration_ms=round((end - start) * 1000, 3))})
+    if trace_path:
+        event = {'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                 'ts': (start - _origin) * 1e6, 'dur': (end - start) * 1e6}
+        if args:
+            event['args'] = args
+        with _lock:
+            events.append(event)
+
+
+@contextmanager
+def _span(name: str, args: Dict[str, Any]) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start, **args)
+
+
+class _NoSpan:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **args: Any):
+    """Time the body of a `with` block; costs nothing when disabled."""
+    if not enabled:
+        return _NO_SPAN
+    return _span(name, args)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Add `value` to a counter, shown in the trace as a counter track."""
+    if not enabled:
+        return
+    counters[name] += value
+    if trace_path:
+        with _lock:
+            events.append({'name': name, 'ph': 'C', 'pid': os.getpid(),
+                           'ts': (time.perf_counter() - _origin) * 1e6, 'args': {name: counters[name]}})
+
+
+def write(path: Optional[str] = None) -> None:
+    path = path or trace_path
+    if not path:
+        return
+    with _lock:
+        data = {'traceEvents': list(events), 'displayTimeUnit': 'ms'}
+    try:
+        with open(path, 'w') as f:
+            json.dump(data, f)
+    except OSError as e:
+        logger.warning("Can't write trace %s: %s", path, e)
+
+
+def _finish() -> None:
+    if log_enabled and counters:
+        logger.debug('counters', extra={'fields': dict(counters)})
+    write()
+
+
+if enabled:
+    if log_enabled:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+    atexit.register(_finish)
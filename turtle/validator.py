@@ -0,0 +1,538 @@
+# validator.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+"""Check Desktop Entry files against the specification.
+
+    turtle --validate                   every applications folder
+    turtle --validate FILE|FOLDER...    the given entries
+
+Verdicts only depend on the content of a file, so they are cached by
+content hash in $XDG_CACHE_HOME/turtle/validation.json and a file is only
+checked again once it changes. Large sets of files are checked in a
+process pool.
+
+This module must not import Gtk, it runs in worker processes.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from turtle.desktop_entry import DESKTOP_SECTION, EXEC_RESERVED, unescape
+from turtle.writer import write_atomic
+from turtle.xdg import StatKey, applications_dirs, stat_key, user_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when checks change, verdicts of the previous checks are dropped
+FORMAT_VERSION = 1
+
+# Fewer files than this are checked in the calling process: a file takes
+# about 40µs, starting the worker processes about 100ms
+POOL_THRESHOLD = 1000
+
+ERROR = 'error'
+WARNING = 'warning'
+
+STRING = 'string'
+LOCALESTRING = 'localestring'
+ICONSTRING = 'iconstring'
+BOOLEAN = 'boolean'
+STRINGS = 'strings'
+LOCALESTRINGS = 'localestrings'
+
+KEYS = {
+    'Type': STRING,
+    'Version': STRING,
+    'Name': LOCALESTRING,
+    'GenericName': LOCALESTRING,
+    'NoDisplay': BOOLEAN,
+    'Comment': LOCALESTRING,
+    'Icon': ICONSTRING,
+    'Hidden': BOOLEAN,
+    'OnlyShowIn': STRINGS,
+    'NotShowIn': STRINGS,
+    'DBusActivatable': BOOLEAN,
+    'TryExec': STRING,
+    'Exec': STRING,
+    'Path': STRING,
+    'Terminal': BOOLEAN,
+    'Actions': STRINGS,
+    'MimeType': STRINGS,
+    'Categories': STRINGS,
+    'Implements': STRINGS,
+    'Keywords': LOCALESTRINGS,
+    'StartupNotify': BOOLEAN,
+    'StartupWMClass': STRING,
+    'URL': STRING,
+    'PrefersNonDefaultGPU': BOOLEAN,
+    'SingleMainWindow': BOOLEAN,
+}
+ACTION_KEYS = {'Name': LOCALESTRING, 'Icon': ICONSTRING, 'Exec': STRING}
+DEPRECATED_KEYS = frozenset(('Encoding', 'MiniIcon', 'TerminalOptions', 'Protocols', 'Extensions',
+                             'BinaryPattern', 'MapNotify', 'SwallowTitle', 'SwallowExec', 'SortOrder',
+                             'FilePattern'))
+TYPES = frozenset(('Application', 'Link', 'Directory'))
+VERSIONS = frozenset(('1.0', '1.1', '1.2', '1.3', '1.4', '1.5'))
+
+FIELD_CODES = frozenset('fFuUick%')
+DEPRECATED_FIELD_CODES = frozenset('dDnNvm')
+# Characters that must be escaped with a backslash inside a quoted argument
+QUOTED_ESCAPES = frozenset('"`$\\')
+
+_KEY = re.compile(r'[A-Za-z0-9-]+\Z')
+_LOCALE = re.compile(r'[a-z]{2,3}(?:_[A-Za-z0-9]+)?(?:\.[A-Za-z0-9-]+)?(?:@[A-Za-z0-9]+)?\Z')
+_CONTROL = re.compile(r'[\x00-\x08\x0b-\x1f\x7f]')
+
+
+class Issue(NamedTuple):
+    severity: str
+    # 0 for issues about the whole file
+    line: int
+    key: str
+    message: str
+
+    def __str__(self) -> str:
+        location = f"{self.line}: " if self.line else ""
+        key = f"{self.key}: " if self.key else ""
+        return f"{location}{self.severity}: {key}{self.message}"
+
+
+Verdict = Tuple[Issue, ...]
+
+
+def _split_locale(key: str) -> Tuple[str, Optional[str]]:
+    if key.endswith(']') and '[' in key:
+        base, _, locale = key[:-1].partition('[')
+        return base, locale
+    return key, None
+
+
+def _check_escapes(value: str, in_list: bool) -> Optional[str]:
+    allowed = 'sntr\\;' if in_list else 'sntr\\'
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            if not escaped or escaped not in allowed:
+                return f"invalid escape sequence \\{escaped}"
+    return None
+
+
+def _ends_list(value: str) -> bool:
+    # An escaped semicolon is part of the last item
+    head = value[:-1]
+    return value.endswith(';') and (len(head) - len(head.rstrip('\\'))) % 2 == 0
+
+
+def check_exec(value: str, line: int = 0, key: str = 'Exec') -> List[Issue]:
+    """Check the quoting and field codes of an Exec value, already unescaped
+    as a string."""
+    issues: List[Issue] = []
+
+    def error(message: str) -> None:
+        issues.append(Issue(ERROR, line, key, message))
+
+    args: List[str] = []
+    file_codes = 0
+    i = 0
+    n = len(value)
+    while i < n:
+        if value[i] == ' ':
+            i += 1
+            continue
+
+        start = i
+        if value[i] == '"':
+            i += 1
+            while i < n and value[i] != '"':
+                if value[i] == '\\':
+                    if i + 1 >= n or value[i + 1] not in QUOTED_ESCAPES:
+                        error("a backslash in a quoted argument must escape one of \" ` $ \\")
+                    i += 2
+                    continue
+                if value[i] == '%':
+                    if value[i + 1:i + 2] != '%':
+                        error("field codes must not be used inside a quoted argument")
+                    i += 2
+                    continue
+                i += 1
+            if i >= n:
+                error("unterminated quoted argument")
+                return issues
+            i += 1
+            if i < n and value[i] != ' ':
+                error("quotes must enclose a whole argument")
+            args.append(value[start:i])
+            continue
+
+        while i < n and value[i] != ' ':
+            char = value[i]
+            if char == '%':
+                code = value[i + 1:i + 2]
+                if code in DEPRECATED_FIELD_CODES:
+                    issues.append(Issue(WARNING, line, key, f"the field code %{code} is deprecated"))
+                elif not code or code not in FIELD_CODES:
+                    error(f"invalid field code %{code}")
+                elif code in 'fFuU':
+                    file_codes += 1
+                i += 2
+                continue
+            if char in EXEC_RESERVED:
+                error(f"the reserved character {char!r} must be quoted")
+            i += 1
+        args.append(value[start:i])
+
+    if not args:
+        error("empty command")
+    elif args[0].startswith('%'):
+        error("the command must not be a field code")
+    elif args[0].startswith('"') and ' -' in args[0]:
+        # What older versions of Turtle wrote, e.g. "java -jar app.jar"
+        issues.append(Issue(WARNING, line, key, "the quotes seem to enclose a whole command, not only the program"))
+    if file_codes > 1:
+        error("only one of %f, %F, %u and %U can be used")
+    for arg in args:
+        for code in 'FUi':
+            if f'%{code}' in arg and arg != f'%{code}':
+                error(f"%{code} must be an argument on its own")
+    return issues
+
+
+def validate(data: bytes) -> Verdict:
+    """Return the issues of the Desktop Entry file `data`, best first."""
+    issues: List[Issue] = []
+
+    def add(severity: str, line: int, key: str, message: str) -> None:
+        issues.append(Issue(severity, line, key, message))
+
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        add(ERROR, 0, '', f"not valid UTF-8 at byte {e.start}")
+        text = data.decode('utf-8', 'replace')
+
+    # Group name: {key: (line, raw value)}
+    groups: Dict[str, Dict[str, Tuple[int, str]]] = {}
+    group: Optional[Dict[str, Tuple[int, str]]] = None
+    group_name = ''
+    for number, line in enumerate(text.splitlines(), 1):
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        if stripped.startswith('['):
+            if not stripped.endswith(']') or '[' in stripped[1:-1] or ']' in stripped[1:-1]:
+                add(ERROR, number, '', f"invalid group header {stripped}")
+                group = None
+                continue
+            group_name = stripped[1:-1]
+            if _CONTROL.search(group_name):
+                add(ERROR, number, '', "group names must not contain control characters")
+            if group_name in groups:
+                add(ERROR, number, '', f"duplicate group [{group_name}]")
+            elif not groups and group_name != DESKTOP_SECTION:
+                add(ERROR, number, '', f"the first group must be [{DESKTOP_SECTION}]")
+            group = groups.setdefault(group_name, {})
+            continue
+        if group is None:
+            add(ERROR, number, '', "key outside of any group" if '=' in stripped else "invalid line")
+            continue
+
+        key, sep, value = stripped.partition('=')
+        key = key.rstrip()
+        if not sep:
+            add(ERROR, number, '', f"not a key=value line: {stripped}")
+            continue
+        if key in group:
+            add(ERROR, number, key, f"duplicate key in [{group_name}]")
+            continue
+        group[key] = (number, value.lstrip())
+
+    entry = groups.get(DESKTOP_SECTION)
+    if entry is None:
+        add(ERROR, 0, '', f"no [{DESKTOP_SECTION}] group")
+        return tuple(issues)
+
+    actions: List[str] = []
+    if 'Actions' in entry:
+        actions = [action for action in entry['Actions'][1].split(';') if action]
+
+    for name, keys in groups.items():
+        if name == DESKTOP_SECTION:
+            _check_keys(keys, KEYS, add)
+        elif name.startswith('Desktop Action '):
+            action = name[len('Desktop Action '):]
+            if action not in actions:
+                add(WARNING, 0, '', f"[{name}] is not listed in Actions")
+            _check_keys(keys, ACTION_KEYS, add)
+            if 'Name' not in keys:
+                add(ERROR, 0, 'Name', f"required in [{name}]")
+        elif not name.startswith('X-'):
+            add(ERROR, 0, '', f"unknown group [{name}], extensions must start with X-")
+
+    entry_type = entry.get('Type', (0, ''))[1]
+    if 'Type' not in entry:
+        add(ERROR, 0, 'Type', "required key is missing")
+    elif entry_type not in TYPES:
+        add(ERROR, entry['Type'][0], 'Type', f"unknown type {entry_type}")
+    if 'Name' not in entry:
+        add(ERROR, 0, 'Name', "required key is missing")
+    if 'Version' in entry and entry['Version'][1] not in VERSIONS:
+        add(WARNING, entry['Version'][0], 'Version',
+            f"{entry['Version'][1]} is not a version of the specification")
+    if entry_type == 'Application' and 'Exec' not in entry \
+            and entry.get('DBusActivatable', (0, ''))[1] != 'true':
+        add(ERROR, 0, 'Exec', "required for applications that are not D-Bus activatable")
+    if entry_type == 'Link' and 'URL' not in entry:
+        add(ERROR, 0, 'URL', "required for links")
+    if 'OnlyShowIn' in entry and 'NotShowIn' in entry:
+        add(ERROR, entry['NotShowIn'][0], 'NotShowIn', "can't be used together with OnlyShowIn")
+    for action in actions:
+        if f'Desktop Action {action}' not in groups:
+            add(ERROR, entry['Actions'][0], 'Actions', f"no [Desktop Action {action}] group")
+
+    return tuple(sorted(issues, key=lambda issue: (issue.severity != ERROR, issue.line)))
+
+
+def _check_keys(keys: Dict[str, Tuple[int, str]], known: Dict[str, str], add) -> None:
+    for key, (line, value) in keys.items():
+        base, locale = _split_locale(key)
+        if not _KEY.match(base):
+            add(ERROR, line, key, "key names may only contain A-Z, a-z, 0-9 and -")
+            continue
+        if base.startswith('X-'):
+            continue
+        if base in DEPRECATED_KEYS:
+            add(WARNING, line, key, "deprecated key")
+            continue
+        kind = known.get(base)
+        if kind is None:
+            add(ERROR, line, key, "unknown key, extensions must start with X-")
+            continue
+        if locale is not None:
+            if kind not in (LOCALESTRING, ICONSTRING, LOCALESTRINGS):
+                add(ERROR, line, key, f"{base} can't be localized")
+            elif not _LOCALE.match(locale):
+                add(ERROR, line, key, f"invalid locale {locale}")
+
+        if _CONTROL.search(value):
+            add(ERROR, line, key, "values must not contain control characters")
+        if kind == BOOLEAN:
+            if value in ('0', '1'):
+                add(WARNING, line, key, "0 and 1 are deprecated, use false and true")
+            elif value not in ('true', 'false'):
+                add(ERROR, line, key, f"{value!r} is not a boolean")
+            continue
+
+        in_list = kind in (STRINGS, LOCALESTRINGS)
+        problem = _check_escapes(value, in_list)
+        if problem:
+            add(ERROR, line, key, problem)
+        elif in_list and value and not _ends_list(value):
+            add(WARNING, line, key, "lists should end with a semicolon")
+        elif base == 'Exec':
+            for issue in check_exec(unescape(value), line, key):
+                add(*issue)
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+class ValidationCache:
+    """Verdicts by content hash, and the content hash of every file by path
+    and stat key, so unchanged files are not even read again."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(user_cache_dir(), 'validation.json')
+        self.files: Dict[str, Tuple[StatKey, str]] = {}
+        self.verdicts: Dict[str, Verdict] = {}
+        self._loaded = False
+        self._dirty = False
+
+    def load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != FORMAT_VERSION:
+                return
+            self.files = {path: (tuple(key), digest) for path, (key, digest) in data['files'].items()}
+            self.verdicts = {digest: tuple(Issue(*issue) for issue in issues)
+                             for digest, issues in data['verdicts'].items()}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring validation cache %s: %s", self.path, e)
+            self.files = {}
+            self.verdicts = {}
+
+    def get(self, path: str, key: StatKey) -> Optional[Verdict]:
+        cached = self.files.get(path)
+        if cached is None or cached[0] != key:
+            return None
+        return self.verdicts.get(cached[1])
+
+    def put(self, path: str, key: StatKey, digest: str, verdict: Verdict) -> None:
+        self.files[path] = (key, digest)
+        self.verdicts[digest] = verdict
+        self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        used = {digest for _key, digest in self.files.values()}
+        data = {'version': FORMAT_VERSION,
+                'files': {path: [key, digest] for path, (key, digest) in self.files.items()},
+                'verdicts': {digest: [list(issue) for issue in verdict]
+                             for digest, verdict in self.verdicts.items() if digest in used}}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            write_atomic(self.path, json.dumps(data).encode('utf-8'), fsync=False)
+            self._dirty = False
+        except OSError as e:
+            logger.warning("Can't write validation cache %s: %s", self.path, e)
+
+
+def validate_files(paths: Iterable[str],
+                   cache: Optional[ValidationCache] = None,
+                   jobs: Optional[int] = None) -> Dict[str, Verdict]:
+    """Return the verdict of every file of `paths`.
+
+    Files whose stat key or content is in `cache` are not checked again;
+    the others are checked in a pool of `jobs` processes when there are
+    many of them. Unreadable files get a single error.
+    """
+    if cache is not None:
+        cache.load()
+
+    verdicts: Dict[str, Verdict] = {}
+    # Digest: content and the files having it
+    pending: Dict[str, Tuple[bytes, List[Tuple[str, StatKey]]]] = {}
+    for path in paths:
+        try:
+            key = stat_key(os.stat(path))
+            verdict = cache.get(path, key) if cache is not None else None
+            if verdict is not None:
+                verdicts[path] = verdict
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            verdicts[path] = (Issue(ERROR, 0, '', f"can't read the file: {e.strerror}"),)
+            continue
+
+        digest = _digest(data)
+        verdict = cache.verdicts.get(digest) if cache is not None else None
+        if verdict is not None:
+            verdicts[path] = verdict
+            cache.put(path, key, digest, verdict)
+        else:
+            pending.setdefault(digest, (data, []))[1].append((path, key))
+
+    if pending:
+        digests = list(pending)
+        contents = [pending[digest][0] for digest in digests]
+        jobs = jobs or os.cpu_count() or 1
+        if jobs > 1 and len(contents) >= POOL_THRESHOLD:
+            # Forking a process that runs GTK and threads is not safe
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+                results = list(executor.map(validate, contents, chunksize=max(1, len(contents) // (jobs * 4))))
+        else:
+            results = [validate(data) for data in contents]
+
+        for digest, verdict in zip(digests, results):
+            for path, key in pending[digest][1]:
+                verdicts[path] = verdict
+                if cache is not None:
+                    cache.put(path, key, digest, verdict)
+
+    if cache is not None:
+        cache.save()
+    return verdicts
+
+
+def find_entries(paths: Iterable[str]) -> List[str]:
+    """Replace the folders of `paths` by the .desktop files they contain."""
+    found: List[str] = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(path)
+            continue
+        for folder, _dirs, files in os.walk(path):
+            found.extend(os.path.join(folder, name) for name in sorted(files) if name.endswith('.desktop'))
+    return found
+
+
+def report(verdicts: Dict[str, Verdict], out=sys.stdout, quiet: bool = False) -> Tuple[int, int]:
+    """Print the issues of every file and return the numbers of errors and
+    warnings."""
+    errors = warnings = 0
+    for path, verdict in sorted(verdicts.items()):
+        if quiet:
+            verdict = tuple(issue for issue in verdict if issue.severity == ERROR)
+        if not verdict:
+            continue
+        out.write(f"{path}\n")
+        for issue in verdict:
+            out.write(f"  {issue}\n")
+            if issue.severity == ERROR:
+                errors += 1
+            else:
+                warnings += 1
+    invalid = sum(1 for verdict in verdicts.values() if any(issue.severity == ERROR for issue in verdict))
+    out.write(f"{len(verdicts)} files checked, {invalid} invalid: {errors} errors, {warnings} warnings\n")
+    return errors, warnings
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="turtle --validate",
+                                     description="Check menu entries against the Desktop Entry specification.")
+    parser.add_argument("paths", nargs="*", metavar="PATH",
+                        help="entries or folders to check (default: every applications folder)")
+    parser.add_argument("--jobs", "-j", type=int, help="number of processes (default: one per CPU)")
+    parser.add_argument("--no-cache", action="store_true", help="check every file again")
+    parser.add_argument("--quiet", "-q", action="store_true", help="only report errors")
+    args = parser.parse_args([arg for arg in argv if arg != "--validate"])
+
+    paths = find_entries(args.paths or [d for d in applications_dirs() if os.path.isdir(d)])
+    verdicts = validate_files(paths, None if args.no_cache else ValidationCache(), args.jobs)
+    errors, _warnings = report(verdicts, quiet=args.quiet)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
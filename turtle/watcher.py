@@ -0,0 +1,135 @@
+# watcher.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+import logging
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from gi.repository import Gio, GLib
+
+logger = logging.getLogger(__name__)
+
+# How long to collect file monitor events before flushing them at once
+DEBOUNCE_MS = 150
+
+
+class AppsWatcher:
+    """Watch applications folders for .desktop files being created, changed
+    or removed.
+
+    Events are coalesced: everything reported within `DEBOUNCE_MS` of the
+    first event is handed to `callback` as one set of paths. `start` watches
+    the folders themselves, `watch` adds their subfolders as the scanner
+    finds them. Subfolders appearing, disappearing or moving are reported
+    by their path, for the scanner to walk them again.
+    """
+
+    def __init__(self, directories: List[str], callback: Callable[[Set[str]], None]):
+        self.directories = directories
+        self.callback = callback
+        # Folder: (monitor, handler ID)
+        self.monitors: Dict[str, Tuple[Gio.FileMonitor, int]] = {}
+        self._pending: Set[str] = set()
+        self._flush_id = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self.monitors)
+
+    def start(self) -> bool:
+        """Start monitoring, returns False when the platform can't do it."""
+        if self.monitors:
+            return True
+        for directory in self.directories:
+            if not self._add(directory):
+                self.stop()
+                return False
+        return True
+
+    def watch(self, folders: Iterable[str]) -> None:
+        """Watch the subfolders among `folders` and stop watching the ones
+        that are not there anymore."""
+        if not self.monitors:
+            return
+        wanted = set(folders).union(self.directories)
+        for folder in set(self.monitors).difference(wanted):
+            self._remove(folder)
+        for folder in wanted.difference(self.monitors):
+            self._add(folder)
+
+    def stop(self) -> None:
+        if self._flush_id:
+            GLib.source_remove(self._flush_id)
+            self._flush_id = 0
+        for folder in list(self.monitors):
+            self._remove(folder)
+        self._pending.clear()
+
+    def _add(self, folder: str) -> bool:
+        try:
+            monitor = Gio.File.new_for_path(folder).monitor_directory(
+                Gio.FileMonitorFlags.WATCH_MOVES, None
+            )
+        except GLib.Error as e:
+            logger.warning("Can't watch %s: %s", folder, e.message)
+            return False
+        self.monitors[folder] = (monitor, monitor.connect("changed", self._on_changed))
+        return True
+
+    def _remove(self, folder: str) -> None:
+        monitor, handler_id = self.monitors.pop(folder)
+        monitor.disconnect(handler_id)
+        monitor.cancel()
+
+    def _on_changed(self, _monitor: Gio.FileMonitor,
+                    file: Gio.File, other_file: Optional[Gio.File],
+                    event_type: Gio.FileMonitorEvent) -> None:
+        if event_type == Gio.FileMonitorEvent.CHANGED:
+            # Wait for CHANGES_DONE_HINT instead of parsing half-written files
+            return
+
+        for f in (file, other_file):
+            path = f.get_path() if f else None
+            if not path:
+                continue
+            if path.endswith(".desktop"):
+                self._pending.add(path)
+            elif path in self.monitors or (event_type != Gio.FileMonitorEvent.CHANGES_DONE_HINT
+                                          and os.path.isdir(path)):
+                # A watched subfolder went away or moved, or a new one appeared
+                if path not in self.directories:
+                    self._pending.add(path)
+
+        if self._pending and not self._flush_id:
+            self._flush_id = GLib.timeout_add(DEBOUNCE_MS, self._flush)
+
+    def _flush(self) -> bool:
+        self._flush_id = 0
+        paths, self._pending = self._pending, set()
+        self.callback(paths)
+        return GLib.SOURCE_REMOVE
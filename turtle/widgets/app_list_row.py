@@ -25,78 +25,48 @@
 # holders shall not be used in advertising or otherwise to promote the sale,
 # use or other dealings in this Software without prior written
 # authorization.
-import configparser
-import os
-from typing import Optional
+from gettext import gettext as _
+from typing import Callable, Optional, Set
 
-from gi.repository import Gtk, GObject, GdkPixbuf
+from gi.repository import Gtk, Gdk, GdkPixbuf
 
+from turtle import trace
+from turtle.appdata import AppData
 from turtle.config import RESOURCE_PREFIX
+from turtle.icons import IconLoader
+from turtle.validator import ERROR, Verdict
 
-DESKTOP_SECTION = 'Desktop Entry'
+ICON_SIZE = 32
+# Issues listed in the tooltip of the badge
+MAX_ISSUES_SHOWN = 5
 
 
-class AppData(GObject.GObject):
-    filepath: str
+class Selection:
+    """Paths of the entries selected for bulk actions, shared by all rows."""
 
-    def __init__(self, filepath):
-        GObject.GObject.__init__(self)
+    def __init__(self, changed: Optional[Callable[[], None]] = None):
+        self.enabled = False
+        self.paths: Set[str] = set()
+        self.changed = changed
 
-        self.filepath = filepath
+    def __len__(self) -> int:
+        return len(self.paths)
 
-        self.parser = configparser.ConfigParser()
-        self.parser.optionxform = str
-        self.parser.read_file(open(filepath))
+    def __contains__(self, path: str) -> bool:
+        return path in self.paths
 
-    def save(self):
-        self.parser.write(open(self.filepath, 'w'), False)
+    def select(self, path: str, selected: bool) -> None:
+        if selected:
+            self.paths.add(path)
+        else:
+            self.paths.discard(path)
+        if self.changed:
+            self.changed()
 
-    @property
-    def name(self) -> str:
-        return self.parser.get(DESKTOP_SECTION, 'Name')
-
-    @name.setter
-    def name(self, value: str) -> None:
-        self.parser.set(DESKTOP_SECTION, 'Name', value)
-
-    @property
-    def hidden(self) -> bool:
-        if self.parser.has_option(DESKTOP_SECTION, 'Hidden'):
-            return self.parser.getboolean(DESKTOP_SECTION, 'Hidden')
-        return False
-
-    @hidden.setter
-    def hidden(self, value) -> None:
-        self.parser.set(DESKTOP_SECTION, 'Hidden', str(value).lower())
-
-    @property
-    def terminal(self) -> bool:
-        if self.parser.has_option(DESKTOP_SECTION, 'Terminal'):
-            return self.parser.getboolean(DESKTOP_SECTION, 'Terminal')
-        return False
-
-    @terminal.setter
-    def terminal(self, value) -> None:
-        self.parser.set(DESKTOP_SECTION, 'Terminal', str(value).lower())
-
-    @property
-    def icon(self) -> str:
-        if self.parser.has_option(DESKTOP_SECTION, 'Icon'):
-            return self.parser.get(DESKTOP_SECTION, 'Icon')
-        return ""
-
-    @property
-    def keywords(self) -> str:
-        if self.parser.has_option(DESKTOP_SECTION, 'Keywords'):
-            return self.parser.get(DESKTOP_SECTION, 'Keywords')
-        return ""
-
-    @keywords.setter
-    def keywords(self, value) -> None:
-        self.parser.set(DESKTOP_SECTION, 'Keywords', value)
-
-    def __repr__(self):
-        return f"{self.name}"
+    def clear(self) -> None:
+        self.paths.clear()
+        if self.changed:
+            self.changed()
 
 
 @Gtk.Template(resource_path=f"{RESOURCE_PREFIX}/ui/widgets.ui")
@@ -104,29 +74,86 @@ class AppListRow(Gtk.ListBoxRow):
     __gtype_name__ = "AppListRow"
 
     app_data: AppData
+    app_check: Gtk.CheckButton = Gtk.Template.Child()
     app_icon: Gtk.Image = Gtk.Template.Child()
     app_label: Gtk.Label = Gtk.Template.Child()
+    app_badge: Gtk.Image = Gtk.Template.Child()
     app_switch: Gtk.Switch = Gtk.Template.Child()
 
-    def __init__(self, app_data: AppData):
+    def __init__(self, app_data: Optional[AppData] = None, selection: Optional[Selection] = None):
+        start = trace.now()
         super().__init__()
+        self.app_data = None
+        self.selection = selection
+        self.switch_handler_id = self.app_switch.connect('state-set', self.app_switch_change)
+        self.check_handler_id = self.app_check.connect('toggled', self.app_check_toggled)
+        self.connect('destroy', self.on_destroy)
+
+        if app_data:
+            self.bind(app_data)
+        trace.record('app_list_row', start)
+
+    def bind(self, app_data: AppData) -> None:
+        """Show `app_data` in this row, rows are reused for other entries
+        when the list is virtualized."""
         self.app_data = app_data
 
         # Setup Icon
         icon = self.app_data.icon
         if icon.startswith('/'):
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(
-                filename=icon,
-                width=32,
-                height=32,
-                preserve_aspect_ratio=True)
-            self.app_icon.set_from_pixbuf(pixbuf)
+            # Placeholder until the file is decoded
+            self.app_icon.set_from_icon_name('application-x-executable', Gtk.IconSize.BUTTON)
+            scale = self.get_scale_factor()
+            IconLoader.get_default().load(
+                icon, ICON_SIZE * scale,
+                lambda pixbuf: self.icon_loaded(app_data, pixbuf, scale)
+            )
         elif icon:
             self.app_icon.set_from_icon_name(icon, Gtk.IconSize.BUTTON)
+        else:
+            self.app_icon.set_from_icon_name('application-x-executable', Gtk.IconSize.BUTTON)
 
         self.app_label.set_label(self.app_data.name)
-        self.app_switch.set_active(not self.app_data.hidden)
-        self.app_switch.connect('state-set', self.app_switch_change)
+        self.show_issues(app_data.health + app_data.issues)
+        with self.app_switch.handler_block(self.switch_handler_id):
+            self.app_switch.set_active(not self.app_data.hidden)
+
+        selecting = self.selection is not None and self.selection.enabled
+        self.app_check.set_visible(selecting)
+        with self.app_check.handler_block(self.check_handler_id):
+            self.app_check.set_active(selecting and app_data.filepath in self.selection)
+
+    def show_issues(self, issues: Verdict) -> None:
+        """Badge entries that are broken or don't follow the Desktop Entry spec."""
+        self.app_badge.set_visible(bool(issues))
+        if not issues:
+            return
+        errors = any(issue.severity == ERROR for issue in issues)
+        self.app_badge.set_from_icon_name('dialog-error-symbolic' if errors else 'dialog-warning-symbolic',
+                                          Gtk.IconSize.BUTTON)
+        lines = [str(issue) for issue in issues[:MAX_ISSUES_SHOWN]]
+        if len(issues) > MAX_ISSUES_SHOWN:
+            lines.append(_("and {count} more").format(count=len(issues) - MAX_ISSUES_SHOWN))
+        self.app_badge.set_tooltip_text("\n".join(lines))
+
+    def icon_loaded(self, app_data: AppData, pixbuf: Optional[GdkPixbuf.Pixbuf], scale: int) -> None:
+        # The row may have been reused for another entry in the meantime
+        if pixbuf is None or app_data is not self.app_data:
+            return
+        if scale > 1:
+            self.app_icon.set_from_surface(Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale, None))
+        else:
+            self.app_icon.set_from_pixbuf(pixbuf)
+
+    def on_destroy(self, _widget) -> None:
+        # Break the cycles through the handlers, and make pending icon loads a no-op
+        self.app_switch.disconnect(self.switch_handler_id)
+        self.app_check.disconnect(self.check_handler_id)
+        self.app_data = None
+        self.selection = None
+
+    def app_check_toggled(self, check: Gtk.CheckButton) -> None:
+        self.selection.select(self.app_data.filepath, check.get_active())
 
     def app_switch_change(self, switch: Gtk.Switch, value: bool) -> None:
         self.app_data.hidden = not value
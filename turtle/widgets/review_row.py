@@ -0,0 +1,83 @@
+# review_row.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+from typing import Optional
+
+from gi.repository import Gtk, Gdk, GdkPixbuf
+
+from turtle.batch import Entry
+from turtle.config import RESOURCE_PREFIX
+from turtle.icons import IconLoader
+
+ICON_SIZE = 32
+
+
+@Gtk.Template(resource_path=f"{RESOURCE_PREFIX}/ui/review_row.ui")
+class ReviewRow(Gtk.ListBoxRow):
+    """A detected application on the review screen, its name and terminal
+    setting can be changed before the entries are created."""
+    __gtype_name__ = "ReviewRow"
+
+    include_check: Gtk.CheckButton = Gtk.Template.Child()
+    icon_image: Gtk.Image = Gtk.Template.Child()
+    name_entry: Gtk.Entry = Gtk.Template.Child()
+    exec_label: Gtk.Label = Gtk.Template.Child()
+    terminal_check: Gtk.CheckButton = Gtk.Template.Child()
+
+    def __init__(self, entry: Entry):
+        super().__init__()
+        self.entry = entry
+
+        self.name_entry.set_text(entry.name)
+        self.exec_label.set_text(entry.exec_path)
+        self.exec_label.set_tooltip_text(entry.exec_path)
+        self.terminal_check.set_active(entry.terminal)
+        self.include_check.bind_property('active', self.name_entry, 'sensitive')
+        self.include_check.bind_property('active', self.terminal_check, 'sensitive')
+
+        if entry.icon_path.startswith('/'):
+            scale = self.get_scale_factor()
+            IconLoader.get_default().load(entry.icon_path, ICON_SIZE * scale,
+                                          lambda pixbuf: self.icon_loaded(pixbuf, scale))
+        elif entry.icon_path:
+            self.icon_image.set_from_icon_name(entry.icon_path, Gtk.IconSize.BUTTON)
+
+    def icon_loaded(self, pixbuf: Optional[GdkPixbuf.Pixbuf], scale: int) -> None:
+        if pixbuf is None:
+            return
+        if scale > 1:
+            self.icon_image.set_from_surface(Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale, None))
+        else:
+            self.icon_image.set_from_pixbuf(pixbuf)
+
+    def get_entry(self) -> Optional[Entry]:
+        """Return the entry as edited, None when it was left out."""
+        name = self.name_entry.get_text().strip()
+        if not self.include_check.get_active() or not name:
+            return None
+        return self.entry._replace(name=name, terminal=self.terminal_check.get_active())
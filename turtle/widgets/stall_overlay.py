@@ -0,0 +1,81 @@
+# stall_overlay.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+from gettext import gettext as _
+
+from gi.repository import Gtk, GLib
+
+from turtle import trace
+
+# How often the main loop is expected to come back to the heartbeat
+INTERVAL_MS = 16
+# Later than this and the frame was visibly dropped
+STALL_MS = 50
+
+
+class StallOverlay(Gtk.Label):
+    """A corner label counting main loop stalls, for finding jank.
+
+    A heartbeat timeout is due every INTERVAL_MS; whenever it runs more than
+    STALL_MS late, the main loop was blocked that long by something else.
+    Stalls are also recorded in the trace when one is being written.
+    """
+    __gtype_name__ = "StallOverlay"
+
+    def __init__(self):
+        super().__init__(halign=Gtk.Align.END, valign=Gtk.Align.START, margin=6)
+        self.get_style_context().add_class("osd")
+        self.stalls = 0
+        self.worst_ms = 0.0
+        self.last_ms = 0.0
+        self._last_beat = GLib.get_monotonic_time()
+        self._source_id = GLib.timeout_add(INTERVAL_MS, self.heartbeat)
+        self.connect("destroy", self.on_destroy)
+        self.update_label()
+
+    def heartbeat(self) -> bool:
+        beat = GLib.get_monotonic_time()
+        late_ms = (beat - self._last_beat) / 1000 - INTERVAL_MS
+        self._last_beat = beat
+        if late_ms > STALL_MS:
+            self.stalls += 1
+            self.last_ms = late_ms
+            self.worst_ms = max(self.worst_ms, late_ms)
+            trace.count('main_loop_stall')
+            trace.record('main_loop_stall', trace.now() - late_ms / 1000)
+            self.update_label()
+        return GLib.SOURCE_CONTINUE
+
+    def update_label(self) -> None:
+        self.set_text(_("Stalls: {count}  last {last:.0f} ms  worst {worst:.0f} ms").format(
+            count=self.stalls, last=self.last_ms, worst=self.worst_ms
+        ))
+
+    def on_destroy(self, _widget) -> None:
+        if self._source_id:
+            GLib.source_remove(self._source_id)
+            self._source_id = 0
@@ -0,0 +1,174 @@
+# virtual_list_box.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+from typing import Callable, List, Optional
+
+from gi.repository import Gtk, Gio, GObject
+
+# Rows realized above and below the visible area to keep scrolling smooth
+OVERSCAN = 4
+FALLBACK_ROW_HEIGHT = 48
+
+
+class VirtualListBox(Gtk.Box):
+    """Show a `Gio.ListModel` in a `Gtk.ListBox` without a widget per item.
+
+    Only the rows needed to fill the visible part of the scrolled window are
+    created. They are rebound to other items of the model on scroll, while
+    two spacers above and below stand in for the rows that are not realized,
+    so the scrollbar behaves as if every row existed. All rows are expected
+    to have the same height.
+
+    Rows are created by `create_row()` and must have a `bind(item)` method.
+    """
+    __gtype_name__ = "VirtualListBox"
+
+    def __init__(self,
+                 listbox: Gtk.ListBox,
+                 vadjustment: Gtk.Adjustment,
+                 create_row: Callable[[], Gtk.ListBoxRow]):
+        super().__init__(orientation=Gtk.Orientation.VERTICAL, visible=True)
+
+        self.listbox = listbox
+        self.vadjustment = vadjustment
+        self.create_row = create_row
+        self.model: Optional[Gio.ListModel] = None
+        # Model positions of the items to show, None shows them all
+        self.positions: Optional[List[int]] = None
+        self.rows: List[Gtk.ListBoxRow] = []
+        self._bound: List[Optional[GObject.Object]] = []
+        self._row_height = 0
+        self._items_changed_id = 0
+
+        # Selection would stick to the recycled row, not to the item
+        self.listbox.set_selection_mode(Gtk.SelectionMode.NONE)
+
+        self.top_spacer = Gtk.Box(visible=True)
+        self.bottom_spacer = Gtk.Box(visible=True)
+        self.pack_start(self.top_spacer, False, False, 0)
+        self.pack_start(self.listbox, False, False, 0)
+        self.pack_start(self.bottom_spacer, False, False, 0)
+
+        # The adjustment belongs to the scrolled window, which may outlive this box
+        self._adjustment_ids = [
+            self.vadjustment.connect("value-changed", self.update),
+            self.vadjustment.connect("notify::page-size", self.update),
+        ]
+        self.connect("destroy", self.on_destroy)
+
+    def bind_model(self, model: Optional[Gio.ListModel]) -> None:
+        if self.model and self._items_changed_id:
+            self.model.disconnect(self._items_changed_id)
+            self._items_changed_id = 0
+        self.model = model
+        if model:
+            self._items_changed_id = model.connect("items-changed", self.items_changed)
+        self._bound = [None] * len(self.rows)
+        self.update()
+
+    def on_destroy(self, _widget) -> None:
+        for handler_id in self._adjustment_ids:
+            self.vadjustment.disconnect(handler_id)
+        self._adjustment_ids = []
+        if self.model and self._items_changed_id:
+            self.model.disconnect(self._items_changed_id)
+            self._items_changed_id = 0
+        self.model = None
+        self.rows = []
+        self._bound = []
+
+    def rebind(self) -> None:
+        """Bind every visible row again, e.g. after a change that affects
+        how all of them look."""
+        self._bound = [None] * len(self.rows)
+        self.update()
+
+    def set_filter(self, positions: Optional[List[int]]) -> None:
+        """Show only the items at the given, sorted, model positions."""
+        self.positions = positions
+        self.update()
+
+    def items_changed(self, model: Gio.ListModel, position: int, removed: int, added: int) -> None:
+        # Rows are rebound by identity, so items that moved are picked up by `update`.
+        # An item spliced in again in place changed, rows showing it are bound again.
+        if added > len(self.rows):
+            self._bound = [None] * len(self.rows)
+        elif added:
+            changed = {id(model.get_item(p)) for p in range(position, position + added)}
+            self._bound = [None if id(item) in changed else item for item in self._bound]
+        # Filtered positions are stale now, the owner is expected to call `set_filter`.
+        if self.positions is not None:
+            n_items = model.get_n_items()
+            self.positions = [p for p in self.positions if p < n_items]
+        self.update()
+
+    def row_height(self) -> int:
+        if not self._row_height and self.rows:
+            self._row_height = self.rows[0].get_preferred_height()[1]
+        return self._row_height or FALLBACK_ROW_HEIGHT
+
+    def first_position(self) -> int:
+        return max(0, int(self.vadjustment.get_value() // self.row_height()) - OVERSCAN)
+
+    def get_item(self, row: Gtk.ListBoxRow) -> Optional[GObject.Object]:
+        """Return the item `row` is currently bound to."""
+        try:
+            return self._bound[self.rows.index(row)]
+        except ValueError:
+            return None
+
+    def update(self, *args) -> None:
+        if self.positions is not None:
+            n_items = len(self.positions)
+        else:
+            n_items = self.model.get_n_items() if self.model else 0
+        row_height = self.row_height()
+        visible = int(self.vadjustment.get_page_size() // row_height) + 1 + 2 * OVERSCAN
+        first = min(self.first_position(), max(0, n_items - visible))
+        count = min(visible, n_items - first)
+
+        while len(self.rows) < count:
+            row = self.create_row()
+            self.listbox.add(row)
+            self.rows.append(row)
+            self._bound.append(None)
+
+        for i, row in enumerate(self.rows):
+            if i < count:
+                position = first + i if self.positions is None else self.positions[first + i]
+                item = self.model.get_item(position)
+                if self._bound[i] is not item:
+                    row.bind(item)
+                    self._bound[i] = item
+                row.show()
+            else:
+                row.hide()
+                self._bound[i] = None
+
+        self.top_spacer.set_size_request(-1, first * row_height)
+        self.bottom_spacer.set_size_request(-1, (n_items - first - count) * row_height)
@@ -26,18 +26,36 @@
 # use or other dealings in this Software without prior written
 # authorization.
 
+import logging
 import os
 import stat
-from typing import Optional
+from typing import Callable, FrozenSet, List, Optional, Set, Union
 from urllib.parse import unquote, urlparse
 
-from gi.overrides.GdkPixbuf import Pixbuf
 from gi.repository import Gtk, Gdk, Granite, Handy, Gio
 
 from gettext import gettext as _
 
-from turtle.config import RESOURCE_PREFIX, APPS_PATH_PREFIX
-from turtle.widgets.app_list_row import AppListRow, AppData
+from turtle import trace
+from turtle.appdata import AppData
+from turtle.batch import Entry
+from turtle.bulk import DELETE, BulkResult, apply_bulk, create_entries, run_in_background, undo_bulk
+from turtle.catalog import Catalog, Splice
+from turtle.config import APP_ID, VIRTUAL_LIST
+from turtle.desktop_entry import desktop_file_path, make_a_desktop
+from turtle.detect import detect, detect_all, exec_command, guess_name
+from turtle.library import Library
+from turtle.writer import write_atomic
+from turtle.xdg import host_path
+from turtle.widgets.app_list_row import AppListRow, Selection
+from turtle.widgets.review_row import ReviewRow
+from turtle.widgets.stall_overlay import StallOverlay
+from turtle.widgets.virtual_list_box import VirtualListBox
+
+logger = logging.getLogger(__name__)
+
+# Entries named in the confirmation of the health bar's Remove
+MAX_BROKEN_LISTED = 10
 
 
 @Gtk.Template(resource_path="/com/github/tenderowl/turtle/ui/window.ui")
@@ -59,12 +77,23 @@ class TurtleWindow(Handy.ApplicationWindow):
     icon_select_btn: Gtk.Button = Gtk.Template.Child()
     exec_entry: Gtk.Entry = Gtk.Template.Child()
     terminal_entry: Gtk.CheckButton = Gtk.Template.Child()
+    apps_search: Gtk.SearchEntry = Gtk.Template.Child()
     apps_listbox: Gtk.ListBox = Gtk.Template.Child()
     appdata_revealer: Gtk.Revealer = Gtk.Template.Child()
     appdata_name: Gtk.Label = Gtk.Template.Child()
     appdata_terminal: Gtk.CheckButton = Gtk.Template.Child()
     appdata_keywords: Gtk.Entry = Gtk.Template.Child()
-    toast: Granite.WidgetsToast = Granite.WidgetsToast()
+    apps_select_button: Gtk.ToggleButton = Gtk.Template.Child()
+    apps_sort: Gtk.ComboBoxText = Gtk.Template.Child()
+    bulk_revealer: Gtk.Revealer = Gtk.Template.Child()
+    bulk_label: Gtk.Label = Gtk.Template.Child()
+    health_bar: Gtk.InfoBar = Gtk.Template.Child()
+    health_label: Gtk.Label = Gtk.Template.Child()
+    review_label: Gtk.Label = Gtk.Template.Child()
+    review_listbox: Gtk.ListBox = Gtk.Template.Child()
+    review_executable: Gtk.CheckButton = Gtk.Template.Child()
+    review_create_button: Gtk.Button = Gtk.Template.Child()
+    toast: Granite.WidgetsToast
 
     # Path to selected executable
     exec_path: str = ""
@@ -73,6 +102,11 @@ class TurtleWindow(Handy.ApplicationWindow):
     app_terminal: bool = False
     desktop_file_path: str = None
     appdata_current: Optional[AppData]
+    search_query: str = ""
+    # Paths matching `search_query` when the list isn't virtualized
+    search_matches: Optional[Set[str]] = None
+    # Broken entries the user chose to keep
+    health_dismissed: FrozenSet[str] = frozenset()
 
     def __init__(self, **kwargs):
         # Don't forget to initialize Handy!
@@ -80,14 +114,22 @@ class TurtleWindow(Handy.ApplicationWindow):
 
         super().__init__(**kwargs)
 
-        self.set_default_icon(Pixbuf.new_from_resource_at_scale(
-            f'{RESOURCE_PREFIX}/icons/com.github.tenderowl.turtle.svg',
-            128, 128, True
-        ))
+        # Loaded from the icon theme at the size needed, when needed
+        self.set_default_icon_name(APP_ID)
 
-        # Setup overlay with toast
+        # Setup overlay with toast, one per window so that a window opened
+        # again doesn't stack handlers on the toast of the previous one
+        self.toast = Granite.WidgetsToast()
         self.overlay.add_overlay(self.toast)
+        if trace.stall_overlay:
+            stall_overlay = StallOverlay()
+            self.overlay.add_overlay(stall_overlay)
+            self.overlay.set_overlay_pass_through(stall_overlay, True)
         self.overlay.show_all()
+        # What the toast's Undo button does for the current notification
+        self.toast_undo: Optional[Callable[[], None]] = None
+        self.toast.connect("default-action", self.toast_default_action)
+        self.toast.connect("closed", self.toast_closed)
 
         # Connect signals
         self.back_button.connect("clicked", self.back_button_clicked)
@@ -95,33 +137,92 @@ class TurtleWindow(Handy.ApplicationWindow):
         self.make_button.connect("clicked", self.make_button_clicked)
         self.icon_select_btn.connect("clicked", self.icon_select_clicked)
 
-        self.apps_store = Gio.ListStore()
-        self.apps_listbox.bind_model(self.apps_store, AppListRow)
-        self.apps_listbox.connect('row_activated', self.apps_listbox_row_selected)
+        # The installed apps page is set up when it is shown for the first time
+        self.library: Optional[Library] = None
+        self.catalog: Optional[Catalog] = None
+        self.apps_store: Optional[Gio.ListStore] = None
+        self.apps_list: Optional[VirtualListBox] = None
+        self.selection = Selection(self.selection_changed)
+        self.file_chooser: Optional[Gtk.FileChooserNative] = None
+        # Bumped whenever the review screen is left, to drop late detections
+        self.review_generation = 0
         self.pages.connect("notify::visible-child", self.page_changed)
+        self.connect("destroy", self.on_destroy)
 
         # Init drag-n-drop
         drop_target = Gtk.TargetEntry.new('text/uri-list', Gtk.TargetFlags.OTHER_APP, 0)
         self.drop_area.drag_dest_set(Gtk.DestDefaults.ALL, (drop_target,), Gdk.DragAction.MOVE)
         self.drop_area.connect("drag-data-received", self.drag_data_received)
 
-    def select_button_clicked(self, button: Gtk.Button) -> None:
-        self.exec_path = self.get_exec_file()
+    def setup_installed_page(self) -> None:
+        self.library = self.get_application().get_library()
+        self.catalog = self.library.catalog
+        # Sorts the catalog through apps_sort_changed before it is shown
+        self.settings = Gio.Settings.new(APP_ID)
+        self.settings.bind("sort-mode", self.apps_sort, "active-id", Gio.SettingsBindFlags.DEFAULT)
+        self.apps_store = Gio.ListStore()
+        # The D-Bus service may have loaded the catalog already
+        self.apps_store.splice(0, 0, [self.catalog.get(path) for path in self.catalog.order])
+        self.library.listeners.append(self.apply_splices)
+        self.library.broken_listeners.append(self.update_health_bar)
+        self.update_health_bar()
+        if VIRTUAL_LIST:
+            viewport: Gtk.Viewport = self.apps_listbox.get_parent()
+            viewport.remove(self.apps_listbox)
+            self.apps_list = VirtualListBox(self.apps_listbox, viewport.get_vadjustment(),
+                                            lambda: AppListRow(selection=self.selection))
+            viewport.add(self.apps_list)
+            self.apps_list.bind_model(self.apps_store)
+        else:
+            self.apps_listbox.bind_model(self.apps_store, lambda item: AppListRow(item, self.selection))
+            self.apps_listbox.set_filter_func(self.apps_listbox_filter)
+        self.apps_listbox.connect('row_activated', self.apps_listbox_row_selected)
 
-        if not self.exec_path:
-            return
+    def on_destroy(self, window: Gtk.Window) -> None:
+        # The library and the settings outlive the window when the D-Bus service keeps the app running
+        self.toast_undo = None
+        if self.library is not None:
+            self.library.cancel()
+            self.library.listeners.remove(self.apply_splices)
+            self.library.broken_listeners.remove(self.update_health_bar)
+            Gio.Settings.unbind(self.apps_sort, "active-id")
 
+    def select_button_clicked(self, button: Gtk.Button) -> None:
+        self.choose_file(_("Please choose an executable"), self.exec_file_chosen)
+
+    def exec_file_chosen(self, exec_path: str) -> None:
+        logger.debug("Application selected: %s", exec_path)
+        self.open_paths([exec_path])
+
+    def open_paths(self, paths: List[str]) -> None:
+        """Set up a single executable on the setup screen, and anything more,
+        folders included, on the review screen."""
+        if len(paths) == 1 and not os.path.isdir(paths[0]):
+            # Embedded metadata of big AppImages takes a moment to read
+            generation = self.review_generation
+            run_in_background(detect, lambda entry: self.setup_detected(entry, generation), paths[0])
+        elif paths:
+            self.review_paths(paths)
+
+    def setup_detected(self, entry: Union[Entry, Exception], generation: int) -> None:
+        if generation != self.review_generation:
+            return
+        if isinstance(entry, Exception):
+            self.send_notification(_("Can't read the application: {}").format(entry))
+            return
+        # What was given on the command line wins
+        self.exec_path = entry.exec_path
+        self.app_name = self.app_name or entry.name
+        self.app_icon = self.app_icon or entry.icon_path
+        self.app_terminal = self.app_terminal or entry.terminal
         self.switch_to_setup()
 
     def switch_to_setup(self):
         # Try to detect java apps
-        if self.exec_path.endswith('.jar'):
-            self.exec_path = f"java -jar {self.exec_path}"
+        self.exec_path = exec_command(self.exec_path)
 
         # Prepare Setup Screen widgets
-        self.name_entry.set_text(
-            self.app_name or os.path.splitext(os.path.basename(self.exec_path))[0].capitalize()
-        )
+        self.name_entry.set_text(self.app_name or guess_name(self.exec_path))
         self.exec_entry.set_text(self.exec_path)
         self.icon_entry.set_text(self.app_icon)
         self.terminal_entry.set_active(self.app_terminal)
@@ -164,10 +265,7 @@ class TurtleWindow(Handy.ApplicationWindow):
             Entries that confirm with this version of the specification should use 1.5.
             Note that the version field is not required to be present.
         """
-        if not self.configure_permission(exec_path):
-            return
-
-        desktop_data = self.make_a_desktop(
+        desktop_data = make_a_desktop(
             name=name,
             exec_path=exec_path,
             icon_path=icon_path,
@@ -175,39 +273,122 @@ class TurtleWindow(Handy.ApplicationWindow):
             app_version=app_version,
         )
 
-        self.desktop_file_path = os.path.expanduser(
-            f"{APPS_PATH_PREFIX}{name}.desktop"
+        def write() -> None:
+            self.desktop_file_path = desktop_file_path(name)
+            with trace.span('make_desktop_file', path=self.desktop_file_path):
+                write_atomic(self.desktop_file_path, desktop_data.encode("utf-8"))
+            self.send_notification(f"{name} menu item created!",
+                                   lambda path=self.desktop_file_path: self.undo_desktop(path))
+
+        self.configure_permission(exec_path, write)
+
+    def configure_permission(self, path: str, callback: Callable[[], None]) -> None:
+        """Call `callback` once `path` is executable, asking the user to make
+        it so first if needed."""
+        if os.access(path, os.X_OK):
+            callback()
+            return
+
+        dlg: Granite.MessageDialog = Granite.MessageDialog.with_image_from_icon_name(
+            "Configure permission to execute",
+            "In order for this application to be launched from the menu, we need to set the execution permission.",
+            "dialog-question",
+            Gtk.ButtonsType.CANCEL
         )
+        apply_btn: Gtk.Button = dlg.add_button("Set Executable", Gtk.ResponseType.APPLY)
+        apply_btn.get_style_context().add_class(Gtk.STYLE_CLASS_SUGGESTED_ACTION)
+
+        def apply() -> None:
+            os.chmod(path, stat.S_IRWXU | stat.S_IRWXG | stat.S_IROTH)
+            callback()
+
+        self.present_dialog(dlg, Gtk.ResponseType.APPLY, apply)
+
+    def present_dialog(self, dialog: Gtk.Dialog, accept: Gtk.ResponseType, callback: Callable[[], None]) -> None:
+        """Show `dialog` without blocking the main loop, `callback` is called
+        when it is closed with the `accept` response."""
+        def on_response(dialog: Gtk.Dialog, response: int) -> None:
+            dialog.destroy()
+            if response == accept:
+                callback()
+
+        dialog.set_transient_for(self)
+        dialog.set_modal(True)
+        dialog.connect("response", on_response)
+        dialog.show()
+
+    def choose_file(self, title: str, callback: Callable[[str], None]) -> None:
+        """Let the user pick a file, through the portal when sandboxed, and
+        call `callback` with its path unless the chooser is cancelled."""
+        chooser = Gtk.FileChooserNative.new(title, self, Gtk.FileChooserAction.OPEN,
+                                            _("_Select"), _("_Cancel"))
+        chooser.set_modal(True)
+        chooser.connect("response", self.file_chooser_response, callback)
+        # Native choosers aren't widgets owned by the window, keep them alive
+        self.file_chooser = chooser
+        chooser.show()
+
+    def file_chooser_response(self, chooser: Gtk.FileChooserNative, response: int,
+                              callback: Callable[[str], None]) -> None:
+        path = chooser.get_filename() if response == Gtk.ResponseType.ACCEPT else None
+        chooser.destroy()
+        self.file_chooser = None
+        if path:
+            callback(host_path(path))
+
+    def review_paths(self, paths: List[str]) -> None:
+        """Detect the applications of `paths` in worker threads and list them
+        on the review screen."""
+        self.review_generation += 1
+        self.review_listbox.foreach(lambda row: row.destroy())
+        self.review_label.set_text(_("Looking for applications…"))
+        self.review_create_button.set_sensitive(False)
+
+        self.screens.set_visible_child_name("review_screen")
+        self.back_button.set_visible(True)
+        self.pages_switcher.set_sensitive(False)
 
-        with open(self.desktop_file_path, "w") as desktop_file:
-            desktop_file.writelines(desktop_data)
-            desktop_file.flush()
-            self.send_notification(f"{name} menu item created!")
-
-    def configure_permission(self, path):
-        success = True
-        if not os.access(path, os.X_OK):
-            success = False
-            dlg: Granite.MessageDialog = Granite.MessageDialog.with_image_from_icon_name(
-                "Configure permission to execute",
-                "In order for this application to be launched from the menu, we need to set the execution permission.",
-                "dialog-question",
-                Gtk.ButtonsType.CANCEL
-            )
-            apply_btn: Gtk.Button = dlg.add_button("Set Executable", Gtk.ResponseType.APPLY)
-            apply_btn.get_style_context().add_class(Gtk.STYLE_CLASS_SUGGESTED_ACTION)
-            # dlg.add_button("Cancel", Gtk.ResponseType.CANCEL)
-
-            response = dlg.run()
-            if response == Gtk.ResponseType.APPLY:
-                os.chmod(path, stat.S_IRWXU | stat.S_IRWXG | stat.S_IROTH)
-                success = True
-
-            dlg.destroy()
-
-        return success
+        generation = self.review_generation
+        run_in_background(detect_all, lambda entries: self.review_ready(entries, generation), paths)
+
+    def review_ready(self, entries: Union[List[Entry], Exception], generation: int) -> None:
+        if generation != self.review_generation:
+            return
+        if isinstance(entries, Exception):
+            self.review_label.set_text(_("Can't read the applications: {}").format(entries))
+            return
+        for entry in entries:
+            self.review_listbox.add(ReviewRow(entry))
+        self.review_listbox.show_all()
+        self.review_label.set_text(
+            _("{} applications found").format(len(entries)) if entries else _("No applications found")
+        )
+        self.review_create_button.set_sensitive(bool(entries))
+
+    @Gtk.Template.Callback()
+    def review_create_clicked(self, button: Gtk.Button) -> None:
+        entries = [entry for entry in (row.get_entry() for row in self.review_listbox.get_children()) if entry]
+        if not entries:
+            return
+        self.review_create_button.set_sensitive(False)
+        run_in_background(create_entries, self.review_done, entries, None, self.review_executable.get_active())
+
+    def review_done(self, result: Union[BulkResult, Exception]) -> None:
+        if isinstance(result, Exception):
+            self.review_create_button.set_sensitive(True)
+            self.send_notification(_("Can't create the menu items: {}").format(result))
+            return
+        for path, error in result.errors:
+            logger.warning("Can't create %s: %s", path, error)
+        self.entries_written(result.paths)
+        self.back_button_clicked(self.back_button)
+        if result.previous:
+            self.send_notification(_("{} menu items created!").format(len(result.previous)),
+                                   lambda: self.undo_bulk(result))
 
     def back_button_clicked(self, button: Gtk.Button) -> None:
+        self.review_generation += 1
+        self.review_listbox.foreach(lambda row: row.destroy())
         self.screens.set_visible_child_name("select_screen")
         self.back_button.set_visible(False)
         self.pages_switcher.set_sensitive(True)
@@ -216,124 +397,122 @@ class TurtleWindow(Handy.ApplicationWindow):
         self.app_icon = ""
         self.app_terminal = False
 
-    def get_exec_file(self) -> Optional[str]:
-        exec_path: str = None
-
-        # @TODO: Wait till FileChooserNative will give real path, not /var/run/1000
-        dialog = Gtk.FileChooserDialog(
-            "Please choose an executable",
-            self,
-            Gtk.FileChooserAction.OPEN,
-        )
-
-        dialog.add_buttons(_("_Cancel"),
-                           Gtk.ResponseType.CANCEL,
-                           _("_Select"),
-                           Gtk.ResponseType.ACCEPT)
-
-        response = dialog.run()
-        if response == Gtk.ResponseType.ACCEPT:
-            exec_path = dialog.get_filename()
-            print(f"Application selected: {exec_path}")
-        elif response == Gtk.ResponseType.CANCEL:
-            print("Cancel clicked")
-
-        dialog.destroy()
-
-        return exec_path
-
-    def make_a_desktop(self,
-                       name: str,
-                       exec_path: str,
-                       app_version: str = "1.0",
-                       icon_path: str = "",
-                       terminal: bool = False,
-                       ) -> str:
-        """Return .desktop file entry content based on given values.
-
-        For example:
-
-            [Desktop Entry]
-            Encoding=UTF-8
-            Version=1.0
-            Type=Application
-            Terminal=false
-            Exec=/path/to/executable
-            Name=Name of Application
-            Icon=/path/to/icon
-
-        """
-        terminal = f"{terminal}".lower()
-
-        return "\n".join(
-            [
-                "[Desktop Entry]",
-                "Encoding=UTF-8",
-                "Type=Application",
-                f"Version={app_version}",
-                f"Terminal={terminal}",
-                f"Exec=\"{exec_path}\"",
-                f"Name={name}",
-                f"Icon={icon_path}",
-            ]
-        )
-
     def icon_select_clicked(self, button: Gtk.Button) -> None:
-        dialog = Gtk.FileChooserDialog(
-            title="Please choose an icon file",
-            parent=self,
-            action=Gtk.FileChooserAction.OPEN,
-        )
-
-        dialog.add_buttons(_("_Cancel"),
-                           Gtk.ResponseType.CANCEL,
-                           _("_Select"),
-                           Gtk.ResponseType.ACCEPT)
+        self.choose_file(_("Please choose an icon file"), self.icon_entry.set_text)
 
-        response = dialog.run()
-        if response == Gtk.ResponseType.ACCEPT:
-            self.icon_entry.set_text(dialog.get_filename())
-        elif response == Gtk.ResponseType.CANCEL:
-            print("Cancel clicked")
-
-        dialog.destroy()
-
-    def send_notification(self, title: str) -> None:
+    def send_notification(self, title: str, undo: Optional[Callable[[], None]] = None) -> None:
         self.toast.set_title(title)
-        self.toast.set_default_action(_("Undo"))
-        self.toast.connect("default-action", self.undo_desktop)
+        self.toast.set_default_action(_("Undo") if undo else None)
+        self.toast_undo = undo
         self.toast.send_notification()
 
-    def undo_desktop(self, event) -> None:
-        print(f'Removing {self.desktop_file_path}')
-        os.remove(self.desktop_file_path)
+    def toast_default_action(self, toast: Granite.WidgetsToast) -> None:
+        undo, self.toast_undo = self.toast_undo, None
+        if undo:
+            undo()
+
+    def toast_closed(self, toast: Granite.WidgetsToast) -> None:
+        # Undo closures hold the previous contents of the entries they restore
+        self.toast_undo = None
+
+    def undo_desktop(self, path: str) -> None:
+        logger.debug("Removing %s", path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        self.entries_written([path])
 
     def drag_data_received(self, widget, context: Gdk.DragContext,
                            x: int, y: int,
                            data: Gtk.SelectionData,
                            info: int, time: int) -> None:
-        success = False
-        uris = data.get_uris()
-        if uris:
-            exec_path = urlparse(uris[0])
-            print('drop data', uris[0])
-            self.exec_path = unquote(exec_path.path)
-            self.switch_to_setup()
-            success = True
-        Gtk.drag_finish(context, success, success, time)
+        paths = [unquote(urlparse(uri).path) for uri in data.get_uris() or []]
+        # Dropped files are not moved anywhere, don't let the source delete them
+        Gtk.drag_finish(context, bool(paths), False, time)
+        self.open_paths(paths)
 
     def page_changed(self, stack: Gtk.Stack, arg):
         if self.pages.get_visible_child_name() == 'installed_apps':
-            self.load_available_apps()
+            if self.library is None:
+                self.setup_installed_page()
+            # Once the folders are watched the list is kept up to date
+            if not self.library.complete:
+                self.load_available_apps()
         else:
+            if self.library:
+                self.library.cancel()
             self.appdata_close()
 
     def load_available_apps(self):
-        apps_folder = os.path.expanduser(APPS_PATH_PREFIX)
-        self.apps_store.remove_all()
-        for file in sorted(os.listdir(apps_folder)):
-            if file.endswith(".desktop"):
-                self.apps_store.append(AppData(os.path.join(apps_folder, file)))
+        """Sync `apps_store` with the applications folder.
+
+        Only files that changed since the previous call are parsed again,
+        in background threads, and the rows are added progressively. On the
+        first call the rows of the previous session are shown right away from
+        the cache while the files are checked.
+        """
+        self.library.load()
+
+    def apply_splices(self, splices: List[Splice]) -> None:
+        for splice in splices:
+            self.apps_store.splice(splice.position, splice.n_removals, splice.additions)
+        if splices and self.search_query:
+            self.apply_search()
+
+    def update_health_bar(self) -> None:
+        """Offer to remove the user's entries whose program is gone."""
+        broken = self.library.broken
+        if broken:
+            self.health_label.set_text(_("{} entries run a program that doesn't exist anymore").format(len(broken)))
+        self.health_bar.set_revealed(bool(broken - self.health_dismissed))
+
+    @Gtk.Template.Callback()
+    def health_bar_response(self, bar: Gtk.InfoBar, response: int) -> None:
+        paths = sorted(path for path in self.library.broken if path in self.catalog)
+        self.health_dismissed = frozenset(paths)
+        self.health_bar.set_revealed(False)
+        if response != Gtk.ResponseType.APPLY or not paths:
+            return
+
+        names = [self.catalog.get(path).name for path in paths[:MAX_BROKEN_LISTED]]
+        if len(paths) > MAX_BROKEN_LISTED:
+            names.append(_("and {count} more").format(count=len(paths) - MAX_BROKEN_LISTED))
+        dlg: Granite.MessageDialog = Granite.MessageDialog.with_image_from_icon_name(
+            _("Remove {} entries from AppMenu?").format(len(paths)),
+            "\n".join(names),
+            "dialog-warning",
+            Gtk.ButtonsType.CANCEL,
+        )
+        remove_btn = dlg.add_button(_("Remove"), Gtk.ResponseType.ACCEPT)
+        remove_btn.get_style_context().add_class(Gtk.STYLE_CLASS_DESTRUCTIVE_ACTION)
+
+        def remove() -> None:
+            self.bulk_revealer.set_sensitive(False)
+            run_in_background(apply_bulk, self.bulk_done, DELETE, paths)
+
+        self.present_dialog(dlg, Gtk.ResponseType.ACCEPT, remove)
+
+    @Gtk.Template.Callback()
+    def apps_sort_changed(self, combo: Gtk.ComboBoxText) -> None:
+        if self.library is not None:
+            self.library.set_sort_mode(combo.get_active_id())
+
+    @Gtk.Template.Callback()
+    def apps_search_changed(self, entry: Gtk.SearchEntry) -> None:
+        self.search_query = entry.get_text()
+        if self.catalog is not None:
+            self.apply_search()
+
+    def apply_search(self) -> None:
+        if self.apps_list:
+            self.apps_list.set_filter(self.catalog.search(self.search_query))
+        else:
+            self.search_matches = self.catalog.index.search(self.search_query)
+            self.apps_listbox.invalidate_filter()
+
+    def apps_listbox_filter(self, row: AppListRow) -> bool:
+        return self.search_matches is None or row.app_data.filepath in self.search_matches
 
     def apps_listbox_row_selected(self, listbox: Gtk.ListBox, row: AppListRow):
         self.appdata_revealer.set_reveal_child(True)
@@ -367,15 +546,124 @@ class TurtleWindow(Handy.ApplicationWindow):
         remove_btn = dlg.add_button("Remove", Gtk.ResponseType.ACCEPT)
         remove_btn.get_style_context().add_class(Gtk.STYLE_CLASS_DESTRUCTIVE_ACTION)
 
-        response = dlg.run()
-        dlg.destroy()
-        if response == Gtk.ResponseType.ACCEPT:
-            os.remove(self.appdata_current.filepath)
-            self.load_available_apps()
+        # The details panel may show another entry by the time the dialog is closed
+        self.present_dialog(dlg, Gtk.ResponseType.ACCEPT,
+                            lambda app_data=self.appdata_current: self.remove_entry(app_data))
+
+    def remove_entry(self, app_data: AppData) -> None:
+        try:
+            os.remove(app_data.filepath)
+        except OSError as e:
+            # Entries of system folders can't be removed, only hidden
+            self.send_notification(_("Can't remove {}: {}").format(app_data.name, e.strerror))
+            return
+        self.library.sync([app_data.filepath])
+
+    @Gtk.Template.Callback()
+    def apps_select_toggled(self, button: Gtk.ToggleButton) -> None:
+        self.selection.enabled = button.get_active()
+        self.bulk_revealer.set_reveal_child(self.selection.enabled)
+        if not self.selection.enabled:
+            self.selection.clear()
+        self.refresh_rows()
+
+    def refresh_rows(self) -> None:
+        if self.apps_list:
+            self.apps_list.rebind()
+        else:
+            self.apps_listbox.foreach(lambda row: row.bind(row.app_data))
+
+    def selection_changed(self) -> None:
+        count = len(self.selection)
+        self.bulk_label.set_text(
+            _("{} entries selected").format(count) if count else _("No entries selected")
+        )
+
+    @Gtk.Template.Callback()
+    def bulk_hide_clicked(self, button: Gtk.Button) -> None:
+        self.run_bulk('hide')
+
+    @Gtk.Template.Callback()
+    def bulk_show_clicked(self, button: Gtk.Button) -> None:
+        self.run_bulk('show')
+
+    @Gtk.Template.Callback()
+    def bulk_terminal_clicked(self, button: Gtk.Button) -> None:
+        self.run_bulk('terminal')
+
+    @Gtk.Template.Callback()
+    def bulk_no_terminal_clicked(self, button: Gtk.Button) -> None:
+        self.run_bulk('no-terminal')
+
+    @Gtk.Template.Callback()
+    def bulk_delete_clicked(self, button: Gtk.Button) -> None:
+        if not self.selection.paths:
+            return
+        dlg: Granite.MessageDialog = Granite.MessageDialog.with_image_from_icon_name(
+            f"Remove {len(self.selection)} entries from AppMenu?",
+            "They can be restored with Undo until the notification is dismissed.",
+            "dialog-warning",
+            Gtk.ButtonsType.CANCEL,
+        )
+
+        remove_btn = dlg.add_button("Remove", Gtk.ResponseType.ACCEPT)
+        remove_btn.get_style_context().add_class(Gtk.STYLE_CLASS_DESTRUCTIVE_ACTION)
+
+        self.present_dialog(dlg, Gtk.ResponseType.ACCEPT, lambda: self.run_bulk(DELETE))
+
+    def run_bulk(self, action: str) -> None:
+        """Apply `action` to the selected entries in a background thread."""
+        paths = sorted(self.selection.paths)
+        if not paths:
+            return
+        targets = {path: self.catalog.scanner.writable_path(path) for path in paths}
+        self.bulk_revealer.set_sensitive(False)
+        run_in_background(apply_bulk, self.bulk_done, action, paths, targets)
+
+    def bulk_done(self, result: Union[BulkResult, Exception]) -> None:
+        self.bulk_revealer.set_sensitive(True)
+        if isinstance(result, Exception):
+            self.send_notification(_("Can't change the entries: {}").format(result))
+            return
+        for path, error in result.errors:
+            logger.warning("%s failed for %s: %s", result.action, path, error)
+
+        self.library.sync(result.paths)
+        if result.action == DELETE:
+            self.selection.paths.difference_update(result.paths)
+            self.selection_changed()
+        self.refresh_rows()
+
+        messages = {
+            'hide': _("{} entries hidden"),
+            'show': _("{} entries shown"),
+            'terminal': _("{} entries set to run in a terminal"),
+            'no-terminal': _("{} entries set to run without a terminal"),
+            DELETE: _("{} entries removed"),
+        }
+        if result.previous:
+            self.send_notification(messages[result.action].format(len(result.previous)),
+                                   lambda: self.undo_bulk(result))
+
+    def undo_bulk(self, result: BulkResult) -> None:
+        run_in_background(undo_bulk, self.undo_done, result)
+
+    def undo_done(self, paths: Union[List[str], Exception]) -> None:
+        if isinstance(paths, Exception):
+            self.send_notification(_("Can't undo: {}").format(paths))
+        else:
+            self.entries_written(paths)
+
+    def entries_written(self, paths: List[str]) -> None:
+        """Update the catalog, if loaded, right away rather than when the
+        file monitor reports `paths`."""
+        library = self.get_application().library
+        if library is not None:
+            library.sync(paths)
 
     def open_external(self, appdata: AppData):
         file = Gio.File.new_for_path(path=appdata.filepath)
         try:
             Gtk.show_uri(None, file.get_uri(), Gtk.get_current_event_time())
         except Exception as e:
-            print(e)
+            logger.warning("Can't open %s: %s", appdata.filepath, e)
@@ -0,0 +1,202 @@
+# writer.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Atomic file writes.
+
+Files are rendered to a temporary file in the same directory and renamed
+over the target, so menu daemons re-indexing on every inotify event never
+see a truncated entry and get a single event per file.
+"""
+import ctypes
+import os
+import tempfile
+from typing import Callable, List, Optional, Tuple
+
+DEFAULT_MODE = 0o644
+
+_syncfs: Optional[Callable[[int], int]] = None
+_syncfs_loaded = False
+
+
+def _get_syncfs() -> Optional[Callable[[int], int]]:
+    """Return syncfs(2) from the C library, None where there is none."""
+    global _syncfs, _syncfs_loaded
+    if not _syncfs_loaded:
+        _syncfs_loaded = True
+        try:
+            _syncfs = ctypes.CDLL(None, use_errno=True).syncfs
+        except (OSError, AttributeError):
+            _syncfs = None
+    return _syncfs
+
+
+def _sync_files(paths: List[str]) -> None:
+    """Make the content of `paths` durable.
+
+    With syncfs, each filesystem holding them is flushed once, whatever the
+    number of files: a single barrier instead of one per file, at the cost
+    of also flushing unrelated data waiting to be written on the same
+    filesystem (never on other ones, as sync(2) would). Elsewhere, or for
+    a single file, every file is synced in turn.
+    """
+    syncfs = _get_syncfs() if len(paths) > 1 else None
+    if syncfs is not None:
+        devices = {}
+        for path in paths:
+            devices.setdefault(os.stat(path).st_dev, path)
+        for path in devices.values():
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                if syncfs(fd) != 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, os.strerror(errno), path)
+            finally:
+                os.close(fd)
+        return
+    for path in paths:
+        with open(path, 'rb') as f:
+            os.fsync(f.fileno())
+
+
+def _is_unchanged(path: str, data: bytes) -> bool:
+    try:
+        if os.stat(path).st_size != len(data):
+            return False
+        with open(path, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def _write_temp(path: str, data: bytes, fsync: bool) -> str:
+    directory, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = DEFAULT_MODE
+        os.chmod(tmp, mode)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp
+
+
+def _fsync_directory(directory: str) -> None:
+    fd = os.open(directory or '.', os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path: str, data: bytes, fsync: bool = True) -> bool:
+    """Replace `path` with `data` atomically.
+
+    Returns False, without touching the file, when it already holds `data`.
+    """
+    if _is_unchanged(path, data):
+        return False
+    tmp = _write_temp(path, data, fsync)
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    if fsync:
+        _fsync_directory(os.path.dirname(path))
+    return True
+
+
+class WriteBatch:
+    """Write many files with a single durability barrier.
+
+        with WriteBatch() as batch:
+            for path, data in entries:
+                batch.write(path, data)
+
+    Temporary files are written as `write` is called; leaving the block
+    syncs them all in one pass (see `_sync_files`), renames them into place
+    and syncs each affected directory once. If the block raises, nothing is
+    renamed.
+    """
+
+    def __init__(self, fsync: bool = True):
+        self.fsync = fsync
+        self.pending: List[Tuple[str, str]] = []
+        self.written: List[str] = []
+        self.unchanged: List[str] = []
+
+    def write(self, path: str, data: bytes) -> bool:
+        """Queue `data` for `path`, returns False if the file already holds it."""
+        if _is_unchanged(path, data):
+            self.unchanged.append(path)
+            return False
+        self.pending.append((_write_temp(path, data, fsync=False), path))
+        return True
+
+    def commit(self) -> None:
+        if not self.pending:
+            return
+        if self.fsync:
+            try:
+                _sync_files([tmp for tmp, _path in self.pending])
+            except OSError:
+                self.rollback()
+                raise
+        for tmp, path in self.pending:
+            os.replace(tmp, path)
+            self.written.append(path)
+        if self.fsync:
+            for directory in {os.path.dirname(path) for _tmp, path in self.pending}:
+                _fsync_directory(directory)
+        self.pending = []
+
+    def rollback(self) -> None:
+        for tmp, _path in self.pending:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+        self.pending = []
+
+    def __enter__(self) -> 'WriteBatch':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> Optional[bool]:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return None
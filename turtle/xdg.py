@@ -0,0 +1,264 @@
+# xdg.py
+#
+# Copyright 2021 Andrey Maksimov
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE X CONSORTIUM BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# Except as contained in this notice, the name(s) of the above copyright
+# holders shall not be used in advertising or otherwise to promote the sale,
+# use or other dealings in this Software without prior written
+# authorization.
+
+"""Applications folders of the XDG Base Directory specification and the
+desktop file IDs of the entries they contain.
+
+https://specifications.freedesktop.org/basedir-spec/latest/
+https://specifications.freedesktop.org/desktop-entry-spec/latest/ar01s02.html#desktop-file-id
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from turtle.config import APPS_PATH_PREFIX
+
+# (mtime in microseconds, size, inode) of a file
+StatKey = Tuple[int, int, int]
+
+
+def stat_key(st: os.stat_result) -> StatKey:
+    # Microseconds is what Gio.FileInfo reports, keep both sources comparable
+    return st.st_mtime_ns // 1000, st.st_size, st.st_ino
+
+
+def user_applications_dir() -> str:
+    data_home = os.environ.get('XDG_DATA_HOME')
+    if data_home:
+        return os.path.join(data_home, 'applications')
+    return os.path.expanduser(APPS_PATH_PREFIX).rstrip(os.sep)
+
+
+def user_data_dir() -> str:
+    """Return Turtle's folder under $XDG_DATA_HOME, for files the created
+    entries refer to."""
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(data_home, 'turtle')
+
+
+def user_cache_dir() -> str:
+    """Return Turtle's folder under $XDG_CACHE_HOME."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'turtle')
+
+
+def applications_dirs() -> List[str]:
+    """Return the applications folders, most important first."""
+    data_dirs = os.environ.get('XDG_DATA_DIRS') or '/usr/local/share/:/usr/share/'
+    dirs = [user_applications_dir()]
+    for data_dir in data_dirs.split(':'):
+        if data_dir:
+            dirs.append(os.path.join(data_dir, 'applications'))
+
+    unique = []
+    for directory in dirs:
+        directory = os.path.normpath(directory)
+        if directory not in unique:
+            unique.append(directory)
+    return unique
+
+
+def host_path(path: str) -> str:
+    """Return the real location of a file exported by the document portal,
+    e.g. picked in a sandboxed file chooser, instead of /run/user/1000/doc/...
+
+    Other paths are returned unchanged.
+    """
+    try:
+        return os.getxattr(path, 'user.document-portal.host-path').decode('utf-8')
+    except (OSError, AttributeError, UnicodeDecodeError):
+        return path
+
+
+def desktop_file_id(root: str, path: str) -> str:
+    """`root/kde4/konsole.desktop` has the ID `kde4-konsole.desktop`."""
+    return os.path.relpath(path, root).replace(os.sep, '-')
+
+
+class _Folder:
+    """What was found in one folder the last time it was listed."""
+    __slots__ = ('mtime', 'files', 'children')
+
+    def __init__(self, mtime: int, files: Dict[str, Tuple[str, StatKey]], children: List[str]):
+        self.mtime = mtime
+        # Desktop file ID: (path, stat key)
+        self.files = files
+        self.children = children
+
+
+class XdgScanner:
+    """List the entries of several applications folders merged by desktop
+    file ID, the first folder having an ID wins.
+
+    Folders are walked concurrently, subfolders included. Except for the
+    first one, the user's folder, a folder whose mtime didn't change since
+    the previous scan isn't listed again: packages add, remove or replace
+    entries, which all change the folder's mtime.
+    """
+
+    def __init__(self, directories: List[str]):
+        self.directories = directories
+        self._folders: Dict[str, _Folder] = {}
+        # Desktop file ID: (path, stat key) per root folder
+        self._ids: Dict[str, Dict[str, Tuple[str, StatKey]]] = {root: {} for root in directories}
+        # Desktop file ID: path of the entry currently visible
+        self.winners: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def root_of(self, path: str) -> Optional[str]:
+        for root in self.directories:
+            if path.startswith(root + os.sep):
+                return root
+        return None
+
+    def _walk(self, root: str, folder: str, trust_mtime: bool, ids: Dict[str, Tuple[str, StatKey]]) -> None:
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            self._folders.pop(folder, None)
+            return
+
+        cached = self._folders.get(folder)
+        if cached is None or not trust_mtime or cached.mtime != mtime:
+            files: Dict[str, Tuple[str, StatKey]] = {}
+            children: List[str] = []
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir():
+                                children.append(entry.path)
+                            elif entry.name.endswith('.desktop'):
+                                files[desktop_file_id(root, entry.path)] = (entry.path, stat_key(entry.stat()))
+                        except OSError:
+                            continue
+            except OSError:
+                return
+            if cached is not None:
+                for child in set(cached.children).difference(children):
+                    self._forget(child)
+            cached = self._folders[folder] = _Folder(mtime, files, children)
+
+        ids.update(cached.files)
+        for child in cached.children:
+            self._walk(root, child, trust_mtime, ids)
+
+    def _forget(self, folder: str) -> None:
+        """Drop what was found in `folder` and below."""
+        prefix = folder + os.sep
+        for path in [path for path in self._folders if path == folder or path.startswith(prefix)]:
+            del self._folders[path]
+
+    def _scan_root(self, root: str) -> Dict[str, Tuple[str, StatKey]]:
+        ids: Dict[str, Tuple[str, StatKey]] = {}
+        self._walk(root, root, root != self.directories[0], ids)
+        return ids
+
+    def scan(self) -> Dict[str, StatKey]:
+        """Walk every folder and return the visible entries by path."""
+        with self._lock:
+            with ThreadPoolExecutor(max_workers=len(self.directories)) as executor:
+                listings = list(executor.map(self._scan_root, self.directories))
+            self._ids = dict(zip(self.directories, listings))
+
+            found: Dict[str, StatKey] = {}
+            self.winners = {}
+            for ids in listings:
+                for desktop_id, (path, key) in ids.items():
+                    if desktop_id not in self.winners:
+                        self.winners[desktop_id] = path
+                        found[path] = key
+            return found
+
+    def folders(self) -> List[str]:
+        """The folders found by the last scan, subfolders included."""
+        with self._lock:
+            return list(self._folders)
+
+    def update(self, paths: Iterable[str]) -> Tuple[List[str], Dict[str, StatKey]]:
+        """Take file monitor events into account without walking the folders.
+
+        `paths` are .desktop files, or subfolders that appeared, disappeared
+        or moved: only those are walked again.
+
+        Returns the paths that stopped being visible, and the paths that are
+        visible now with their stat keys.
+        """
+        with self._lock:
+            affected: Set[str] = set()
+            for path in paths:
+                root = self.root_of(path)
+                if root is None:
+                    continue
+                if not path.endswith('.desktop'):
+                    ids = self._ids[root]
+                    prefix = path + os.sep
+                    gone = [desktop_id for desktop_id, (file, _key) in ids.items() if file.startswith(prefix)]
+                    for desktop_id in gone:
+                        del ids[desktop_id]
+                    self._forget(path)
+                    found: Dict[str, Tuple[str, StatKey]] = {}
+                    self._walk(root, path, False, found)
+                    ids.update(found)
+                    affected.update(gone)
+                    affected.update(found)
+                    continue
+                desktop_id = desktop_file_id(root, path)
+                affected.add(desktop_id)
+                try:
+                    self._ids[root][desktop_id] = (path, stat_key(os.stat(path)))
+                except OSError:
+                    self._ids[root].pop(desktop_id, None)
+
+            removed: List[str] = []
+            current: Dict[str, StatKey] = {}
+            for desktop_id in affected:
+                old = self.winners.pop(desktop_id, None)
+                new = None
+                for root in self.directories:
+                    if desktop_id in self._ids[root]:
+                        new, key = self._ids[root][desktop_id]
+                        current[new] = key
+                        self.winners[desktop_id] = new
+                        break
+                if old and old != new:
+                    removed.append(old)
+            return removed, current
+
+    def desktop_id(self, path: str) -> Optional[str]:
+        root = self.root_of(path)
+        return desktop_file_id(root, path) if root else None
+
+    def writable_path(self, path: str) -> str:
+        """Where changes to the entry at `path` are saved: entries outside of
+        the user's folder are overridden by a copy with the same ID there."""
+        root = self.root_of(path)
+        if root is None or root == self.directories[0]:
+            return path
+        return os.path.join(self.directories[0], desktop_file_id(root, path))